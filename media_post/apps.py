@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class MediaPostConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "media_post"
+
+    def ready(self):
+        import media_post.signals  # noqa: F401
@@ -0,0 +1,169 @@
+"""Async variants of the feed, post and comments endpoints.
+
+Responses match the DRF views. Rows are fetched with the async ORM, or
+with `gather_queries` where the queries do not depend on each other, and
+the serializers then run on primed loaders without a query. Unlike the
+DRF views these skip the rendered post cache and conditional GETs.
+
+`notification_stream` has no sync counterpart: it holds the connection
+open, which only an ASGI server can do without a thread per client.
+"""
+
+import asyncio
+import json
+from collections import defaultdict
+
+from django.conf import settings
+from django.http import StreamingHttpResponse
+from rest_framework import serializers
+from rest_framework.exceptions import NotFound
+
+from media_post.like_buffer import pending_likes
+from media_post.models import Comment, PostHashtag
+from media_post.notifications import channel_of
+from media_post.pagination import KeysetPagination
+from media_post.serializers import (
+    CommentSerializer,
+    PostDetailSerializer,
+    PostListCreateSerializer,
+)
+from media_post.timeline import feed_queryset, visible_posts
+from social_media_api.asynchronous import async_api_view, gather_queries
+from social_media_api.pubsub import get_pubsub
+from user.loaders import get_loaders
+
+
+class AsyncPostListSerializer(PostListCreateSerializer):
+    hashtags = serializers.ListField(
+        child=serializers.CharField(), source="hashtag_names", read_only=True
+    )
+
+
+class AsyncPostDetailSerializer(PostDetailSerializer):
+    hashtags = serializers.ListField(
+        child=serializers.CharField(), source="hashtag_names", read_only=True
+    )
+    comments = CommentSerializer(
+        source="comment_list", many=True, read_only=True
+    )
+
+
+def hashtag_names(post_ids):
+    names = defaultdict(list)
+    for post_id, name in PostHashtag.objects.filter(
+        post_id__in=post_ids
+    ).values_list("post_id", "hashtag__name"):
+        names[post_id].append(name)
+    return names
+
+
+def profile_of(request):
+    profile = getattr(request.user, "userprofile", None)
+    if profile is None:
+        raise NotFound()
+    return profile
+
+
+@async_api_view
+async def async_feed(request):
+    profile = getattr(request.user, "userprofile", None)
+    paginator = KeysetPagination()
+    if profile is None:
+        return {"next": None, "results": []}
+
+    queryset = feed_queryset(
+        profile,
+        paginator.get_page_size(request) + 1,
+        paginator.decode_cursor(request),
+        request.query_params.get("hashtag"),
+    )
+    posts = await paginator.apaginate_queryset(
+        queryset.select_related("user__user"), request
+    )
+    ids = [post.id for post in posts]
+    names, pending = await gather_queries(
+        lambda: hashtag_names(ids), lambda: pending_likes(ids)
+    )
+    for post in posts:
+        post.hashtag_names = names[post.id]
+
+    context = {"request": request, "pending_likes": pending}
+    get_loaders(context).prime_profiles([post.user for post in posts])
+    serializer = AsyncPostListSerializer(posts, many=True, context=context)
+    return paginator.get_paginated_response(serializer.data).data
+
+
+@async_api_view
+async def async_post_detail(request, pk):
+    profile = profile_of(request)
+    post, comments, names, pending = await gather_queries(
+        lambda: visible_posts(profile)
+        .select_related("user__user")
+        .filter(pk=pk)
+        .first(),
+        lambda: list(
+            Comment.objects.filter(post_id=pk)
+            .select_related("user__user")
+            .order_by("-created_at", "-id")[: settings.POST_DETAIL_COMMENTS]
+        ),
+        lambda: hashtag_names([pk]),
+        lambda: pending_likes([pk]),
+    )
+    if post is None:
+        raise NotFound()
+    post.comment_list = comments
+    post.hashtag_names = names[post.id]
+
+    context = {"request": request, "pending_likes": pending}
+    get_loaders(context).prime_profiles([comment.user for comment in comments])
+    return AsyncPostDetailSerializer(post, context=context).data
+
+
+@async_api_view
+async def async_post_comments(request, pk):
+    profile = profile_of(request)
+    paginator = KeysetPagination()
+    visible, comments = await gather_queries(
+        lambda: visible_posts(profile).filter(pk=pk).exists(),
+        lambda: paginator.paginate_queryset(
+            Comment.objects.filter(post_id=pk).select_related("user__user"),
+            request,
+        ),
+    )
+    if not visible:
+        raise NotFound()
+
+    context = {"request": request}
+    get_loaders(context).prime_profiles([comment.user for comment in comments])
+    serializer = CommentSerializer(comments, many=True, context=context)
+    return paginator.get_paginated_response(serializer.data).data
+
+
+async def event_stream(channel):
+    """Server-sent events of `channel` until SSE_MAX_AGE runs out."""
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + settings.SSE_MAX_AGE
+    yield f"retry: {settings.SSE_RETRY * 1000}\n\n"
+    async with get_pubsub().subscribe(channel) as subscription:
+        while (remaining := deadline - loop.time()) > 0:
+            event = await subscription.get(
+                min(settings.SSE_HEARTBEAT, remaining)
+            )
+            if event is None:
+                yield ":\n\n"
+            else:
+                yield f"event: {event['type']}\ndata: {json.dumps(event)}\n\n"
+
+
+@async_api_view
+async def notification_stream(request):
+    """Likes, comments and follows of the user as server-sent events"""
+    profile = profile_of(request)
+    response = StreamingHttpResponse(
+        event_stream(channel_of(profile.id)),
+        content_type="text/event-stream",
+    )
+    response["Cache-Control"] = "no-cache"
+    # keeps nginx from buffering the events
+    response["X-Accel-Buffering"] = "no"
+    return response
@@ -0,0 +1,240 @@
+import http.client
+import platform
+import random
+import subprocess
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from urllib.parse import urlsplit
+
+from django.db import connection
+from django.test import Client
+from rest_framework_simplejwt.tokens import AccessToken
+
+from media_post.models import Post
+from social_media_api.middleware import QueryTimer
+from user.models import Follow, User, UserProfile
+
+SCENARIOS = (
+    "feed",
+    "retrieve",
+    "comments",
+    "like_create",
+    "following",
+    "followers",
+)
+
+PATHS = {
+    "feed": "/api/media/post/",
+    "retrieve": "/api/media/post/{post_id}/",
+    "comments": "/api/media/post/{post_id}/comments/",
+    "like_create": "/api/media/post/{post_id}/like-create/",
+    "following": "/api/user/following/",
+    "followers": "/api/user/followers/",
+}
+# the async (ASGI) variants of the read-heavy endpoints
+ASYNC_PATHS = {
+    "feed": "/api/media/async/post/",
+    "retrieve": "/api/media/async/post/{post_id}/",
+    "comments": "/api/media/async/post/{post_id}/comments/",
+    "followers": "/api/user/async/followers/",
+}
+
+
+def percentile(ordered, fraction):
+    """Nearest-rank percentile of an already sorted list."""
+    if not ordered:
+        return 0.0
+    index = max(0, min(len(ordered) - 1, round(fraction * len(ordered)) - 1))
+    return ordered[index]
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+class ApiBenchmark:
+    """Drive the API endpoints in-process and time every request.
+
+    Requests go through the full middleware and JWT authentication stack
+    of the test client. Callers pick the profiles and posts, and the
+    harness times the requests only. With `base_url` the requests go over
+    HTTP to a running server instead, where queries can not be counted.
+    """
+
+    def __init__(
+        self,
+        profile_ids,
+        post_ids,
+        concurrency=1,
+        seed=0,
+        base_url=None,
+        paths=PATHS,
+    ):
+        self.profile_ids = profile_ids
+        self.post_ids = post_ids
+        self.concurrency = concurrency
+        self.seed = seed
+        self.base_url = base_url
+        self.paths = paths
+        self.user_ids = dict(
+            UserProfile.objects.filter(id__in=profile_ids).values_list(
+                "id", "user_id"
+            )
+        )
+        self.tokens = {}
+        # one client per thread, each thread also gets its own connection
+        self.local = threading.local()
+
+    def token(self, profile_id):
+        if profile_id not in self.tokens:
+            if profile_id not in self.user_ids:
+                # followers picked by visible_post may be outside the sample
+                self.user_ids[profile_id] = UserProfile.objects.values_list(
+                    "user_id", flat=True
+                ).get(pk=profile_id)
+            user = User(id=self.user_ids[profile_id])
+            self.tokens[profile_id] = str(AccessToken.for_user(user))
+        return self.tokens[profile_id]
+
+    def visible_post(self):
+        """A post and a profile that can see it, the author or a follower."""
+        post_id = self.random.choice(self.post_ids)
+        author_id = Post.objects.values_list("user_id", flat=True).get(
+            pk=post_id
+        )
+        followers = list(
+            Follow.objects.filter(followee_id=author_id).values_list(
+                "follower_id", flat=True
+            )[:20]
+        )
+        return self.random.choice(followers or [author_id]), post_id
+
+    def build(self, scenario):
+        if scenario in ("feed", "following", "followers"):
+            profile_id = self.random.choice(self.profile_ids)
+            path = self.paths[scenario]
+            return "get", path, self.token(profile_id)
+
+        profile_id, post_id = self.visible_post()
+        path = self.paths[scenario].format(post_id=post_id)
+        method = "post" if scenario == "like_create" else "get"
+        return method, path, self.token(profile_id)
+
+    def send(self, request):
+        if self.base_url is not None:
+            return self.send_http(request)
+
+        method, path, token = request
+        client = getattr(self.local, "client", None)
+        if client is None:
+            client = self.local.client = Client()
+
+        timer = QueryTimer()
+        start = time.perf_counter()
+        with connection.execute_wrapper(timer):
+            response = getattr(client, method)(
+                path, HTTP_AUTHORIZATION=f"Bearer {token}"
+            )
+        return time.perf_counter() - start, timer.count, response.status_code
+
+    def send_http(self, request):
+        method, path, token = request
+        connection = getattr(self.local, "connection", None)
+        if connection is None:
+            address = urlsplit(self.base_url)
+            connection = self.local.connection = http.client.HTTPConnection(
+                address.hostname, address.port, timeout=60
+            )
+
+        headers = {"Authorization": f"Bearer {token}"}
+        start = time.perf_counter()
+        try:
+            connection.request(method.upper(), path, headers=headers)
+            response = connection.getresponse()
+        except (http.client.RemoteDisconnected, ConnectionError):
+            # the server closed an idle keep-alive connection, reconnect
+            connection.close()
+            start = time.perf_counter()
+            connection.request(method.upper(), path, headers=headers)
+            response = connection.getresponse()
+        response.read()
+        return time.perf_counter() - start, None, response.status
+
+    def run(self, scenario, requests, warmup=10):
+        # seeded per scenario, so a subset of scenarios picks the same rows
+        self.random = random.Random(f"{self.seed}:{scenario}")
+        batch = [self.build(scenario) for _ in range(warmup + requests)]
+        for request in batch[:warmup]:
+            self.send(request)
+
+        start = time.perf_counter()
+        if self.concurrency > 1:
+            with ThreadPoolExecutor(self.concurrency) as pool:
+                samples = list(pool.map(self.send, batch[warmup:]))
+        else:
+            samples = [self.send(request) for request in batch[warmup:]]
+        elapsed = time.perf_counter() - start
+
+        latencies = sorted(sample[0] * 1000 for sample in samples)
+        queries = [sample[1] or 0 for sample in samples]
+        statuses = {}
+        for sample in samples:
+            statuses[str(sample[2])] = statuses.get(str(sample[2]), 0) + 1
+        return {
+            "requests": requests,
+            "throughput_rps": round(requests / elapsed, 1),
+            "p50_ms": round(percentile(latencies, 0.50), 3),
+            "p95_ms": round(percentile(latencies, 0.95), 3),
+            "p99_ms": round(percentile(latencies, 0.99), 3),
+            "queries_mean": round(sum(queries) / len(queries), 2),
+            "queries_max": max(queries),
+            "statuses": statuses,
+        }
+
+
+def report(results, scale, concurrency):
+    return {
+        "meta": {
+            "commit": git_commit(),
+            "created_at": datetime.now(timezone.utc).isoformat(),
+            "python": platform.python_version(),
+            "database": connection.vendor,
+            "concurrency": concurrency,
+            "scale": scale,
+        },
+        "scenarios": results,
+    }
+
+
+def compare(baseline, current, tolerance):
+    """Regressions of `current` against `baseline`, as readable lines.
+
+    A scenario regresses when its p95 latency or its mean query count
+    grows by more than `tolerance`. Query counts vary a little with the
+    state of the caches, an N+1 query grows them by a whole page.
+    """
+    regressions = []
+    for name, result in current["scenarios"].items():
+        before = baseline["scenarios"].get(name)
+        if before is None:
+            continue
+        if result["p95_ms"] > before["p95_ms"] * (1 + tolerance):
+            regressions.append(
+                f"{name}: p95 {before['p95_ms']} ms -> {result['p95_ms']} ms"
+            )
+        if result["queries_mean"] > before["queries_mean"] * (1 + tolerance):
+            regressions.append(
+                f"{name}: queries {before['queries_mean']} -> "
+                f"{result['queries_mean']}"
+            )
+    return regressions
@@ -0,0 +1,100 @@
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.db.models.signals import post_delete, post_save, pre_save
+
+from media_post.images import delete_variants
+from media_post.models import Blob
+from media_post.storage import media_storage
+
+
+def acquire(name):
+    """Count one more reference to a stored file."""
+    if Blob.objects.filter(name=name).update(ref_count=F("ref_count") + 1):
+        return
+    try:
+        with transaction.atomic():
+            Blob.objects.create(name=name, ref_count=1)
+    except IntegrityError:
+        # created concurrently, count on the existing row
+        Blob.objects.filter(name=name).update(ref_count=F("ref_count") + 1)
+
+
+def release(name):
+    """Drop a reference, the file is removed once nothing points at it."""
+    Blob.objects.filter(name=name, ref_count__gt=0).update(
+        ref_count=F("ref_count") - 1
+    )
+    transaction.on_commit(lambda: collect(name))
+
+
+def is_referenced(name):
+    return Blob.objects.filter(name=name, ref_count__gt=0).exists()
+
+
+def collect(name):
+    with transaction.atomic():
+        blob = (
+            Blob.objects.select_for_update()
+            .filter(name=name, ref_count=0)
+            .first()
+        )
+        if blob is None:
+            return
+        blob.delete()
+        media_storage().delete(name)
+        delete_variants(name)
+
+
+def track_references(model, field_name):
+    """Keep blob reference counts in step with a model's file field."""
+
+    def remember_stored_name(sender, instance, update_fields=None, **kwargs):
+        instance._stored_file_names = getattr(
+            instance, "_stored_file_names", {}
+        )
+        instance._uploaded_files = getattr(instance, "_uploaded_files", {})
+        # saved to the storage by this save, which acquires it in `_save`
+        file = getattr(instance, field_name)
+        instance._uploaded_files[field_name] = (
+            bool(file) and not file._committed
+        )
+        if instance._state.adding or (
+            update_fields is not None and field_name not in update_fields
+        ):
+            name = None
+        else:
+            name = (
+                model.objects.filter(pk=instance.pk)
+                .values_list(field_name, flat=True)
+                .first()
+            )
+        instance._stored_file_names[field_name] = name or None
+
+    def update_references(sender, instance, update_fields=None, **kwargs):
+        if update_fields is not None and field_name not in update_fields:
+            return
+        previous = instance._stored_file_names.pop(field_name, None)
+        uploaded = instance._uploaded_files.pop(field_name, False)
+        current = getattr(instance, field_name).name or None
+        if current == previous and not uploaded:
+            return
+        if current and not uploaded:
+            acquire(current)
+        if previous:
+            release(previous)
+
+    def drop_reference(sender, instance, **kwargs):
+        name = getattr(instance, field_name).name
+        if name:
+            release(name)
+
+    uid = f"{model._meta.label}.{field_name}"
+    pre_save.connect(
+        remember_stored_name, sender=model, weak=False, dispatch_uid=uid
+    )
+    post_save.connect(
+        update_references, sender=model, weak=False, dispatch_uid=uid
+    )
+    post_delete.connect(
+        drop_reference, sender=model, weak=False, dispatch_uid=uid
+    )
@@ -0,0 +1,138 @@
+"""Rendered post cache.
+
+Entries live in an in-process LRU and, when a "shared" cache alias is
+configured, in a shared Redis tier. Every entry remembers the version
+stamps of its post and author at render time; invalidation only replaces
+a stamp, so stale entries stop matching and age out of the LRU.
+
+The stamps only reach every process through the shared cache. Without
+one, invalidations by other workers or Celery never arrive, so the LRU
+entries expire after POST_CACHE_LOCAL_TIMEOUT seconds instead.
+"""
+
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import caches
+
+POST_KEY = "post:{}:{}"
+POST_VERSION_KEY = "post-version:{}"
+AUTHOR_VERSION_KEY = "author-version:{}"
+
+
+class LRUCache:
+    def __init__(self, maxsize, timeout=None):
+        self.maxsize = maxsize
+        self.timeout = timeout
+        self.lock = threading.Lock()
+        self.data = OrderedDict()
+
+    def get(self, key):
+        with self.lock:
+            try:
+                self.data.move_to_end(key)
+            except KeyError:
+                return None
+            expires, value = self.data[key]
+            if expires is not None and expires < time.monotonic():
+                del self.data[key]
+                return None
+            return value
+
+    def set(self, key, value):
+        expires = None
+        if self.timeout is not None:
+            expires = time.monotonic() + self.timeout
+        with self.lock:
+            self.data[key] = (expires, value)
+            self.data.move_to_end(key)
+            while len(self.data) > self.maxsize:
+                self.data.popitem(last=False)
+
+    def clear(self):
+        with self.lock:
+            self.data.clear()
+
+
+class PostCache:
+    def __init__(self):
+        self.shared = caches["shared"] if "shared" in settings.CACHES else None
+        self.local = LRUCache(
+            settings.POST_CACHE_SIZE,
+            None if self.shared else settings.POST_CACHE_LOCAL_TIMEOUT,
+        )
+        # version stamps must be visible to every process sharing entries
+        self.versions = self.shared or caches["default"]
+
+    def _stamps(self, keys):
+        stamps = self.versions.get_many(keys)
+        for key in keys:
+            if key not in stamps:
+                self.versions.add(key, uuid.uuid4().hex, timeout=None)
+                stamps[key] = self.versions.get(key)
+        return stamps
+
+    def get(self, post_id, host):
+        key = POST_KEY.format(post_id, host)
+        entry = self.local.get(key)
+        if entry is None and self.shared is not None:
+            entry = self.shared.get(key)
+            if entry is not None:
+                self.local.set(key, entry)
+        if entry is None:
+            return None
+
+        post_version = POST_VERSION_KEY.format(post_id)
+        author_version = AUTHOR_VERSION_KEY.format(entry["author_id"])
+        stamps = self.versions.get_many([post_version, author_version])
+        if (
+            stamps.get(post_version) != entry["post_version"]
+            or stamps.get(author_version) != entry["author_version"]
+        ):
+            return None
+        return entry["data"]
+
+    def render(self, post_id, author_id, host, render):
+        """Call `render` and store its result under the current stamps.
+
+        Stamps are read before rendering so that an invalidation racing
+        with the render makes the new entry stale right away.
+        """
+        post_version = POST_VERSION_KEY.format(post_id)
+        author_version = AUTHOR_VERSION_KEY.format(author_id)
+        stamps = self._stamps([post_version, author_version])
+        data = render()
+
+        key = POST_KEY.format(post_id, host)
+        entry = {
+            "data": data,
+            "author_id": author_id,
+            "post_version": stamps[post_version],
+            "author_version": stamps[author_version],
+        }
+        self.local.set(key, entry)
+        if self.shared is not None:
+            self.shared.set(key, entry, timeout=settings.POST_CACHE_TIMEOUT)
+        return data
+
+    def invalidate_posts(self, post_ids):
+        self.versions.delete_many(
+            [POST_VERSION_KEY.format(post_id) for post_id in post_ids]
+        )
+
+    def invalidate_author(self, profile_id):
+        self.versions.delete(AUTHOR_VERSION_KEY.format(profile_id))
+
+
+_post_cache = None
+
+
+def get_post_cache():
+    global _post_cache
+
+    if _post_cache is None:
+        _post_cache = PostCache()
+    return _post_cache
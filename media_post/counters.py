@@ -0,0 +1,55 @@
+from django.db.models import Count, F, IntegerField, OuterRef, Q, Subquery
+from django.db.models.functions import Coalesce, Now
+
+from media_post.models import Comment, Like, Post
+
+
+def increment(post, field):
+    Post.objects.filter(pk=post.pk).update(
+        **{field: F(field) + 1}, updated_at=Now()
+    )
+
+
+def decrement(post, field):
+    Post.objects.filter(pk=post.pk, **{f"{field}__gt": 0}).update(
+        **{field: F(field) - 1}, updated_at=Now()
+    )
+
+
+def touch(post_ids):
+    """Mark posts as changed for conditional requests."""
+    Post.objects.filter(pk__in=post_ids).update(updated_at=Now())
+
+
+def _count(model):
+    counts = (
+        model.objects.filter(post=OuterRef("pk"))
+        .order_by()
+        .values("post")
+        .annotate(total=Count("id"))
+        .values("total")
+    )
+    return Coalesce(Subquery(counts, output_field=IntegerField()), 0)
+
+
+def reconcile(queryset=None):
+    """Recompute like/comment counters that drifted from the real rows.
+
+    Returns the number of corrected posts.
+    """
+    if queryset is None:
+        queryset = Post.objects.all()
+
+    drifted = queryset.annotate(
+        actual_likes=_count(Like), actual_comments=_count(Comment)
+    ).filter(
+        ~Q(like_count=F("actual_likes"))
+        | ~Q(comment_count=F("actual_comments"))
+    )
+    return Post.objects.filter(
+        pk__in=list(drifted.values_list("pk", flat=True))
+    ).update(
+        like_count=_count(Like),
+        comment_count=_count(Comment),
+        updated_at=Now(),
+    )
@@ -0,0 +1,160 @@
+import re
+from collections import Counter
+from datetime import datetime, timezone as dt_timezone
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import IntegrityError, transaction
+from django.db.models import F, Sum
+from django.utils import timezone
+
+from media_post.models import Hashtag, HashtagCounter, PostHashtag
+
+HASHTAG = re.compile(r"#(\w+)")
+WORD = re.compile(r"\w+")
+TRENDING_KEY = "trending-hashtags:{}:{}"
+
+
+def extract_hashtags(post):
+    """Tags of a post: `#words` of its text and the words of `hashtag`."""
+    names = WORD.findall(post.hashtag or "")
+    names += HASHTAG.findall(post.text_content or "")
+    return {name.lower()[:50] for name in names}
+
+
+def tagged(queryset, hashtag):
+    """Posts of `queryset` tagged `hashtag`, given with or without `#`."""
+    return queryset.filter(hashtags__name=hashtag.lstrip("#").lower())
+
+
+def bucket_of(moment):
+    size = settings.TRENDING_BUCKET.total_seconds()
+    start = moment.timestamp() // size * size
+    return datetime.fromtimestamp(start, tz=dt_timezone.utc)
+
+
+def tag_posts(posts, created=False):
+    """Link posts to the hashtags found in them and count the new uses.
+
+    `created` skips looking up the links of posts that can not have any.
+    """
+    wanted = {post.pk: extract_hashtags(post) for post in posts}
+    names = set().union(*wanted.values())
+    if names:
+        Hashtag.objects.bulk_create(
+            [Hashtag(name=name) for name in names], ignore_conflicts=True
+        )
+    ids = dict(
+        Hashtag.objects.filter(name__in=names).values_list("name", "id")
+    )
+
+    existing = set()
+    if not created:
+        existing = set(
+            PostHashtag.objects.filter(post_id__in=wanted).values_list(
+                "post_id", "hashtag_id"
+            )
+        )
+    links = {
+        (post.pk, ids[name]): post
+        for post in posts
+        for name in wanted[post.pk]
+    }
+
+    # removed one at a time so the delete signal uncounts every use
+    for post_id, hashtag_id in existing - set(links):
+        PostHashtag.objects.filter(
+            post_id=post_id, hashtag_id=hashtag_id
+        ).delete()
+
+    added = [
+        PostHashtag(
+            post=post, hashtag_id=hashtag_id, created_at=post.created_at
+        )
+        for (post_id, hashtag_id), post in links.items()
+        if (post_id, hashtag_id) not in existing
+    ]
+    count_uses(
+        Counter(
+            (link.hashtag_id, bucket_of(link.created_at))
+            for link in insert_links(added)
+        )
+    )
+
+
+def insert_links(links):
+    """Insert `links` and return those that were not linked already.
+
+    One bulk insert unless a concurrent save linked some of the posts
+    first, then the links are inserted one at a time to find out which.
+    """
+    try:
+        with transaction.atomic():
+            PostHashtag.objects.bulk_create(links)
+        return links
+    except IntegrityError:
+        pass
+
+    inserted = []
+    for link in links:
+        try:
+            with transaction.atomic():
+                inserted.append(
+                    PostHashtag.objects.create(
+                        post_id=link.post_id,
+                        hashtag_id=link.hashtag_id,
+                        created_at=link.created_at,
+                    )
+                )
+        except IntegrityError:
+            # counted by the save that linked it
+            continue
+    return inserted
+
+
+def count_uses(uses):
+    """Add `{(hashtag_id, bucket): uses}` to the trending counters."""
+    oldest = bucket_of(timezone.now() - settings.TRENDING_WINDOW)
+    for (hashtag_id, bucket), count in uses.items():
+        if bucket < oldest or not count:
+            continue
+        counter = HashtagCounter.objects.filter(
+            hashtag_id=hashtag_id, bucket=bucket
+        )
+        if count < 0:
+            counter.filter(count__gte=-count).update(count=F("count") + count)
+            continue
+        if counter.update(count=F("count") + count):
+            continue
+        try:
+            with transaction.atomic():
+                HashtagCounter.objects.create(
+                    hashtag_id=hashtag_id, bucket=bucket, count=count
+                )
+        except IntegrityError:
+            # created concurrently, add to the existing row
+            counter.update(count=F("count") + count)
+
+
+def trending(window, limit):
+    """Most used hashtags of the last `window`, computed from the buckets."""
+    since = bucket_of(timezone.now() - window)
+    key = TRENDING_KEY.format(int(window.total_seconds()), limit)
+    result = cache.get(key)
+    if result is None:
+        result = list(
+            HashtagCounter.objects.filter(bucket__gte=since)
+            .values("hashtag__name")
+            .annotate(uses=Sum("count"))
+            .filter(uses__gt=0)
+            .order_by("-uses", "hashtag__name")
+            .values_list("hashtag__name", "uses")[:limit]
+        )
+        cache.set(key, result, settings.TRENDING_CACHE_TIMEOUT)
+    return [{"name": name, "uses": uses} for name, uses in result]
+
+
+def prune_counters():
+    oldest = bucket_of(timezone.now() - settings.TRENDING_WINDOW)
+    deleted, _ = HashtagCounter.objects.filter(bucket__lt=oldest).delete()
+    return deleted
@@ -0,0 +1,112 @@
+import os
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from PIL import Image, ImageOps
+from rest_framework import serializers
+
+ENCODINGS = {
+    "jpeg": ("jpg", {"format": "JPEG", "quality": 85, "progressive": True}),
+    "webp": ("webp", {"format": "WEBP", "quality": 80, "method": 6}),
+}
+
+
+def _encode(image, options):
+    buffer = BytesIO()
+    image.save(buffer, optimize=True, **options)
+    return ContentFile(buffer.getvalue())
+
+
+def variant_paths(source_name):
+    directory, filename = os.path.split(source_name)
+    stem, _ = os.path.splitext(filename)
+    return {
+        name: {
+            encoding: os.path.join(
+                directory, "variants", f"{stem}-{name}.{extension}"
+            )
+            for encoding, (extension, _) in ENCODINGS.items()
+        }
+        for name in settings.IMAGE_VARIANTS
+    }
+
+
+def generate_variants(image_file):
+    """Write resized JPEG and WebP copies of an uploaded image.
+
+    Returns the storage paths of every variant together with the name of
+    the source file they were made from. Source names are unique to their
+    content, so variants that already exist are reused as they are.
+    """
+    paths = variant_paths(image_file.name)
+    variants = {"source": image_file.name, **paths}
+    if all(
+        default_storage.exists(path)
+        for encodings in paths.values()
+        for path in encodings.values()
+    ):
+        return variants
+
+    with image_file.open("rb") as source:
+        image = ImageOps.exif_transpose(Image.open(source))
+        image = image.convert("RGB")
+
+    for name, size in settings.IMAGE_VARIANTS.items():
+        resized = image.copy()
+        resized.thumbnail((size, size), Image.LANCZOS)
+        for encoding, (_, options) in ENCODINGS.items():
+            path = paths[name][encoding]
+            if default_storage.exists(path):
+                default_storage.delete(path)
+            default_storage.save(path, _encode(resized, options))
+    return variants
+
+
+def delete_variants(source_name):
+    """Delete every variant of a source, sizes no longer configured too."""
+    directory, filename = os.path.split(source_name)
+    stem, _ = os.path.splitext(filename)
+    variants_directory = os.path.join(directory, "variants")
+    try:
+        _, filenames = default_storage.listdir(variants_directory)
+    except FileNotFoundError:
+        return
+    for name in filenames:
+        if name.startswith(f"{stem}-"):
+            default_storage.delete(os.path.join(variants_directory, name))
+
+
+def needs_variants(image_file, variants):
+    return bool(image_file) and variants.get("source") != image_file.name
+
+
+def variant_urls(variants, request=None):
+    urls = {}
+    for name, encodings in variants.items():
+        if name == "source":
+            continue
+        urls[name] = {}
+        for encoding, path in encodings.items():
+            url = default_storage.url(path)
+            if request is not None:
+                url = request.build_absolute_uri(url)
+            urls[name][encoding] = url
+    return urls
+
+
+class MediaVariantsField(serializers.ReadOnlyField):
+    """URLs of the resized copies made for the current image."""
+
+    def __init__(self, image_field, **kwargs):
+        self.image_field = image_field
+        kwargs["source"] = "*"
+        super().__init__(**kwargs)
+
+    def to_representation(self, obj):
+        image = getattr(obj, self.image_field)
+        variants = getattr(obj, self.field_name)
+        if not image or variants.get("source") != image.name:
+            return {}
+        return variant_urls(variants, self.context.get("request"))
@@ -0,0 +1,160 @@
+"""Write-behind buffer for likes on hot posts.
+
+Likes are collected in a set per post and flushed to the `Like` table in
+bulk by the `flush_like_buffer` task. The set cardinality doubles as the
+pending like counter of the post, minus the likes a flush saved while
+they were liked again.
+"""
+
+import threading
+from collections import defaultdict
+
+import redis
+from django.conf import settings
+
+from media_post.models import Like
+
+PENDING_KEY = "likes:pending:{}"
+DIRTY_KEY = "likes:dirty"
+
+
+class RedisLikeBuffer:
+    def __init__(self, url):
+        self.client = redis.Redis.from_url(url, decode_responses=True)
+
+    def add(self, post_id, profile_id):
+        """Buffer a like, return False if it is already pending."""
+        if not self.client.sadd(PENDING_KEY.format(post_id), profile_id):
+            return False
+        self.client.sadd(DIRTY_KEY, post_id)
+        return True
+
+    def discard(self, post_id, profile_id):
+        return bool(self.client.srem(PENDING_KEY.format(post_id), profile_id))
+
+    def has_liked(self, post_id, profile_id):
+        return bool(
+            self.client.sismember(PENDING_KEY.format(post_id), profile_id)
+        )
+
+    def pending_likers(self, post_ids):
+        pipe = self.client.pipeline(transaction=False)
+        for post_id in post_ids:
+            pipe.smembers(PENDING_KEY.format(post_id))
+        return {
+            post_id: {int(pk) for pk in profile_ids}
+            for post_id, profile_ids in zip(post_ids, pipe.execute())
+        }
+
+    def drain(self):
+        """Take every pending like out of the buffer."""
+        drained = {}
+        for post_id in self.client.smembers(DIRTY_KEY):
+            pipe = self.client.pipeline()
+            pipe.smembers(PENDING_KEY.format(post_id))
+            pipe.delete(PENDING_KEY.format(post_id))
+            pipe.srem(DIRTY_KEY, post_id)
+            profile_ids = pipe.execute()[0]
+            if profile_ids:
+                drained[int(post_id)] = {int(pk) for pk in profile_ids}
+        return drained
+
+    def restore(self, drained):
+        for post_id, profile_ids in drained.items():
+            self.client.sadd(PENDING_KEY.format(post_id), *profile_ids)
+            self.client.sadd(DIRTY_KEY, post_id)
+
+
+class LocalLikeBuffer:
+    """In-process stand-in for development and tests.
+
+    Only the process that took the likes can flush them, so this needs
+    CELERY_TASK_ALWAYS_EAGER or a direct `flush_like_buffer()` call. A
+    separate Celery worker would never see them.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.pending = defaultdict(set)
+
+    def add(self, post_id, profile_id):
+        with self.lock:
+            if profile_id in self.pending[post_id]:
+                return False
+            self.pending[post_id].add(profile_id)
+            return True
+
+    def discard(self, post_id, profile_id):
+        with self.lock:
+            if profile_id not in self.pending.get(post_id, ()):
+                return False
+            self.pending[post_id].remove(profile_id)
+            return True
+
+    def has_liked(self, post_id, profile_id):
+        return profile_id in self.pending.get(post_id, ())
+
+    def pending_likers(self, post_ids):
+        with self.lock:
+            return {
+                post_id: set(self.pending.get(post_id, ()))
+                for post_id in post_ids
+            }
+
+    def drain(self):
+        with self.lock:
+            drained = {
+                post_id: profile_ids
+                for post_id, profile_ids in self.pending.items()
+                if profile_ids
+            }
+            self.pending = defaultdict(set)
+        return drained
+
+    def restore(self, drained):
+        with self.lock:
+            for post_id, profile_ids in drained.items():
+                self.pending[post_id] |= profile_ids
+
+
+_buffer = None
+
+
+def get_buffer():
+    """Return the configured buffer or None when likes are written directly."""
+    global _buffer
+
+    if not settings.LIKE_BUFFER_ENABLED:
+        return None
+
+    if _buffer is None:
+        if settings.LIKE_BUFFER_URL == "local":
+            _buffer = LocalLikeBuffer()
+        else:
+            _buffer = RedisLikeBuffer(settings.LIKE_BUFFER_URL)
+    return _buffer
+
+
+def pending_likes(post_ids):
+    """Buffered likes per post that are not saved yet.
+
+    A like taken while a flush commits the same one is both pending and
+    saved, so the saved ones are left out and `like_count` plus these
+    counts each liker once. Takes one query when any like is pending.
+    """
+    like_buffer = get_buffer()
+    if like_buffer is None:
+        return {}
+
+    pending = like_buffer.pending_likers(post_ids)
+    likers = set().union(*pending.values())
+    if likers:
+        saved = Like.objects.filter(
+            post_id__in=[post_id for post_id in pending if pending[post_id]],
+            user_id__in=likers,
+        ).values_list("post_id", "user_id")
+        for post_id, profile_id in saved:
+            pending[post_id].discard(profile_id)
+    return {
+        post_id: len(profile_ids) for post_id, profile_ids in pending.items()
+    }
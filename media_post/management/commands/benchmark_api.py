@@ -0,0 +1,130 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import (
+    setup_test_environment,
+    teardown_test_environment,
+)
+
+from media_post.benchmarks import SCENARIOS, ApiBenchmark, compare, report
+from media_post.seeding import GraphSeeder
+
+
+class Command(BaseCommand):
+    help = (
+        "Seed a synthetic social graph in a throwaway test database and "
+        "benchmark the core API endpoints"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--users", type=int, default=1000)
+        parser.add_argument(
+            "--follows", type=int, default=20, help="Followees per user"
+        )
+        parser.add_argument(
+            "--posts", type=int, default=5, help="Posts per user"
+        )
+        parser.add_argument(
+            "--likes", type=int, default=5, help="Likes per post"
+        )
+        parser.add_argument(
+            "--comments", type=int, default=2, help="Comments per post"
+        )
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument(
+            "--requests",
+            type=int,
+            default=200,
+            help="Measured requests per scenario",
+        )
+        parser.add_argument("--warmup", type=int, default=10)
+        parser.add_argument("--concurrency", type=int, default=1)
+        parser.add_argument(
+            "--scenarios",
+            default=",".join(SCENARIOS),
+            help=f"Comma separated subset of {', '.join(SCENARIOS)}",
+        )
+        parser.add_argument(
+            "--save", metavar="PATH", help="Write the results as JSON"
+        )
+        parser.add_argument(
+            "--compare",
+            metavar="PATH",
+            help="Fail when the results regress against this JSON baseline",
+        )
+        parser.add_argument(
+            "--tolerance",
+            type=float,
+            default=0.2,
+            help="Allowed growth of p95 and queries (0.2 = 20%%)",
+        )
+
+    def handle(self, *args, **options):
+        scenarios = [name for name in options["scenarios"].split(",") if name]
+        unknown = set(scenarios) - set(SCENARIOS)
+        if unknown:
+            raise CommandError(f"Unknown scenarios: {', '.join(unknown)}")
+
+        scale = {
+            name: options[name]
+            for name in ("users", "follows", "posts", "likes", "comments")
+        }
+        setup_test_environment()
+        old_name = connection.creation.create_test_db(
+            verbosity=0, autoclobber=True
+        )
+        try:
+            results = self.run(scenarios, scale, options)
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            teardown_test_environment()
+
+        current = report(results, scale, options["concurrency"])
+        if options["save"]:
+            with open(options["save"], "w") as output:
+                json.dump(current, output, indent=2)
+                output.write("\n")
+
+        if options["compare"]:
+            with open(options["compare"]) as baseline:
+                regressions = compare(
+                    json.load(baseline), current, options["tolerance"]
+                )
+            if regressions:
+                raise CommandError(
+                    "Performance regressed:\n" + "\n".join(regressions)
+                )
+            self.stdout.write(self.style.SUCCESS("No regressions"))
+
+    def run(self, scenarios, scale, options):
+        self.stdout.write(
+            "Seeding " + ", ".join(f"{v} {k}" for k, v in scale.items())
+        )
+        profile_ids, post_ids = GraphSeeder(
+            seed=options["seed"], **scale
+        ).seed()
+
+        benchmark = ApiBenchmark(
+            profile_ids,
+            post_ids,
+            concurrency=options["concurrency"],
+            seed=options["seed"],
+        )
+        self.stdout.write(
+            f"{'scenario':<12} {'rps':>8} {'p50 ms':>8} {'p95 ms':>8} "
+            f"{'p99 ms':>8} {'queries':>8}  statuses"
+        )
+        results = {}
+        for name in scenarios:
+            result = benchmark.run(
+                name, options["requests"], options["warmup"]
+            )
+            results[name] = result
+            self.stdout.write(
+                f"{name:<12} {result['throughput_rps']:>8} "
+                f"{result['p50_ms']:>8} {result['p95_ms']:>8} "
+                f"{result['p99_ms']:>8} {result['queries_mean']:>8}  "
+                f"{result['statuses']}"
+            )
+        return results
@@ -0,0 +1,78 @@
+import resource
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.test.utils import override_settings
+from django.utils import timezone
+
+from media_post.models import ScheduledPost
+from media_post.tasks import publish_scheduled_posts
+from user.models import User, UserProfile
+
+
+def current_rss():
+    """Resident set size of this process in KiB."""
+    try:
+        with open("/proc/self/statm") as statm:
+            pages = int(statm.read().split()[1])
+        return pages * resource.getpagesize() // 1024
+    except OSError:
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+class Command(BaseCommand):
+    help = (
+        "Schedule and publish posts in bulk while tracking the process RSS. "
+        "Everything is rolled back at the end."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--count", type=int, default=100000)
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=10000,
+            help="Number of scheduled posts inserted per INSERT",
+        )
+
+    def handle(self, *args, **options):
+        count = options["count"]
+        batch_size = options["batch_size"]
+        samples = [("start", current_rss())]
+
+        # with DEBUG on every query is kept in memory and skews the numbers
+        with override_settings(DEBUG=False), transaction.atomic():
+            user = User.objects.create_user(
+                "scheduled-benchmark@example.com", "benchmark"
+            )
+            profile = UserProfile.objects.create(user=user, sex="M")
+
+            publish_at = timezone.now() - timedelta(seconds=1)
+            for offset in range(0, count, batch_size):
+                ScheduledPost.objects.bulk_create(
+                    ScheduledPost(
+                        user=profile,
+                        text_content=f"scheduled {number}",
+                        publish_at=publish_at,
+                    )
+                    for number in range(
+                        offset, min(offset + batch_size, count)
+                    )
+                )
+                samples.append((f"scheduled {offset}", current_rss()))
+            samples.append(("scheduled", current_rss()))
+
+            published = publish_scheduled_posts()
+            samples.append(("published", current_rss()))
+            transaction.set_rollback(True)
+
+        for label, rss in samples:
+            self.stdout.write(f"{label:>20}  {rss / 1024:8.1f} MiB")
+        growth = max(rss for _, rss in samples) - samples[0][1]
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Published {published} of {count} posts, "
+                f"peak RSS growth {growth / 1024:.1f} MiB"
+            )
+        )
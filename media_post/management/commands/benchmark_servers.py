@@ -0,0 +1,174 @@
+import json
+import shlex
+import socket
+import subprocess
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from media_post.benchmarks import ASYNC_PATHS, PATHS, ApiBenchmark, report
+from media_post.models import Post
+from user.models import UserProfile
+
+SERVERS = {
+    "wsgi": (
+        "gunicorn social_media_api.wsgi:application --workers {workers} "
+        "--threads {threads} --bind 127.0.0.1:{port}",
+        PATHS,
+    ),
+    "asgi": (
+        "uvicorn social_media_api.asgi:application --workers {workers} "
+        "--port {port} --no-access-log",
+        ASYNC_PATHS,
+    ),
+}
+
+
+def wait_for_port(port, process, timeout):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise CommandError(f"Server exited with code {process.returncode}")
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=1).close()
+            return
+        except OSError:
+            time.sleep(0.2)
+    raise CommandError(f"Server did not listen on port {port}")
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare the sync endpoints under a WSGI server with their async "
+        "variants under uvicorn, against the current database (fill it "
+        "with seed_data first)"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--servers",
+            default=",".join(SERVERS),
+            help=f"Comma separated subset of {', '.join(SERVERS)}",
+        )
+        parser.add_argument(
+            "--scenarios",
+            default=",".join(ASYNC_PATHS),
+            help=f"Comma separated subset of {', '.join(ASYNC_PATHS)}",
+        )
+        parser.add_argument("--requests", type=int, default=2000)
+        parser.add_argument("--warmup", type=int, default=50)
+        parser.add_argument("--concurrency", type=int, default=64)
+        parser.add_argument("--workers", type=int, default=4)
+        parser.add_argument(
+            "--threads", type=int, default=8, help="Threads per WSGI worker"
+        )
+        parser.add_argument("--port", type=int, default=8765)
+        parser.add_argument(
+            "--profiles",
+            type=int,
+            default=500,
+            help="Profiles and posts sampled for the requests",
+        )
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument(
+            "--save", metavar="PATH", help="Write the results as JSON"
+        )
+
+    def handle(self, *args, **options):
+        servers = [name for name in options["servers"].split(",") if name]
+        scenarios = [name for name in options["scenarios"].split(",") if name]
+        unknown = (set(servers) - set(SERVERS)) | (
+            set(scenarios) - set(ASYNC_PATHS)
+        )
+        if unknown:
+            raise CommandError(f"Unknown servers or scenarios: {unknown}")
+
+        profile_ids = list(
+            UserProfile.objects.order_by("?").values_list("id", flat=True)[
+                : options["profiles"]
+            ]
+        )
+        post_ids = list(
+            Post.objects.order_by("?").values_list("id", flat=True)[
+                : options["profiles"]
+            ]
+        )
+        if not profile_ids or not post_ids:
+            raise CommandError("No data to benchmark, run seed_data first")
+
+        results = {}
+        for server in servers:
+            results[server] = self.run_server(
+                server, scenarios, profile_ids, post_ids, options
+            )
+
+        self.stdout.write(
+            f"{'scenario':<12} "
+            + " ".join(f"{server + ' rps':>10}" for server in servers)
+            + " "
+            + " ".join(f"{server + ' p95':>10}" for server in servers)
+        )
+        for name in scenarios:
+            self.stdout.write(
+                f"{name:<12} "
+                + " ".join(
+                    f"{results[server][name]['throughput_rps']:>10}"
+                    for server in servers
+                )
+                + " "
+                + " ".join(
+                    f"{results[server][name]['p95_ms']:>10}"
+                    for server in servers
+                )
+            )
+
+        if options["save"]:
+            scale = {
+                key: options[key]
+                for key in ("concurrency", "workers", "threads", "requests")
+            }
+            with open(options["save"], "w") as output:
+                json.dump(
+                    report(results, scale, options["concurrency"]),
+                    output,
+                    indent=2,
+                )
+                output.write("\n")
+
+    def run_server(self, server, scenarios, profile_ids, post_ids, options):
+        command, paths = SERVERS[server]
+        command = command.format(
+            workers=options["workers"],
+            threads=options["threads"],
+            port=options["port"],
+        )
+        self.stdout.write(f"Starting {command}")
+        process = subprocess.Popen(
+            shlex.split(command),
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+        )
+        try:
+            wait_for_port(options["port"], process, timeout=30)
+            benchmark = ApiBenchmark(
+                profile_ids,
+                post_ids,
+                concurrency=options["concurrency"],
+                seed=options["seed"],
+                base_url=f"http://127.0.0.1:{options['port']}",
+                paths=paths,
+            )
+            results = {}
+            for name in scenarios:
+                results[name] = benchmark.run(
+                    name, options["requests"], options["warmup"]
+                )
+                self.stdout.write(
+                    f"  {name:<12} {results[name]['throughput_rps']:>8} rps "
+                    f"p95 {results[name]['p95_ms']} ms "
+                    f"{results[name]['statuses']}"
+                )
+            return results
+        finally:
+            process.terminate()
+            process.wait(timeout=30)
@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand
+
+from media_post.timeline import rebuild_timeline
+from user.models import UserProfile
+
+
+class Command(BaseCommand):
+    help = "Rebuild materialized home timelines from posts and follows"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "profile_ids",
+            nargs="*",
+            type=int,
+            help="Only rebuild timelines of these profiles",
+        )
+
+    def handle(self, *args, **options):
+        profiles = UserProfile.objects.all()
+        if options["profile_ids"]:
+            profiles = profiles.filter(id__in=options["profile_ids"])
+
+        count = 0
+        for profile in profiles.iterator():
+            rebuild_timeline(profile)
+            count += 1
+
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt {count} timelines"))
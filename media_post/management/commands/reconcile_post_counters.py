@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand
+
+from media_post.counters import reconcile
+from media_post.models import Post
+
+
+class Command(BaseCommand):
+    help = "Recompute Post.like_count and Post.comment_count from the rows"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=10000,
+            help="Number of posts checked per UPDATE",
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options["batch_size"]
+        fixed = 0
+        last_id = 0
+        while True:
+            ids = list(
+                Post.objects.filter(id__gt=last_id)
+                .order_by("id")
+                .values_list("id", flat=True)[:batch_size]
+            )
+            if not ids:
+                break
+            fixed += reconcile(Post.objects.filter(id__in=ids))
+            last_id = ids[-1]
+
+        self.stdout.write(self.style.SUCCESS(f"Fixed {fixed} posts"))
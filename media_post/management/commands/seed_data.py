@@ -0,0 +1,89 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from media_post.seeding import GraphSeeder
+
+
+class Command(BaseCommand):
+    help = (
+        "Generate a large deterministic synthetic dataset of users, follows, "
+        "posts, likes and comments"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--users", type=int, default=100000)
+        parser.add_argument(
+            "--follows", type=int, default=20, help="Followees per user"
+        )
+        parser.add_argument(
+            "--posts", type=int, default=10, help="Posts per user"
+        )
+        parser.add_argument(
+            "--likes", type=int, default=5, help="Likes per post"
+        )
+        parser.add_argument(
+            "--comments", type=int, default=2, help="Comments per post"
+        )
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument(
+            "--chunk-size",
+            type=int,
+            default=5000,
+            help="Users or posts generated per transaction",
+        )
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=1,
+            help="Processes inserting chunks in parallel",
+        )
+        parser.add_argument(
+            "--prefix", default="seed", help="Prefix of the generated emails"
+        )
+        parser.add_argument(
+            "--no-timelines",
+            action="store_true",
+            help="Skip the home timeline fan-out, run rebuild_timelines later",
+        )
+
+    def handle(self, *args, **options):
+        workers = options["workers"]
+        if workers > 1 and connection.vendor == "sqlite":
+            self.stderr.write(
+                "SQLite takes one writer at a time, using a single worker"
+            )
+            workers = 1
+
+        seeder = GraphSeeder(
+            users=options["users"],
+            follows=options["follows"],
+            posts=options["posts"],
+            likes=options["likes"],
+            comments=options["comments"],
+            seed=options["seed"],
+            chunk_size=options["chunk_size"],
+            prefix=options["prefix"],
+            timelines=not options["no_timelines"],
+        )
+
+        started = time.perf_counter()
+        total = 0
+
+        def progress(phase, rows):
+            nonlocal total
+            total += rows
+            elapsed = time.perf_counter() - started
+            self.stdout.write(
+                f"{phase:<10} {rows:>12,} rows  {elapsed:8.1f}s elapsed"
+            )
+
+        seeder.seed(workers=workers, progress=progress)
+        elapsed = time.perf_counter() - started
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Inserted {total:,} rows in {elapsed:.1f}s "
+                f"({total / elapsed:,.0f} rows/s)"
+            )
+        )
@@ -0,0 +1,41 @@
+# Generated by Django 4.2 on 2026-10-18 04:24
+
+from django.db import migrations, models
+from django.db.models import Count, Min
+
+
+def remove_duplicate_likes(apps, schema_editor):
+    Like = apps.get_model("media_post", "Like")
+    Post = apps.get_model("media_post", "Post")
+
+    duplicated = (
+        Like.objects.values("user", "post")
+        .annotate(rows=Count("id"), keep=Min("id"))
+        .filter(rows__gt=1)
+    )
+    for row in list(duplicated):
+        Like.objects.filter(user_id=row["user"], post_id=row["post"]).exclude(
+            pk=row["keep"]
+        ).delete()
+        Post.objects.filter(pk=row["post"]).update(
+            like_count=Like.objects.filter(post_id=row["post"]).count()
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("media_post", "0007_post_counters"),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            remove_duplicate_likes, migrations.RunPython.noop
+        ),
+        migrations.AddConstraint(
+            model_name="like",
+            constraint=models.UniqueConstraint(
+                fields=("user", "post"), name="unique_like"
+            ),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2 on 2026-10-18 04:33
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("media_post", "0008_unique_like"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="post",
+            name="media_variants",
+            field=models.JSONField(default=dict, editable=False),
+        ),
+    ]
@@ -0,0 +1,72 @@
+# Generated by Django 4.2 on 2026-10-18 04:38
+
+from collections import Counter
+
+from django.db import migrations, models
+import media_post.models
+import media_post.storage
+
+
+def count_references(apps, schema_editor):
+    Blob = apps.get_model("media_post", "Blob")
+    Post = apps.get_model("media_post", "Post")
+    UserProfile = apps.get_model("user", "UserProfile")
+
+    references = Counter(
+        Post.objects.exclude(media_attachment="")
+        .exclude(media_attachment=None)
+        .values_list("media_attachment", flat=True)
+        .iterator()
+    )
+    references.update(
+        UserProfile.objects.exclude(profile_picture="")
+        .exclude(profile_picture=None)
+        .values_list("profile_picture", flat=True)
+        .iterator()
+    )
+    Blob.objects.bulk_create(
+        (
+            Blob(name=name, ref_count=count)
+            for name, count in references.items()
+        ),
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("media_post", "0010_uploadsession"),
+        ("user", "0009_media_storage"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="Blob",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("name", models.CharField(max_length=255, unique=True)),
+                ("ref_count", models.PositiveIntegerField(default=0)),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.AlterField(
+            model_name="post",
+            name="media_attachment",
+            field=models.ImageField(
+                blank=True,
+                null=True,
+                storage=media_post.storage.media_storage,
+                upload_to=media_post.models.post_image_file_path,
+            ),
+        ),
+        migrations.RunPython(count_references, migrations.RunPython.noop),
+    ]
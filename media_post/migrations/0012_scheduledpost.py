@@ -0,0 +1,61 @@
+# Generated by Django 4.2 on 2026-10-18 04:40
+
+from django.db import migrations, models
+import django.db.models.deletion
+import media_post.models
+import media_post.storage
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("user", "0009_media_storage"),
+        ("media_post", "0011_blob"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ScheduledPost",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("hashtag", models.CharField(blank=True, max_length=50)),
+                (
+                    "text_content",
+                    models.TextField(blank=True, max_length=1000),
+                ),
+                (
+                    "media_attachment",
+                    models.ImageField(
+                        blank=True,
+                        null=True,
+                        storage=media_post.storage.media_storage,
+                        upload_to=media_post.models.post_image_file_path,
+                    ),
+                ),
+                ("publish_at", models.DateTimeField()),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+                (
+                    "user",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="scheduled_posts",
+                        to="user.userprofile",
+                    ),
+                ),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name="scheduledpost",
+            index=models.Index(
+                fields=["publish_at"], name="scheduled_publish_idx"
+            ),
+        ),
+    ]
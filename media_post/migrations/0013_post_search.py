@@ -0,0 +1,66 @@
+from django.db import migrations
+
+# the statements of media_post.search as of this migration
+SQLITE_INDEX = [
+    "CREATE VIRTUAL TABLE IF NOT EXISTS media_post_post_search USING fts5("
+    "text_content, hashtag, content='media_post_post', content_rowid='id', "
+    "tokenize='unicode61 remove_diacritics 2')",
+    "CREATE TRIGGER IF NOT EXISTS media_post_post_search_insert "
+    "AFTER INSERT ON media_post_post BEGIN "
+    "INSERT INTO media_post_post_search(rowid, text_content, hashtag) "
+    "VALUES (new.id, new.text_content, new.hashtag); END",
+    "CREATE TRIGGER IF NOT EXISTS media_post_post_search_delete "
+    "AFTER DELETE ON media_post_post BEGIN "
+    "INSERT INTO media_post_post_search"
+    "(media_post_post_search, rowid, text_content, hashtag) "
+    "VALUES ('delete', old.id, old.text_content, old.hashtag); END",
+    "CREATE TRIGGER IF NOT EXISTS media_post_post_search_update "
+    "AFTER UPDATE OF text_content, hashtag ON media_post_post BEGIN "
+    "INSERT INTO media_post_post_search"
+    "(media_post_post_search, rowid, text_content, hashtag) "
+    "VALUES ('delete', old.id, old.text_content, old.hashtag); "
+    "INSERT INTO media_post_post_search(rowid, text_content, hashtag) "
+    "VALUES (new.id, new.text_content, new.hashtag); END",
+    "INSERT INTO media_post_post_search(media_post_post_search) "
+    "VALUES ('rebuild')",
+]
+
+SQLITE_DROP = [
+    "DROP TRIGGER IF EXISTS media_post_post_search_insert",
+    "DROP TRIGGER IF EXISTS media_post_post_search_delete",
+    "DROP TRIGGER IF EXISTS media_post_post_search_update",
+    "DROP TABLE IF EXISTS media_post_post_search",
+]
+
+POSTGRES_INDEX = [
+    "CREATE INDEX IF NOT EXISTS post_search_idx ON media_post_post "
+    "USING GIN ((setweight(to_tsvector('simple', coalesce(hashtag, '')), "
+    "'A') || setweight(to_tsvector('simple', coalesce(text_content, '')), "
+    "'B')))",
+]
+
+POSTGRES_DROP = ["DROP INDEX IF EXISTS post_search_idx"]
+
+
+def run(statements_by_vendor):
+    def execute(apps, schema_editor):
+        for statement in statements_by_vendor.get(
+            schema_editor.connection.vendor, ()
+        ):
+            schema_editor.execute(statement)
+
+    return execute
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("media_post", "0012_scheduledpost"),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            run({"sqlite": SQLITE_INDEX, "postgresql": POSTGRES_INDEX}),
+            run({"sqlite": SQLITE_DROP, "postgresql": POSTGRES_DROP}),
+        ),
+    ]
@@ -0,0 +1,178 @@
+# Generated by Django 4.2 on 2026-10-18 04:49
+
+import re
+from datetime import datetime, timezone as dt_timezone
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.utils import timezone
+
+# the helpers of media_post.hashtags as of this migration
+HASHTAG = re.compile(r"#(\w+)")
+WORD = re.compile(r"\w+")
+
+
+def extract_hashtags(post):
+    names = WORD.findall(post.hashtag or "")
+    names += HASHTAG.findall(post.text_content or "")
+    return {name.lower()[:50] for name in names}
+
+
+def bucket_of(moment):
+    size = settings.TRENDING_BUCKET.total_seconds()
+    start = moment.timestamp() // size * size
+    return datetime.fromtimestamp(start, tz=dt_timezone.utc)
+
+
+def populate_hashtags(apps, schema_editor):
+    Post = apps.get_model("media_post", "Post")
+    Hashtag = apps.get_model("media_post", "Hashtag")
+    PostHashtag = apps.get_model("media_post", "PostHashtag")
+
+    ids = {}
+    links = []
+    for post in Post.objects.only(
+        "hashtag", "text_content", "created_at"
+    ).iterator():
+        for name in extract_hashtags(post):
+            if name not in ids:
+                ids[name] = Hashtag.objects.create(name=name).id
+            links.append(
+                PostHashtag(
+                    post_id=post.id,
+                    hashtag_id=ids[name],
+                    created_at=post.created_at,
+                )
+            )
+    PostHashtag.objects.bulk_create(links, batch_size=1000)
+
+
+def populate_counters(apps, schema_editor):
+    PostHashtag = apps.get_model("media_post", "PostHashtag")
+    HashtagCounter = apps.get_model("media_post", "HashtagCounter")
+
+    uses = {}
+    since = bucket_of(timezone.now() - settings.TRENDING_WINDOW)
+    for hashtag_id, created_at in PostHashtag.objects.filter(
+        created_at__gte=since
+    ).values_list("hashtag_id", "created_at"):
+        key = (hashtag_id, bucket_of(created_at))
+        uses[key] = uses.get(key, 0) + 1
+    HashtagCounter.objects.bulk_create(
+        HashtagCounter(hashtag_id=hashtag_id, bucket=bucket, count=count)
+        for (hashtag_id, bucket), count in uses.items()
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("media_post", "0013_post_search"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="Hashtag",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("name", models.CharField(max_length=50, unique=True)),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name="PostHashtag",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("created_at", models.DateTimeField()),
+                (
+                    "hashtag",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        to="media_post.hashtag",
+                    ),
+                ),
+                (
+                    "post",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        to="media_post.post",
+                    ),
+                ),
+            ],
+        ),
+        migrations.CreateModel(
+            name="HashtagCounter",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("bucket", models.DateTimeField()),
+                ("count", models.PositiveIntegerField(default=0)),
+                (
+                    "hashtag",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="counters",
+                        to="media_post.hashtag",
+                    ),
+                ),
+            ],
+        ),
+        migrations.AddField(
+            model_name="post",
+            name="hashtags",
+            field=models.ManyToManyField(
+                blank=True,
+                related_name="posts",
+                through="media_post.PostHashtag",
+                to="media_post.hashtag",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="posthashtag",
+            index=models.Index(
+                fields=["hashtag", "-created_at"], name="post_hashtag_idx"
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name="posthashtag",
+            constraint=models.UniqueConstraint(
+                fields=("post", "hashtag"), name="unique_post_hashtag"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="hashtagcounter",
+            index=models.Index(fields=["bucket"], name="hashtag_bucket_idx"),
+        ),
+        migrations.AddConstraint(
+            model_name="hashtagcounter",
+            constraint=models.UniqueConstraint(
+                fields=("hashtag", "bucket"), name="unique_hashtag_bucket"
+            ),
+        ),
+        migrations.RunPython(populate_hashtags, migrations.RunPython.noop),
+        migrations.RunPython(populate_counters, migrations.RunPython.noop),
+    ]
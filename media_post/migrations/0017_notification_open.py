@@ -0,0 +1,55 @@
+# Generated by Django 4.2 on 2026-10-18 05:54
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("media_post", "0016_notification"),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name="notification",
+            name="notification_recipient_idx",
+        ),
+        # existing notifications may repeat a key, they start closed
+        migrations.AddField(
+            model_name="notification",
+            name="is_open",
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AlterField(
+            model_name="notification",
+            name="is_open",
+            field=models.BooleanField(default=True),
+        ),
+        migrations.AddIndex(
+            model_name="notification",
+            index=models.Index(
+                fields=["recipient", "-updated_at", "-id"],
+                name="notification_recipient_idx",
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name="notification",
+            constraint=models.UniqueConstraint(
+                condition=models.Q(("is_open", True), ("is_read", False)),
+                fields=("recipient", "kind", "post"),
+                name="unique_open_notification",
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name="notification",
+            constraint=models.UniqueConstraint(
+                condition=models.Q(
+                    ("is_open", True),
+                    ("is_read", False),
+                    ("post__isnull", True),
+                ),
+                fields=("recipient", "kind"),
+                name="unique_open_post_less_notification",
+            ),
+        ),
+    ]
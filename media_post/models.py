@@ -1,8 +1,12 @@
+from django.conf import settings
 from django.db import models
+from django.utils import timezone
 from django.utils.translation import gettext as _
 import os
 import uuid
 from django.utils.text import slugify
+
+from media_post.storage import media_storage
 from user.models import UserProfile
 
 
@@ -18,11 +22,102 @@ class Post(models.Model):
     hashtag = models.CharField(max_length=50, blank=True)
     text_content = models.TextField(max_length=1000, blank=True)
     media_attachment = models.ImageField(
-        upload_to=post_image_file_path, blank=True, null=True
+        upload_to=post_image_file_path,
+        storage=media_storage,
+        blank=True,
+        null=True,
+    )
+    media_variants = models.JSONField(default=dict, editable=False)
+    hashtags = models.ManyToManyField(
+        "Hashtag", through="PostHashtag", related_name="posts", blank=True
     )
+    like_count = models.PositiveIntegerField(default=0, editable=False)
+    comment_count = models.PositiveIntegerField(default=0, editable=False)
+    created_at = models.DateTimeField(auto_now_add=True)
+    # bumped by every change that shows in the rendered post
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=["-created_at", "-id"], name="post_created_idx"
+            ),
+            models.Index(
+                fields=["user", "-created_at", "-id"], name="post_author_idx"
+            ),
+        ]
+
+    def latest_comments(self):
+        """The newest comments, as many as the post detail embeds."""
+        return self.comments.order_by("-created_at", "-id")[
+            : settings.POST_DETAIL_COMMENTS
+        ]
+
+
+class Hashtag(models.Model):
+    name = models.CharField(max_length=50, unique=True)
     created_at = models.DateTimeField(auto_now_add=True)
 
 
+class PostHashtag(models.Model):
+    post = models.ForeignKey(Post, on_delete=models.CASCADE)
+    hashtag = models.ForeignKey(Hashtag, on_delete=models.CASCADE)
+    created_at = models.DateTimeField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["post", "hashtag"], name="unique_post_hashtag"
+            ),
+        ]
+        indexes = [
+            models.Index(
+                fields=["hashtag", "-created_at"], name="post_hashtag_idx"
+            ),
+        ]
+
+
+class HashtagCounter(models.Model):
+    """Uses of a hashtag within one time bucket."""
+
+    hashtag = models.ForeignKey(
+        Hashtag, on_delete=models.CASCADE, related_name="counters"
+    )
+    bucket = models.DateTimeField()
+    count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["hashtag", "bucket"], name="unique_hashtag_bucket"
+            ),
+        ]
+        indexes = [
+            models.Index(fields=["bucket"], name="hashtag_bucket_idx"),
+        ]
+
+
+class ScheduledPost(models.Model):
+    user = models.ForeignKey(
+        UserProfile, on_delete=models.CASCADE, related_name="scheduled_posts"
+    )
+    hashtag = models.CharField(max_length=50, blank=True)
+    text_content = models.TextField(max_length=1000, blank=True)
+    media_attachment = models.ImageField(
+        upload_to=post_image_file_path,
+        storage=media_storage,
+        blank=True,
+        null=True,
+    )
+    publish_at = models.DateTimeField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["publish_at"], name="scheduled_publish_idx"),
+        ]
+
+
 class Like(models.Model):
     user = models.ForeignKey(
         UserProfile, on_delete=models.CASCADE, related_name="likes"
@@ -32,6 +127,18 @@ class Like(models.Model):
     )
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["user", "post"], name="unique_like"
+            ),
+        ]
+        indexes = [
+            models.Index(
+                fields=["post", "-created_at", "-id"], name="like_created_idx"
+            ),
+        ]
+
 
 class Comment(models.Model):
     user = models.ForeignKey(UserProfile, on_delete=models.CASCADE)
@@ -40,3 +147,122 @@ class Comment(models.Model):
     )
     text_content = models.TextField(max_length=1000)
     created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=["post", "-created_at", "-id"],
+                name="comment_created_idx",
+            ),
+        ]
+
+
+class TimelineEntry(models.Model):
+    owner = models.ForeignKey(
+        UserProfile, on_delete=models.CASCADE, related_name="timeline"
+    )
+    post = models.ForeignKey(
+        Post, on_delete=models.CASCADE, related_name="timeline_entries"
+    )
+    created_at = models.DateTimeField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["owner", "post"], name="unique_timeline_entry"
+            ),
+        ]
+        indexes = [
+            models.Index(
+                fields=["owner", "-created_at", "-post"],
+                name="timeline_owner_idx",
+            ),
+        ]
+
+
+class UploadSession(models.Model):
+    user = models.ForeignKey(
+        UserProfile, on_delete=models.CASCADE, related_name="uploads"
+    )
+    filename = models.CharField(max_length=255)
+    file_path = models.CharField(max_length=255)
+    size = models.PositiveBigIntegerField()
+    offset = models.PositiveBigIntegerField(default=0)
+    image_format = models.CharField(max_length=10, blank=True)
+    sha256 = models.CharField(max_length=64, blank=True)
+    is_complete = models.BooleanField(default=False)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+
+class Blob(models.Model):
+    """Reference count of a stored media file."""
+
+    name = models.CharField(max_length=255, unique=True)
+    ref_count = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+
+class Notification(models.Model):
+    """Likes, comments or follows for a recipient, grouped by window.
+
+    Events of one kind, on the same post, that arrive while the
+    notification is open are folded into it: `count` grows and `actor` is
+    the latest actor. A notification closes once it is read or older than
+    NOTIFICATION_WINDOW, and there is at most one open notification per
+    recipient, kind and post.
+    """
+
+    LIKE = "like"
+    COMMENT = "comment"
+    FOLLOW = "follow"
+    KIND_CHOICES = (
+        (LIKE, "Like"),
+        (COMMENT, "Comment"),
+        (FOLLOW, "Follow"),
+    )
+
+    recipient = models.ForeignKey(
+        UserProfile, on_delete=models.CASCADE, related_name="notifications"
+    )
+    kind = models.CharField(max_length=10, choices=KIND_CHOICES)
+    post = models.ForeignKey(
+        Post, on_delete=models.CASCADE, null=True, related_name="+"
+    )
+    actor = models.ForeignKey(
+        UserProfile, on_delete=models.CASCADE, related_name="+"
+    )
+    count = models.PositiveIntegerField(default=1)
+    is_read = models.BooleanField(default=False)
+    # cleared by the next event past NOTIFICATION_WINDOW, see `record`
+    is_open = models.BooleanField(default=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    # set by bulk_update when events are folded in, which skips auto_now
+    updated_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=["recipient", "-updated_at", "-id"],
+                name="notification_recipient_idx",
+            ),
+            models.Index(
+                fields=["recipient"],
+                condition=models.Q(is_read=False),
+                name="notification_unread_idx",
+            ),
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=["recipient", "kind", "post"],
+                condition=models.Q(is_read=False, is_open=True),
+                name="unique_open_notification",
+            ),
+            # NULLs are distinct in the constraint above
+            models.UniqueConstraint(
+                fields=["recipient", "kind"],
+                condition=models.Q(
+                    is_read=False, is_open=True, post__isnull=True
+                ),
+                name="unique_open_post_less_notification",
+            ),
+        ]
@@ -0,0 +1,244 @@
+"""Notifications about likes, comments and follows.
+
+Events are folded into `Notification` rows per recipient, kind and post,
+so a burst of likes on one post costs one row and one update per flush
+instead of a write per like. With NOTIFICATION_BUFFER_ENABLED the events
+are counted in a buffer and written in bulk by the `flush_notifications`
+task, otherwise each event is written when its transaction commits.
+
+Every written notification is also published to the pub/sub channel of
+its recipient, which `notification_stream` relays to open event streams.
+"""
+
+import threading
+from collections import defaultdict
+
+import redis
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from media_post.models import Notification
+from media_post.serializers import NotificationSerializer
+from social_media_api.pubsub import get_pubsub
+
+CHANNEL = "notifications:{}"
+COUNTS_KEY = "notifications:counts"
+ACTORS_KEY = "notifications:actors"
+
+
+def channel_of(profile_id):
+    return CHANNEL.format(profile_id)
+
+
+def encode_key(key):
+    recipient_id, kind, post_id = key
+    return f"{recipient_id}:{kind}:{post_id or ''}"
+
+
+def decode_key(field):
+    recipient_id, kind, post_id = field.split(":")
+    return int(recipient_id), kind, int(post_id) if post_id else None
+
+
+class RedisNotificationBuffer:
+    def __init__(self, url):
+        self.client = redis.Redis.from_url(url, decode_responses=True)
+
+    def add(self, key, actor_id):
+        field = encode_key(key)
+        pipe = self.client.pipeline(transaction=False)
+        pipe.hincrby(COUNTS_KEY, field, 1)
+        pipe.hset(ACTORS_KEY, field, actor_id)
+        pipe.execute()
+
+    def drain(self):
+        """Take the pending events out of the buffer, as `record` input."""
+        pipe = self.client.pipeline()
+        pipe.hgetall(COUNTS_KEY)
+        pipe.hgetall(ACTORS_KEY)
+        pipe.delete(COUNTS_KEY, ACTORS_KEY)
+        counts, actors, _ = pipe.execute()
+        return {
+            decode_key(field): (int(count), int(actors[field]))
+            for field, count in counts.items()
+            if field in actors
+        }
+
+    def restore(self, drained):
+        pipe = self.client.pipeline(transaction=False)
+        for key, (count, actor_id) in drained.items():
+            pipe.hincrby(COUNTS_KEY, encode_key(key), count)
+            pipe.hsetnx(ACTORS_KEY, encode_key(key), actor_id)
+        pipe.execute()
+
+
+class LocalNotificationBuffer:
+    """In-process stand-in for development and tests."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.counts = defaultdict(int)
+        self.actors = {}
+
+    def add(self, key, actor_id):
+        with self.lock:
+            self.counts[key] += 1
+            self.actors[key] = actor_id
+
+    def drain(self):
+        with self.lock:
+            drained = {
+                key: (count, self.actors[key])
+                for key, count in self.counts.items()
+            }
+            self.counts = defaultdict(int)
+            self.actors = {}
+        return drained
+
+    def restore(self, drained):
+        with self.lock:
+            for key, (count, actor_id) in drained.items():
+                self.counts[key] += count
+                self.actors.setdefault(key, actor_id)
+
+
+_buffer = None
+
+
+def get_buffer():
+    """Return the configured buffer or None when events are written inline."""
+    global _buffer
+
+    if not settings.NOTIFICATION_BUFFER_ENABLED:
+        return None
+
+    if _buffer is None:
+        if settings.NOTIFICATION_BUFFER_URL == "local":
+            _buffer = LocalNotificationBuffer()
+        else:
+            _buffer = RedisNotificationBuffer(settings.NOTIFICATION_BUFFER_URL)
+    return _buffer
+
+
+def notify(recipient_id, kind, actor_id, post_id=None):
+    """Record an event once the current transaction commits."""
+    if recipient_id == actor_id:
+        return
+    key = (recipient_id, kind, post_id)
+    notification_buffer = get_buffer()
+    if notification_buffer is not None:
+        transaction.on_commit(lambda: notification_buffer.add(key, actor_id))
+    else:
+        transaction.on_commit(lambda: record({key: (1, actor_id)}))
+
+
+def key_of(notification):
+    return notification.recipient_id, notification.kind, notification.post_id
+
+
+def record(events):
+    """Fold `{(recipient, kind, post): (count, latest actor)}` into rows.
+
+    Counts are added in the database, so concurrent flushes never lose
+    events. Takes one query to find the open notifications of the
+    recipients, one to close those past NOTIFICATION_WINDOW if any, at
+    most one bulk insert and one bulk update whatever the number of
+    events, and one query to load the written notifications, which are
+    returned.
+    """
+    now = timezone.now()
+    opened = Notification.objects.filter(
+        recipient_id__in={key[0] for key in events},
+        is_read=False,
+        is_open=True,
+    )
+    open_ids, expired_ids = {}, []
+    for notification in opened.only("recipient", "kind", "post", "created_at"):
+        if notification.created_at < now - settings.NOTIFICATION_WINDOW:
+            expired_ids.append(notification.id)
+        else:
+            open_ids[key_of(notification)] = notification.id
+
+    created, updated = [], []
+    for key, (count, actor_id) in events.items():
+        if key in open_ids:
+            updated.append(
+                Notification(
+                    id=open_ids[key],
+                    count=F("count") + count,
+                    actor_id=actor_id,
+                    updated_at=now,
+                )
+            )
+        else:
+            recipient_id, kind, post_id = key
+            created.append(
+                Notification(
+                    recipient_id=recipient_id,
+                    kind=kind,
+                    post_id=post_id,
+                    actor_id=actor_id,
+                    count=count,
+                    updated_at=now,
+                )
+            )
+
+    with transaction.atomic():
+        if expired_ids:
+            Notification.objects.filter(id__in=expired_ids).update(
+                is_open=False
+            )
+        Notification.objects.bulk_update(
+            updated, ["count", "actor", "updated_at"], batch_size=1000
+        )
+        insert_notifications(created)
+        # the counts are only known once added up in the database
+        notifications = [
+            notification
+            for notification in opened
+            if key_of(notification) in events
+        ]
+    transaction.on_commit(lambda: publish(notifications))
+    return notifications
+
+
+def insert_notifications(notifications):
+    """Open `notifications`, folding those another flush opened first.
+
+    One bulk insert unless the unique open notification constraint
+    rejects it, then the notifications are inserted one at a time.
+    """
+    try:
+        with transaction.atomic():
+            Notification.objects.bulk_create(notifications, batch_size=1000)
+        return
+    except IntegrityError:
+        pass
+
+    for notification in notifications:
+        try:
+            with transaction.atomic():
+                notification.save(force_insert=True)
+        except IntegrityError:
+            Notification.objects.filter(
+                recipient_id=notification.recipient_id,
+                kind=notification.kind,
+                post_id=notification.post_id,
+                is_read=False,
+                is_open=True,
+            ).update(
+                count=F("count") + notification.count,
+                actor_id=notification.actor_id,
+                updated_at=notification.updated_at,
+            )
+
+
+def publish(notifications):
+    pubsub = get_pubsub()
+    for notification in notifications:
+        pubsub.publish(
+            channel_of(notification.recipient_id),
+            NotificationSerializer(notification).data,
+        )
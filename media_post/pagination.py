@@ -0,0 +1,148 @@
+from base64 import b64decode, b64encode
+from binascii import Error as BinasciiError
+
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+class KeysetPagination(BasePagination):
+    """Cursor pagination on the `(created_at, id)` pair.
+
+    Every page is a range scan from the last seen row, so deep pages cost
+    the same as the first one. Subclasses may seek on another timestamp
+    with `ordering_field`.
+    """
+
+    ordering_field = "created_at"
+    cursor_query_param = "cursor"
+    page_size = 20
+    page_size_query_param = "page_size"
+    max_page_size = 100
+    invalid_cursor_message = "Invalid cursor"
+
+    def paginate_queryset(self, queryset, request, view=None):
+        return self.set_page(list(self.page_queryset(queryset, request)))
+
+    async def apaginate_queryset(self, queryset, request, view=None):
+        page = self.page_queryset(queryset, request)
+        return self.set_page([obj async for obj in page])
+
+    def page_queryset(self, queryset, request):
+        """The rows of the requested page, plus one to detect a next page."""
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        cursor = self.decode_cursor(request)
+
+        field = self.ordering_field
+        queryset = queryset.order_by(f"-{field}", "-id")
+        if cursor is not None:
+            moment, pk = cursor
+            queryset = queryset.filter(
+                Q(**{f"{field}__lt": moment})
+                | Q(**{field: moment, "id__lt": pk})
+            )
+        return queryset[: self.page_size + 1]
+
+    def set_page(self, results):
+        self.has_next = len(results) > self.page_size
+        self.page = results[: self.page_size]
+        return self.page
+
+    def get_page_size(self, request):
+        try:
+            page_size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        if page_size <= 0:
+            return self.page_size
+        return min(page_size, self.max_page_size)
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if encoded is None:
+            return None
+
+        try:
+            created_at, pk = (
+                b64decode(encoded.encode("ascii"))
+                .decode("ascii")
+                .rsplit("|", 1)
+            )
+            created_at, pk = parse_datetime(created_at), int(pk)
+        except (BinasciiError, UnicodeError, ValueError):
+            raise NotFound(self.invalid_cursor_message)
+        if created_at is None:
+            raise NotFound(self.invalid_cursor_message)
+
+        return created_at, pk
+
+    def encode_cursor(self, obj):
+        moment = getattr(obj, self.ordering_field)
+        position = f"{moment.isoformat()}|{obj.pk}"
+        encoded = b64encode(position.encode("ascii")).decode("ascii")
+        return replace_query_param(
+            self.request.build_absolute_uri(), self.cursor_query_param, encoded
+        )
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        return self.encode_cursor(self.page[-1])
+
+    def get_paginated_response(self, data):
+        return Response({"next": self.get_next_link(), "results": data})
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            "type": "object",
+            "properties": {
+                "next": {"type": "string", "nullable": True, "format": "uri"},
+                "results": schema,
+            },
+        }
+
+
+class UpdatedPagination(KeysetPagination):
+    """Keyset pagination on `(updated_at, id)`, latest activity first."""
+
+    ordering_field = "updated_at"
+
+
+class RankPagination(KeysetPagination):
+    """Offset pagination for results ordered by relevance.
+
+    A rank has no stable key to seek from, so the cursor carries the
+    offset of the next page.
+    """
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        self.offset = self.decode_cursor(request) or 0
+        return self.set_page(
+            list(queryset[self.offset : self.offset + self.page_size + 1])
+        )
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if encoded is None:
+            return None
+
+        try:
+            offset = int(b64decode(encoded.encode("ascii")).decode("ascii"))
+        except (BinasciiError, UnicodeError, ValueError):
+            raise NotFound(self.invalid_cursor_message)
+        if offset < 0:
+            raise NotFound(self.invalid_cursor_message)
+        return offset
+
+    def encode_cursor(self, obj):
+        position = str(self.offset + len(self.page))
+        encoded = b64encode(position.encode("ascii")).decode("ascii")
+        return replace_query_param(
+            self.request.build_absolute_uri(), self.cursor_query_param, encoded
+        )
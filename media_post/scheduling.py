@@ -0,0 +1,42 @@
+from django.db import transaction
+from django.utils import timezone
+
+from media_post.blobs import acquire
+from media_post.hashtags import tag_posts
+from media_post.models import Post, ScheduledPost
+
+
+def publish_due_posts(limit):
+    """Turn up to `limit` due scheduled posts into posts.
+
+    Rows are claimed with SKIP LOCKED where the database supports it, so
+    overlapping beat ticks never publish a post twice. Returns the new
+    posts.
+    """
+    with transaction.atomic():
+        due = list(
+            ScheduledPost.objects.select_for_update(skip_locked=True)
+            .filter(publish_at__lte=timezone.now())
+            .order_by("publish_at")[:limit]
+        )
+        if not due:
+            return []
+
+        posts = Post.objects.bulk_create(
+            Post(
+                user_id=scheduled.user_id,
+                hashtag=scheduled.hashtag,
+                text_content=scheduled.text_content,
+                media_attachment=scheduled.media_attachment.name or None,
+            )
+            for scheduled in due
+        )
+        # bulk_create sends no signals, do what the Post handlers would
+        tag_posts(posts, created=True)
+        for post in posts:
+            if post.media_attachment:
+                acquire(post.media_attachment.name)
+        ScheduledPost.objects.filter(
+            id__in=[scheduled.id for scheduled in due]
+        ).delete()
+    return posts
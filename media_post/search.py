@@ -0,0 +1,170 @@
+import re
+
+from django.conf import settings
+from django.db import connection
+
+from media_post.models import Post
+from user.models import Follow
+
+TOKEN = re.compile(r"\w+")
+MAX_TERMS = 8
+
+SQLITE_INDEX = [
+    "CREATE VIRTUAL TABLE IF NOT EXISTS media_post_post_search USING fts5("
+    "text_content, hashtag, content='media_post_post', content_rowid='id', "
+    "tokenize='unicode61 remove_diacritics 2')",
+    "CREATE TRIGGER IF NOT EXISTS media_post_post_search_insert "
+    "AFTER INSERT ON media_post_post BEGIN "
+    "INSERT INTO media_post_post_search(rowid, text_content, hashtag) "
+    "VALUES (new.id, new.text_content, new.hashtag); END",
+    "CREATE TRIGGER IF NOT EXISTS media_post_post_search_delete "
+    "AFTER DELETE ON media_post_post BEGIN "
+    "INSERT INTO media_post_post_search"
+    "(media_post_post_search, rowid, text_content, hashtag) "
+    "VALUES ('delete', old.id, old.text_content, old.hashtag); END",
+    "CREATE TRIGGER IF NOT EXISTS media_post_post_search_update "
+    "AFTER UPDATE OF text_content, hashtag ON media_post_post BEGIN "
+    "INSERT INTO media_post_post_search"
+    "(media_post_post_search, rowid, text_content, hashtag) "
+    "VALUES ('delete', old.id, old.text_content, old.hashtag); "
+    "INSERT INTO media_post_post_search(rowid, text_content, hashtag) "
+    "VALUES (new.id, new.text_content, new.hashtag); END",
+]
+
+# hashtags weigh more than words of the text
+POSTGRES_VECTOR = (
+    "setweight(to_tsvector('simple', coalesce(hashtag, '')), 'A') || "
+    "setweight(to_tsvector('simple', coalesce(text_content, '')), 'B')"
+)
+POSTGRES_INDEX = [
+    "CREATE INDEX IF NOT EXISTS post_search_idx ON media_post_post "
+    f"USING GIN (({POSTGRES_VECTOR}))",
+]
+
+
+def install_index(db_connection, rebuild=False):
+    """Create the search index if missing, optionally reindexing all posts.
+
+    On SQLite the index is an FTS5 table kept current by triggers. Table
+    rebuilds in later migrations drop those triggers, so this also runs
+    after every migrate.
+    """
+    with db_connection.cursor() as cursor:
+        if db_connection.vendor == "sqlite":
+            for statement in SQLITE_INDEX:
+                cursor.execute(statement)
+            if rebuild:
+                cursor.execute(
+                    "INSERT INTO media_post_post_search"
+                    "(media_post_post_search) VALUES ('rebuild')"
+                )
+        elif db_connection.vendor == "postgresql":
+            for statement in POSTGRES_INDEX:
+                cursor.execute(statement)
+
+
+def drop_index(db_connection):
+    with db_connection.cursor() as cursor:
+        if db_connection.vendor == "sqlite":
+            for action in ("insert", "delete", "update"):
+                cursor.execute(
+                    f"DROP TRIGGER IF EXISTS media_post_post_search_{action}"
+                )
+            cursor.execute("DROP TABLE IF EXISTS media_post_post_search")
+        elif db_connection.vendor == "postgresql":
+            cursor.execute("DROP INDEX IF EXISTS post_search_idx")
+
+
+def search_terms(query):
+    return TOKEN.findall(query.lower())[:MAX_TERMS]
+
+
+def _visible_to(profile_id, column):
+    """SQL condition on the author `column`: the profile or its followees."""
+    if profile_id is None:
+        return "", []
+    return (
+        f" AND ({column} = %s OR {column} IN ("
+        f"SELECT followee_id FROM {Follow._meta.db_table} "
+        f"WHERE follower_id = %s))",
+        [profile_id, profile_id],
+    )
+
+
+def _sqlite_ranked_ids(terms, offset, limit, profile_id=None):
+    # quoting turns every term into a plain token, never FTS5 syntax
+    expression = " ".join(f'"{term}"' for term in terms)
+    visible, visible_params = _visible_to(profile_id, "post.user_id")
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT id FROM ("
+            "SELECT search.rowid AS id, "
+            "bm25(media_post_post_search, 1.0, 2.0) AS score "
+            "FROM media_post_post_search AS search "
+            "JOIN media_post_post AS post ON post.id = search.rowid "
+            f"WHERE media_post_post_search MATCH %s{visible} "
+            "ORDER BY search.rowid DESC LIMIT %s"
+            ") ORDER BY score, id DESC LIMIT %s OFFSET %s",
+            [
+                expression,
+                *visible_params,
+                settings.SEARCH_CANDIDATES,
+                limit,
+                offset,
+            ],
+        )
+        return [row[0] for row in cursor.fetchall()]
+
+
+def _postgres_ranked_ids(terms, offset, limit, profile_id=None):
+    expression = " & ".join(terms)
+    visible, visible_params = _visible_to(profile_id, "user_id")
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"SELECT id FROM ("
+            f"SELECT id, ts_rank_cd(({POSTGRES_VECTOR}), "
+            f"to_tsquery('simple', %s)) AS score FROM media_post_post "
+            f"WHERE ({POSTGRES_VECTOR}) @@ to_tsquery('simple', %s)"
+            f"{visible} ORDER BY id DESC LIMIT %s"
+            f") AS candidates ORDER BY score DESC, id DESC LIMIT %s OFFSET %s",
+            [
+                expression,
+                expression,
+                *visible_params,
+                settings.SEARCH_CANDIDATES,
+                limit,
+                offset,
+            ],
+        )
+        return [row[0] for row in cursor.fetchall()]
+
+
+class PostSearch:
+    """Posts matching a query, best match first.
+
+    Only the newest SEARCH_CANDIDATES matches are ranked, which bounds the
+    cost of terms that appear in millions of posts. Slicing runs the
+    ranked lookup for just that window and loads the posts by primary key.
+    With `profile` only its own posts and those of its followees match,
+    so the candidates and the window hold visible posts only.
+    """
+
+    def __init__(self, query, queryset=None, profile=None):
+        self.terms = search_terms(query)
+        self.queryset = Post.objects.all() if queryset is None else queryset
+        self.profile_id = None if profile is None else profile.id
+
+    def ranked_ids(self, offset, limit):
+        if not self.terms:
+            return []
+        if connection.vendor == "postgresql":
+            return _postgres_ranked_ids(
+                self.terms, offset, limit, self.profile_id
+            )
+        return _sqlite_ranked_ids(self.terms, offset, limit, self.profile_id)
+
+    def __getitem__(self, window):
+        offset = window.start or 0
+        ids = self.ranked_ids(offset, window.stop - offset)
+        posts = self.queryset.in_bulk(ids)
+        return [posts[pk] for pk in ids if pk in posts]
@@ -0,0 +1,262 @@
+import multiprocessing
+import random
+from collections import Counter
+
+from django.contrib.auth.hashers import make_password
+from django.core.management.color import no_style
+from django.db import connection, connections, transaction
+from django.db.models import (
+    Count,
+    IntegerField,
+    Max,
+    OuterRef,
+    Subquery,
+)
+from django.db.models.functions import Coalesce
+
+from media_post.hashtags import bucket_of, count_uses
+from media_post.models import Comment, Hashtag, Like, Post, PostHashtag
+from media_post.timeline import fan_out_post_range
+from user.models import Follow, User, UserProfile
+
+WORDS = (
+    "morning coffee city walk sunset beach music friends weekend travel "
+    "food photo work book movie rain summer winter park dog cat run"
+).split()
+PHASES = ("users", "follows", "posts", "reactions")
+
+
+def _close_connections():
+    # forked workers must not share the parent's database connections
+    connections.close_all()
+
+
+class GraphSeeder:
+    """Insert a synthetic social graph with chunked bulk inserts.
+
+    Primary keys are planned up front from the current maximum ids, so
+    every chunk knows the rows it references and chunks can be inserted
+    by several processes. Each chunk draws from its own generator seeded
+    with `seed`, the phase and the chunk number, which makes the graph
+    the same whatever the number of workers.
+
+    Followees are drawn log-uniformly, so a few profiles get most of the
+    followers. Timelines, hashtags and counters are filled in the way the
+    signals would have done it.
+    """
+
+    def __init__(
+        self,
+        users,
+        follows=20,
+        posts=5,
+        likes=5,
+        comments=2,
+        seed=0,
+        chunk_size=5000,
+        prefix="seed",
+        timelines=True,
+    ):
+        self.users = users
+        self.follows = max(0, min(follows, users - 1))
+        self.posts = posts
+        self.likes = min(likes, users)
+        self.comments = comments
+        self.seed_value = seed
+        self.chunk_size = chunk_size
+        self.prefix = prefix
+        self.timelines = timelines
+        # one hash for every user, hashing per row dominates the run time
+        self.password = make_password("password")
+
+    def plan(self):
+        def next_id(model):
+            return (model.objects.aggregate(last=Max("id"))["last"] or 0) + 1
+
+        self.user_base = next_id(User)
+        self.profile_base = next_id(UserProfile)
+        self.post_base = next_id(Post)
+        Hashtag.objects.bulk_create(
+            [Hashtag(name=word) for word in WORDS], ignore_conflicts=True
+        )
+        self.hashtag_ids = dict(
+            Hashtag.objects.filter(name__in=WORDS).values_list("name", "id")
+        )
+
+    def seed(self, workers=1, progress=None):
+        """Insert the graph, returns the profile ids and the post ids."""
+        self.plan()
+        for phase in PHASES:
+            total = self.users if phase != "reactions" else self.post_count
+            chunks = [
+                (phase, start, min(start + self.chunk_size, total))
+                for start in range(0, total, self.chunk_size)
+            ]
+            if workers > 1 and len(chunks) > 1:
+                _close_connections()
+                context = multiprocessing.get_context("fork")
+                with context.Pool(workers, _close_connections) as pool:
+                    rows = sum(pool.imap_unordered(self.seed_chunk, chunks))
+            else:
+                rows = sum(map(self.seed_chunk, chunks))
+            if phase == "follows":
+                # read by the timeline fan-out of the posts phase
+                self.count_followers()
+            if progress is not None:
+                progress(phase, rows)
+
+        self.reset_sequences()
+        return (
+            list(range(self.profile_base, self.profile_base + self.users)),
+            list(range(self.post_base, self.post_base + self.post_count)),
+        )
+
+    @property
+    def post_count(self):
+        return self.users * self.posts
+
+    def seed_chunk(self, chunk):
+        phase, start, stop = chunk
+        rng = random.Random(f"{self.seed_value}:{phase}:{start}")
+        with transaction.atomic():
+            return getattr(self, f"seed_{phase}")(rng, start, stop)
+
+    def profile_id(self, index):
+        return self.profile_base + index
+
+    def seed_users(self, rng, start, stop):
+        User.objects.bulk_create(
+            User(
+                id=self.user_base + index,
+                email=f"{self.prefix}{self.user_base + index}@example.com",
+                password=self.password,
+                first_name=f"First{index}",
+                last_name=f"Last{index}",
+            )
+            for index in range(start, stop)
+        )
+        UserProfile.objects.bulk_create(
+            UserProfile(
+                id=self.profile_id(index),
+                user_id=self.user_base + index,
+                sex=rng.choice("MF"),
+            )
+            for index in range(start, stop)
+        )
+        return (stop - start) * 2
+
+    def followees(self, rng, follower):
+        if self.follows * 2 > self.users:
+            candidates = rng.sample(range(self.users), self.follows + 1)
+            return [index for index in candidates if index != follower][
+                : self.follows
+            ]
+
+        chosen = set()
+        while len(chosen) < self.follows:
+            # log-uniform: index i is picked with a weight close to 1 / i
+            index = int(self.users ** rng.random()) - 1
+            if index != follower:
+                chosen.add(index)
+        return sorted(chosen)
+
+    def seed_follows(self, rng, start, stop):
+        edges = [
+            Follow(
+                follower_id=self.profile_id(follower),
+                followee_id=self.profile_id(followee),
+            )
+            for follower in range(start, stop)
+            for followee in self.followees(rng, follower)
+        ]
+        Follow.objects.bulk_create(edges, batch_size=self.chunk_size)
+        return len(edges)
+
+    def count_followers(self):
+        """Set the follower counts that the follow signals would keep."""
+        counts = (
+            Follow.objects.filter(followee=OuterRef("pk"))
+            .order_by()
+            .values("followee")
+            .annotate(total=Count("id"))
+            .values("total")
+        )
+        UserProfile.objects.filter(
+            id__gte=self.profile_base,
+            id__lt=self.profile_base + self.users,
+        ).update(
+            follower_count=Coalesce(
+                Subquery(counts, output_field=IntegerField()), 0
+            )
+        )
+
+    def seed_posts(self, rng, start, stop):
+        posts = []
+        tags = []
+        for author in range(start, stop):
+            for number in range(self.posts):
+                tag = rng.choice(WORDS)
+                words = rng.choices(WORDS, k=rng.randint(4, 12))
+                posts.append(
+                    Post(
+                        id=self.post_base + author * self.posts + number,
+                        user_id=self.profile_id(author),
+                        text_content=f"{' '.join(words)} #{tag}",
+                        like_count=self.likes,
+                        comment_count=self.comments,
+                    )
+                )
+                tags.append(self.hashtag_ids[tag])
+
+        posts = Post.objects.bulk_create(posts, batch_size=self.chunk_size)
+        links = PostHashtag.objects.bulk_create(
+            (
+                PostHashtag(
+                    post_id=post.id,
+                    hashtag_id=hashtag_id,
+                    created_at=post.created_at,
+                )
+                for post, hashtag_id in zip(posts, tags)
+            ),
+            batch_size=self.chunk_size,
+        )
+        count_uses(
+            Counter(
+                (link.hashtag_id, bucket_of(link.created_at)) for link in links
+            )
+        )
+        entries = 0
+        if self.timelines:
+            entries = fan_out_post_range(
+                self.post_base + start * self.posts,
+                self.post_base + stop * self.posts,
+            )
+        return len(posts) + len(links) + entries
+
+    def seed_reactions(self, rng, start, stop):
+        likes = []
+        comments = []
+        for index in range(start, stop):
+            post_id = self.post_base + index
+            likes.extend(
+                Like(post_id=post_id, user_id=self.profile_id(liker))
+                for liker in rng.sample(range(self.users), self.likes)
+            )
+            comments.extend(
+                Comment(
+                    post_id=post_id,
+                    user_id=self.profile_id(rng.randrange(self.users)),
+                    text_content=" ".join(rng.choices(WORDS, k=6)),
+                )
+                for _ in range(self.comments)
+            )
+        Like.objects.bulk_create(likes, batch_size=self.chunk_size)
+        Comment.objects.bulk_create(comments, batch_size=self.chunk_size)
+        return len(likes) + len(comments)
+
+    def reset_sequences(self):
+        models = [User, UserProfile, Post]
+        statements = connection.ops.sequence_reset_sql(no_style(), models)
+        with connection.cursor() as cursor:
+            for statement in statements:
+                cursor.execute(statement)
@@ -1,14 +1,23 @@
 from rest_framework import serializers
 
-from media_post.models import Post, Comment, Like
+from media_post.images import MediaVariantsField
+from media_post.like_buffer import get_buffer, pending_likes
+from media_post.models import (
+    Post,
+    Comment,
+    Like,
+    Notification,
+    ScheduledPost,
+    UploadSession,
+)
+from media_post.uploads import discard_upload
+from user.loaders import BatchLoadListSerializer, get_loaders
 from user.serializers import UserProfileListSerializer
 
 
 class CommentSerializer(serializers.ModelSerializer):
-    user_id = serializers.IntegerField(source="user.user.id", read_only=True)
-    user_email = serializers.EmailField(
-        source="user.user.email", read_only=True
-    )
+    user_id = serializers.SerializerMethodField()
+    user_email = serializers.SerializerMethodField()
 
     class Meta:
         model = Comment
@@ -20,6 +29,39 @@ class CommentSerializer(serializers.ModelSerializer):
             "user_email",
             "created_at",
         )
+        list_serializer_class = BatchLoadListSerializer
+
+    def prime(self, instances, loaders):
+        loaders.load_profile_users([comment.user_id for comment in instances])
+
+    def get_user_id(self, obj) -> int:
+        return get_loaders(self.context).profile_user(obj.user_id).id
+
+    def get_user_email(self, obj) -> str:
+        return get_loaders(self.context).profile_user(obj.user_id).email
+
+
+class LikeCountField(serializers.ReadOnlyField):
+    """Persisted like counter plus likes still waiting in the buffer."""
+
+    def __init__(self, **kwargs):
+        kwargs["source"] = "*"
+        super().__init__(**kwargs)
+
+    def to_representation(self, post):
+        like_buffer = get_buffer()
+        if like_buffer is None:
+            return post.like_count
+
+        pending = self.context.get("pending_likes")
+        if pending is None or post.id not in pending:
+            # look up the whole page at once when serializing a list
+            root = self.root
+            many = isinstance(root, serializers.ListSerializer)
+            posts = root.instance if many else [post]
+            pending = pending_likes([obj.id for obj in posts])
+            self.context["pending_likes"] = pending
+        return post.like_count + pending.get(post.id, 0)
 
 
 class CommentCreateSerializer(serializers.ModelSerializer):
@@ -38,18 +80,74 @@ class CommentCreateSerializer(serializers.ModelSerializer):
         return super().create(validated_data)
 
 
-class PostListCreateSerializer(serializers.ModelSerializer):
-    author = serializers.EmailField(source="user.user.email", read_only=True)
+class UploadSessionSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = UploadSession
+        fields = (
+            "id",
+            "filename",
+            "size",
+            "offset",
+            "image_format",
+            "sha256",
+            "is_complete",
+        )
+        read_only_fields = ("offset", "image_format", "sha256", "is_complete")
+
+
+class UploadAttachmentSerializer(serializers.ModelSerializer):
+    """Accept a finished resumable upload in place of `media_attachment`."""
+
+    upload = serializers.PrimaryKeyRelatedField(
+        queryset=UploadSession.objects.filter(is_complete=True),
+        write_only=True,
+        required=False,
+    )
+
+    def validate_upload(self, value):
+        if value.user_id != self.context["request"].user.userprofile.id:
+            raise serializers.ValidationError("Unknown upload.")
+        return value
+
+    def create(self, validated_data):
+        upload = validated_data.pop("upload", None)
+        if upload is not None:
+            validated_data["media_attachment"] = upload.file_path
+        post = super().create(validated_data)
+        if upload is not None:
+            discard_upload(upload)
+        return post
+
+
+class PostListCreateSerializer(UploadAttachmentSerializer):
+    hashtags = serializers.SlugRelatedField(
+        many=True, read_only=True, slug_field="name"
+    )
+    author = serializers.SerializerMethodField()
+    like_count = LikeCountField()
+    media_variants = MediaVariantsField("media_attachment")
 
     class Meta:
         model = Post
         fields = (
             "id",
             "hashtag",
+            "hashtags",
             "text_content",
             "media_attachment",
+            "upload",
+            "media_variants",
             "author",
+            "like_count",
+            "comment_count",
         )
+        list_serializer_class = BatchLoadListSerializer
+
+    def prime(self, instances, loaders):
+        loaders.load_profile_users([post.user_id for post in instances])
+
+    def get_author(self, obj) -> str:
+        return get_loaders(self.context).profile_user(obj.user_id).email
 
     def create(self, validated_data):
         user = self.context["request"].user.userprofile
@@ -58,32 +156,49 @@ class PostListCreateSerializer(serializers.ModelSerializer):
 
 
 class PostDetailSerializer(serializers.ModelSerializer):
+    hashtags = serializers.SlugRelatedField(
+        many=True, read_only=True, slug_field="name"
+    )
     user = UserProfileListSerializer(read_only=True)
-    comments = CommentSerializer(read_only=True)
+    like_count = LikeCountField()
+    media_variants = MediaVariantsField("media_attachment")
+    # the newest comments only, the rest are paged from `comments_url`
+    comments = CommentSerializer(
+        source="latest_comments", many=True, read_only=True
+    )
+    comments_url = serializers.HyperlinkedIdentityField(
+        view_name="media_post:post-comments"
+    )
 
     class Meta:
         model = Post
         fields = (
             "id",
             "hashtag",
+            "hashtags",
             "text_content",
             "media_attachment",
+            "media_variants",
             "user",
+            "like_count",
+            "comment_count",
             "comments",
+            "comments_url",
         )
 
 
-class PostCreateScheduleSerializer(serializers.ModelSerializer):
-    publish_time = serializers.DateTimeField()
+class PostCreateScheduleSerializer(UploadAttachmentSerializer):
+    publish_time = serializers.DateTimeField(source="publish_at")
     user = UserProfileListSerializer(read_only=True)
 
     class Meta:
-        model = Post
+        model = ScheduledPost
         fields = (
             "id",
             "hashtag",
             "text_content",
             "media_attachment",
+            "upload",
             "user",
             "publish_time",
         )
@@ -94,15 +209,25 @@ class PostCreateScheduleSerializer(serializers.ModelSerializer):
         return super().create(validated_data)
 
 
+class TrendingHashtagSerializer(serializers.Serializer):
+    name = serializers.CharField()
+    uses = serializers.IntegerField()
+
+
 class LikeListSerializer(serializers.ModelSerializer):
-    post = PostDetailSerializer(many=True, read_only=True)
     user = serializers.PrimaryKeyRelatedField(read_only=True)
+    user_email = serializers.EmailField(
+        source="user.user.email", read_only=True
+    )
 
     class Meta:
         model = Like
         fields = (
+            "id",
             "user",
+            "user_email",
             "post",
+            "created_at",
         )
 
 
@@ -123,3 +248,20 @@ class LikeCreateSerializer(serializers.ModelSerializer):
         validated_data["user"] = user
         validated_data["post"] = post
         return super().create(validated_data)
+
+
+class NotificationSerializer(serializers.ModelSerializer):
+    type = serializers.CharField(source="kind")
+
+    class Meta:
+        model = Notification
+        fields = (
+            "id",
+            "type",
+            "post",
+            "actor",
+            "count",
+            "is_read",
+            "created_at",
+            "updated_at",
+        )
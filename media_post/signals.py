@@ -0,0 +1,160 @@
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import connections, transaction
+from django.db.models.signals import post_delete, post_migrate, post_save
+from django.db.migrations.recorder import MigrationRecorder
+from django.dispatch import receiver
+
+from media_post import counters
+from media_post.blobs import track_references
+from media_post.cache import get_post_cache
+from media_post.images import needs_variants
+from media_post.hashtags import bucket_of, count_uses, tag_posts
+from media_post.models import (
+    Post,
+    PostHashtag,
+    Comment,
+    Like,
+    Notification,
+    ScheduledPost,
+)
+from media_post.notifications import notify
+from media_post.search import install_index
+from media_post.tasks import fan_out_new_post, process_post_media
+from media_post.timeline import (
+    audience_size,
+    backfill_timeline,
+    fan_out_post,
+    prune_timeline,
+)
+from user.models import Follow, UserProfile
+
+track_references(Post, "media_attachment")
+track_references(ScheduledPost, "media_attachment")
+
+
+@receiver(post_save, sender=Post)
+def post_fan_out(sender, instance, created, **kwargs):
+    if not created:
+        return
+    if audience_size(instance.user_id) > settings.TIMELINE_INLINE_FANOUT:
+        transaction.on_commit(lambda: fan_out_new_post.delay(instance.pk))
+    else:
+        transaction.on_commit(lambda: fan_out_post(instance))
+
+
+@receiver(post_save, sender=Post)
+def post_hashtags_tag(sender, instance, created, **kwargs):
+    update_fields = kwargs.get("update_fields")
+    if update_fields is None or {"hashtag", "text_content"} & update_fields:
+        tag_posts([instance], created=created)
+
+
+@receiver(post_delete, sender=PostHashtag)
+def post_hashtag_uncount(sender, instance, **kwargs):
+    count_uses({(instance.hashtag_id, bucket_of(instance.created_at)): -1})
+
+
+@receiver(post_save, sender=Post)
+def post_media_process(sender, instance, **kwargs):
+    if needs_variants(instance.media_attachment, instance.media_variants):
+        transaction.on_commit(lambda: process_post_media.delay(instance.pk))
+
+
+@receiver(post_save, sender=Follow)
+def follow_timeline_backfill(sender, instance, created, **kwargs):
+    if created:
+        backfill_timeline(instance.follower, [instance.followee_id])
+
+
+@receiver(post_delete, sender=Follow)
+def follow_timeline_prune(sender, instance, **kwargs):
+    prune_timeline(instance.follower, [instance.followee_id])
+
+
+@receiver(post_save, sender=Like)
+def like_notify(sender, instance, created, **kwargs):
+    if created:
+        notify(
+            instance.post.user_id,
+            Notification.LIKE,
+            instance.user_id,
+            instance.post_id,
+        )
+
+
+@receiver(post_save, sender=Comment)
+def comment_notify(sender, instance, created, **kwargs):
+    if created:
+        notify(
+            instance.post.user_id,
+            Notification.COMMENT,
+            instance.user_id,
+            instance.post_id,
+        )
+
+
+@receiver(post_save, sender=Follow)
+def follow_notify(sender, instance, created, **kwargs):
+    if created:
+        notify(instance.followee_id, Notification.FOLLOW, instance.follower_id)
+
+
+@receiver(post_save, sender=Post)
+@receiver(post_delete, sender=Post)
+def post_cache_invalidate(sender, instance, **kwargs):
+    get_post_cache().invalidate_posts([instance.pk])
+
+
+@receiver(post_save, sender=Comment)
+@receiver(post_delete, sender=Comment)
+@receiver(post_save, sender=Like)
+@receiver(post_delete, sender=Like)
+def post_cache_invalidate_related(sender, instance, **kwargs):
+    get_post_cache().invalidate_posts([instance.post_id])
+
+
+@receiver(post_save, sender=Comment)
+def comment_post_touch(sender, instance, created, **kwargs):
+    # new and deleted comments bump the post through its counter
+    if not created:
+        counters.touch([instance.post_id])
+
+
+def invalidate_profile(profile):
+    post_cache = get_post_cache()
+    post_cache.invalidate_author(profile.pk)
+    # the profile may also appear in comments under other authors' posts
+    commented = list(
+        Comment.objects.filter(user=profile)
+        .values_list("post_id", flat=True)
+        .distinct()
+    )
+    post_cache.invalidate_posts(commented)
+    counters.touch(commented)
+
+
+@receiver(post_save, sender=UserProfile)
+@receiver(post_delete, sender=UserProfile)
+def profile_cache_invalidate(sender, instance, **kwargs):
+    invalidate_profile(instance)
+
+
+@receiver(post_save, sender=get_user_model())
+def user_cache_invalidate(sender, instance, created, **kwargs):
+    if created:
+        return
+    profile = UserProfile.objects.filter(user=instance).first()
+    if profile is not None:
+        invalidate_profile(profile)
+
+
+@receiver(post_migrate)
+def search_index_install(sender, using, **kwargs):
+    """Restore search triggers dropped by table rebuilds of a migration."""
+    if sender.name != "media_post":
+        return
+    connection = connections[using]
+    applied = MigrationRecorder(connection).applied_migrations()
+    if ("media_post", "0013_post_search") in applied:
+        install_index(connection)
@@ -0,0 +1,74 @@
+import hashlib
+import os
+import tempfile
+
+from django.core.files import locks
+from django.core.files.move import file_move_safe
+from django.core.files.storage import FileSystemStorage
+
+
+def blob_name(digest, filename):
+    _, extension = os.path.splitext(filename)
+    return os.path.join(
+        "blobs", digest[:2], digest[2:4], f"{digest}{extension.lower()}"
+    )
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    """File storage that names every file after the SHA-256 of its bytes.
+
+    The name suggested by `upload_to` only contributes the extension.
+    Saving content that is already stored writes nothing and returns the
+    existing name, so identical uploads share one file. Saving also takes
+    a reference on the blob, before the file is looked up, so a
+    concurrent `collect()` cannot remove a file that is being reused.
+    """
+
+    def get_available_name(self, name, max_length=None):
+        return name
+
+    def _save(self, name, content):
+        directory = self.path(os.path.join("blobs", "tmp"))
+        os.makedirs(directory, exist_ok=True)
+
+        # hash while streaming to a temporary file, the final name is only
+        # known once the last chunk went through
+        digest = hashlib.sha256()
+        with tempfile.NamedTemporaryFile(dir=directory, delete=False) as temp:
+            locks.lock(temp, locks.LOCK_EX)
+            for chunk in content.chunks():
+                digest.update(chunk)
+                temp.write(chunk)
+            locks.unlock(temp)
+
+        # imported here, blobs builds on this module
+        from media_post.blobs import acquire
+
+        name = blob_name(digest.hexdigest(), name)
+        # the model field's reference, see track_references
+        acquire(name)
+        return self.store(temp.name, name)
+
+    def store(self, path, name):
+        """Move a local file into the storage under its content name."""
+        full_path = self.path(name)
+        if os.path.exists(full_path):
+            os.remove(path)
+            return name
+
+        os.makedirs(os.path.dirname(full_path), exist_ok=True)
+        file_move_safe(path, full_path, allow_overwrite=True)
+        if self.file_permissions_mode is not None:
+            os.chmod(full_path, self.file_permissions_mode)
+        return name
+
+
+_media_storage = None
+
+
+def media_storage():
+    global _media_storage
+
+    if _media_storage is None:
+        _media_storage = ContentAddressedStorage()
+    return _media_storage
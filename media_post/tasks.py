@@ -1,26 +1,175 @@
-from datetime import datetime
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
 
-from media_post.models import Post
+from media_post import counters
+from media_post.blobs import is_referenced
+from media_post.cache import get_post_cache
+from media_post.hashtags import prune_counters
+from media_post.images import (
+    delete_variants,
+    generate_variants,
+    needs_variants,
+)
+from media_post.like_buffer import get_buffer
+from media_post.models import Post, Like, ScheduledPost, UploadSession
+from media_post.notifications import get_buffer as get_notification_buffer
+from media_post.notifications import record
+from media_post.scheduling import publish_due_posts
+from media_post.timeline import fan_out_post, fan_out_posts
+from media_post.timeline import trim_timelines as trim_all_timelines
+from media_post.uploads import discard_upload
+from user.models import UserProfile
 
 from celery import shared_task
 
 
 @shared_task
 def create_post(data, publish_time):
-    publish_time = datetime.strptime(publish_time[:-1], "%Y-%m-%dT%H:%M:%S.%f")
-    hashtag = data.get("hashtag")
-    text_content = data.get("text_content")
-    media_attachment = data.get("media_attachment")
-    user = data.get("user")
-    delay = publish_time - datetime.utcnow()
-    if delay.total_seconds() > 0:
-        create_post.apply_async(args=[data, publish_time], eta=publish_time)
+    """Schedule a post queued as a task by earlier releases."""
+    publish_at = parse_datetime(str(publish_time)) or timezone.now()
+    if timezone.is_naive(publish_at):
+        publish_at = timezone.make_aware(publish_at, timezone.utc)
+    scheduled = ScheduledPost.objects.create(
+        user_id=data.get("user"),
+        hashtag=data.get("hashtag") or "",
+        text_content=data.get("text_content") or "",
+        publish_at=publish_at,
+    )
+    return scheduled.id
+
+
+@shared_task
+def fan_out_new_post(post_id):
+    """Push a post into the timelines of an audience too large to wait on."""
+    post = Post.objects.filter(pk=post_id).first()
+    if post is not None:
+        fan_out_post(post)
+
+
+@shared_task
+def publish_scheduled_posts():
+    """Publish the scheduled posts that are due, in bulk batches."""
+    published = 0
+    while True:
+        posts = publish_due_posts(settings.SCHEDULED_POST_BATCH_SIZE)
+        if not posts:
+            break
+        fan_out_posts(posts)
+        for post in posts:
+            if needs_variants(post.media_attachment, post.media_variants):
+                process_post_media.delay(post.pk)
+        published += len(posts)
+    return published
+
+
+@shared_task
+def flush_like_buffer():
+    """Persist buffered likes in bulk and refresh the affected counters."""
+    like_buffer = get_buffer()
+    if like_buffer is None:
+        return 0
+
+    drained = like_buffer.drain()
+    if not drained:
+        return 0
+
+    likes = [
+        Like(post_id=post_id, user_id=profile_id)
+        for post_id, profile_ids in drained.items()
+        for profile_id in profile_ids
+    ]
+    try:
+        with transaction.atomic():
+            Like.objects.bulk_create(
+                likes, batch_size=1000, ignore_conflicts=True
+            )
+            counters.reconcile(Post.objects.filter(id__in=drained))
+    except Exception:
+        like_buffer.restore(drained)
+        raise
+    get_post_cache().invalidate_posts(drained)
+    return len(likes)
+
+
+@shared_task
+def flush_notifications():
+    """Fold buffered events into notifications, in one pass per flush."""
+    notification_buffer = get_notification_buffer()
+    if notification_buffer is None:
+        return 0
+
+    drained = notification_buffer.drain()
+    if not drained:
+        return 0
+
+    # the post or a profile may have been deleted since the event
+    live_posts = set(
+        Post.objects.filter(
+            id__in={key[2] for key in drained if key[2]}
+        ).values_list("id", flat=True)
+    )
+    live_profiles = set(
+        UserProfile.objects.filter(
+            id__in={key[0] for key in drained}
+            | {actor_id for _, actor_id in drained.values()}
+        ).values_list("id", flat=True)
+    )
+    events = {
+        key: (count, actor_id)
+        for key, (count, actor_id) in drained.items()
+        if {key[0], actor_id} <= live_profiles
+        and (key[2] is None or key[2] in live_posts)
+    }
+    if not events:
+        return 0
+    try:
+        record(events)
+    except Exception:
+        notification_buffer.restore(events)
+        raise
+    return sum(count for count, _ in events.values())
+
+
+@shared_task
+def process_post_media(post_id):
+    """Generate resized variants of a post attachment."""
+    post = Post.objects.filter(pk=post_id).first()
+    if post is None or not needs_variants(
+        post.media_attachment, post.media_variants
+    ):
+        return
+
+    variants = generate_variants(post.media_attachment)
+    if not is_referenced(variants["source"]):
+        # released while resizing, after collect() deleted its variants
+        delete_variants(variants["source"])
         return
+    post.media_variants = variants
+    post.save(update_fields=["media_variants", "updated_at"])
 
-    post = Post.objects.create(
-        hashtag=hashtag,
-        text_content=text_content,
-        media_attachment=media_attachment,
-        user_id=user,
+
+@shared_task
+def expire_uploads():
+    """Remove uploads that were abandoned or never attached to a post."""
+    expired = UploadSession.objects.filter(
+        created_at__lt=timezone.now() - settings.UPLOAD_SESSION_TTL
     )
-    return post.id
+    count = 0
+    for session in expired.iterator():
+        discard_upload(session)
+        count += 1
+    return count
+
+
+@shared_task
+def trim_timelines():
+    """Keep timelines to their TIMELINE_MAX_SIZE newest entries."""
+    return trim_all_timelines()
+
+
+@shared_task
+def prune_hashtag_counters():
+    """Drop trending buckets that fell out of the window."""
+    return prune_counters()
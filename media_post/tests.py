@@ -0,0 +1,1240 @@
+import asyncio
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta, timezone as dt_timezone
+from io import BytesIO
+from unittest import mock
+
+import redis
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
+from django.test import (
+    AsyncClient,
+    Client,
+    SimpleTestCase,
+    TestCase,
+    TransactionTestCase,
+    override_settings,
+)
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from PIL import Image
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from media_post.benchmarks import SCENARIOS, ApiBenchmark
+from media_post.blobs import collect
+from media_post.cache import PostCache
+from media_post.hashtags import tag_posts
+from media_post.like_buffer import get_buffer
+from media_post.models import (
+    Blob,
+    Post,
+    Like,
+    Comment,
+    HashtagCounter,
+    Notification,
+    ScheduledPost,
+    UploadSession,
+)
+from media_post.notifications import (
+    channel_of,
+    insert_notifications,
+    record,
+)
+from media_post.seeding import GraphSeeder
+from media_post.storage import (
+    ContentAddressedStorage,
+    blob_name,
+    media_storage,
+)
+from media_post.tasks import (
+    create_post,
+    fan_out_new_post,
+    flush_like_buffer,
+    flush_notifications,
+    expire_uploads,
+    process_post_media,
+    publish_scheduled_posts,
+    trim_timelines,
+)
+from media_post.views import PostViewSet
+from social_media_api.metrics import CONTENT_TYPE, Histogram, Registry
+from social_media_api.pubsub import RedisPubSub, get_pubsub
+from social_media_api.routers import reading_from_replica
+from user.models import User, UserProfile, Follow
+
+POST_URL = reverse("media_post:post-list")
+THREADS = 8
+# a LocMem stand-in for the Redis cache shared by all workers
+SHARED_CACHES = {
+    "default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"},
+    "shared": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        "LOCATION": "shared",
+    },
+}
+
+
+def like_create_url(post_id):
+    return reverse("media_post:post-like-create", args=[post_id])
+
+
+def comments_url(post_id):
+    return reverse("media_post:post-comments", args=[post_id])
+
+
+def create_profile(email):
+    user = User.objects.create_user(email, "pass12345")
+    return UserProfile.objects.create(user=user, sex="M")
+
+
+class ConcurrentLikeTests(TransactionTestCase):
+    def setUp(self):
+        self.user = User.objects.create_user("user@test.com", "pass12345")
+        self.profile = UserProfile.objects.create(user=self.user, sex="M")
+        self.post = Post.objects.create(user=self.profile, text_content="Hi")
+
+    def test_concurrent_like_create_inserts_one_row(self):
+        barrier = threading.Barrier(THREADS)
+        statuses = []
+
+        def like():
+            client = APIClient()
+            client.force_authenticate(self.user)
+            barrier.wait()
+            try:
+                response = client.post(like_create_url(self.post.id))
+                statuses.append(response.status_code)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=like) for _ in range(THREADS)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(statuses.count(201), 1)
+        self.assertEqual(statuses.count(400), THREADS - 1)
+        self.assertEqual(
+            Like.objects.filter(post=self.post, user=self.profile).count(), 1
+        )
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.like_count, 1)
+
+
+@override_settings(LIKE_BUFFER_ENABLED=True, LIKE_BUFFER_URL="local")
+class LikeBufferTests(TestCase):
+    def setUp(self):
+        self.profile = create_profile("user@test.com")
+        self.liker = create_profile("liker@test.com")
+        Follow.objects.create(follower=self.liker, followee=self.profile)
+        self.post = Post.objects.create(user=self.profile, text_content="Hi")
+        self.client = APIClient()
+        self.client.force_authenticate(self.liker.user)
+        get_buffer().drain()
+
+    def like(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.client.post(like_create_url(self.post.id))
+
+    def shown_like_count(self):
+        url = reverse("media_post:post-detail", args=[self.post.id])
+        return self.client.get(url).data["like_count"]
+
+    def test_buffered_like_shows_at_once_and_is_saved_once(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.like()
+        self.assertEqual(response.status_code, 201)
+        # only the probe of the unique like index
+        self.assertEqual(
+            len([q for q in queries if "media_post_like" in q["sql"]]),
+            1,
+        )
+        self.assertEqual(self.like().status_code, 400)
+        self.assertEqual(self.shown_like_count(), 1)
+
+        likes_url = reverse("media_post:post-likes", args=[self.post.id])
+        results = self.client.get(likes_url).data["results"]
+        self.assertEqual([like["user"] for like in results], [self.liker.id])
+
+        flush_like_buffer()
+        self.assertEqual(self.like().status_code, 400)
+        flush_like_buffer()
+        self.assertEqual(Like.objects.filter(post=self.post).count(), 1)
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.like_count, 1)
+        self.assertEqual(self.shown_like_count(), 1)
+        self.assertEqual(
+            list(Notification.objects.values_list("kind", "count")),
+            [(Notification.LIKE, 1)],
+        )
+
+        response = self.client.delete(
+            reverse("media_post:post-destroy-like", args=[self.post.id])
+        )
+        self.assertEqual(response.status_code, 204)
+        self.assertFalse(Like.objects.filter(post=self.post).exists())
+
+    def test_like_saved_while_pending_is_counted_once(self):
+        # the flush committed this like after it was buffered again
+        Like.objects.create(post=self.post, user=self.liker)
+        Post.objects.filter(pk=self.post.pk).update(like_count=1)
+        get_buffer().add(self.post.id, self.liker.id)
+
+        self.assertEqual(self.shown_like_count(), 1)
+
+
+class BatchLoadingQueryCountTests(TestCase):
+    def setUp(self):
+        self.profile = create_profile("user@test.com")
+        self.post = Post.objects.create(user=self.profile, text_content="Hi")
+        self.client = APIClient()
+        self.client.force_authenticate(self.profile.user)
+
+    def count_queries(self, url, results):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data["results"]), results)
+        return len(queries)
+
+    def test_comments_query_count_does_not_grow(self):
+        Comment.objects.create(
+            user=self.profile, post=self.post, text_content="first"
+        )
+        single = self.count_queries(comments_url(self.post.id), 1)
+
+        for i in range(10):
+            author = create_profile(f"commenter{i}@test.com")
+            Comment.objects.create(
+                user=author, post=self.post, text_content=str(i)
+            )
+        self.assertEqual(
+            self.count_queries(comments_url(self.post.id), 11), single
+        )
+
+    def follow_and_post(self, count):
+        for i in range(count):
+            author = create_profile(
+                f"author{self.profile.following_edges.count()}@test.com"
+            )
+            Follow.objects.create(follower=self.profile, followee=author)
+            with self.captureOnCommitCallbacks(execute=True):
+                Post.objects.create(user=author, text_content=str(i))
+
+    def test_feed_query_count_does_not_grow(self):
+        self.follow_and_post(1)
+        single = self.count_queries(POST_URL, 1)
+
+        self.follow_and_post(10)
+        self.assertEqual(self.count_queries(POST_URL, 11), single)
+
+
+def image_upload(color):
+    content = BytesIO()
+    Image.new("RGB", (50, 50), color).save(content, "PNG")
+    return SimpleUploadedFile("image.png", content.getvalue())
+
+
+class TimelineTests(TestCase):
+    def setUp(self):
+        self.author = create_profile("author@test.com")
+        self.fan = create_profile("fan@test.com")
+        self.client = APIClient()
+        self.client.force_authenticate(self.fan.user)
+
+    def follow(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            return Follow.objects.create(
+                follower=self.fan, followee=self.author
+            )
+
+    def publish(self, text="Hi"):
+        with self.captureOnCommitCallbacks(execute=True):
+            return Post.objects.create(user=self.author, text_content=text)
+
+    def timeline_of(self, profile):
+        return set(profile.timeline.values_list("post_id", flat=True))
+
+    def feed(self):
+        response = self.client.get(POST_URL)
+        self.assertEqual(response.status_code, 200)
+        return [post["id"] for post in response.data["results"]]
+
+    def test_follows_keep_the_follower_count(self):
+        edge = self.follow()
+        self.author.refresh_from_db()
+        self.assertEqual(self.author.follower_count, 1)
+
+        edge.delete()
+        self.author.refresh_from_db()
+        self.assertEqual(self.author.follower_count, 0)
+
+    def test_posts_fan_out_to_followers(self):
+        self.follow()
+        post = self.publish()
+        self.assertEqual(self.timeline_of(self.author), {post.id})
+        self.assertEqual(self.timeline_of(self.fan), {post.id})
+        self.assertEqual(self.feed(), [post.id])
+
+    @override_settings(TIMELINE_INLINE_FANOUT=0)
+    def test_large_audiences_fan_out_in_a_task(self):
+        self.follow()
+        with mock.patch("media_post.signals.fan_out_new_post.delay") as delay:
+            post = self.publish()
+        delay.assert_called_once_with(post.id)
+        self.assertEqual(self.timeline_of(self.fan), set())
+
+        fan_out_new_post(post.id)
+        self.assertEqual(self.timeline_of(self.fan), {post.id})
+
+    @override_settings(TIMELINE_FANOUT_THRESHOLD=0)
+    def test_celebrity_posts_merge_into_the_feed_at_read_time(self):
+        self.follow()
+        post = self.publish()
+        with self.captureOnCommitCallbacks(execute=True):
+            own = Post.objects.create(user=self.fan, text_content="Mine")
+        self.assertEqual(self.timeline_of(self.fan), {own.id})
+        self.assertEqual(self.timeline_of(self.author), {post.id})
+        self.assertEqual(self.feed(), [own.id, post.id])
+
+    def test_follow_backfills_and_unfollow_prunes(self):
+        posts = [self.publish(str(i)) for i in range(3)]
+        edge = self.follow()
+        self.assertEqual(
+            self.timeline_of(self.fan), {post.id for post in posts}
+        )
+        self.assertEqual(self.feed(), [post.id for post in reversed(posts)])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            edge.delete()
+        self.assertEqual(self.timeline_of(self.fan), set())
+        self.assertEqual(self.feed(), [])
+
+    @override_settings(TIMELINE_FANOUT_THRESHOLD=1)
+    def test_feed_pages_merge_timeline_and_celebrity_posts(self):
+        celebrity = create_profile("celebrity@test.com")
+        with self.captureOnCommitCallbacks(execute=True):
+            Follow.objects.create(follower=self.fan, followee=celebrity)
+            Follow.objects.create(follower=self.author, followee=celebrity)
+        self.follow()
+        posts = []
+        for i in range(5):
+            posts.append(self.publish(f"#tag {i}"))
+            with self.captureOnCommitCallbacks(execute=True):
+                posts.append(
+                    Post.objects.create(user=celebrity, text_content=f"{i}")
+                )
+        self.assertEqual(len(self.timeline_of(self.fan)), 5)
+
+        seen, url = [], POST_URL + "?page_size=3"
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            self.assertLessEqual(len(response.data["results"]), 3)
+            seen += [post["id"] for post in response.data["results"]]
+            url = response.data["next"]
+        self.assertEqual(seen, [post.id for post in reversed(posts)])
+
+        response = self.client.get(POST_URL, {"hashtag": "#tag"})
+        self.assertEqual(
+            [post["id"] for post in response.data["results"]],
+            [post.id for post in reversed(posts[::2])],
+        )
+
+    @override_settings(TIMELINE_MAX_SIZE=2)
+    def test_timelines_are_trimmed_to_their_newest_entries(self):
+        self.follow()
+        posts = [self.publish(str(i)) for i in range(3)]
+
+        self.assertEqual(trim_timelines(), 2)
+
+        newest = {post.id for post in posts[1:]}
+        self.assertEqual(self.timeline_of(self.fan), newest)
+        self.assertEqual(self.timeline_of(self.author), newest)
+        self.assertEqual(trim_timelines(), 0)
+
+
+class HashtagTests(TestCase):
+    def test_links_made_concurrently_are_counted_once(self):
+        post = Post.objects.create(
+            user=create_profile("user@test.com"), text_content="#sun"
+        )
+        # a second save that did not see the links of the first one
+        tag_posts([post], created=True)
+
+        self.assertEqual(post.hashtags.count(), 1)
+        self.assertEqual(
+            HashtagCounter.objects.get(hashtag__name="sun").count, 1
+        )
+
+
+class SearchTests(TestCase):
+    def test_search_only_finds_visible_posts(self):
+        profile = create_profile("user@test.com")
+        followee = create_profile("followee@test.com")
+        stranger = create_profile("stranger@test.com")
+        Follow.objects.create(follower=profile, followee=followee)
+        own = Post.objects.create(user=profile, text_content="sunny beach")
+        followed = Post.objects.create(user=followee, text_content="beach")
+        Post.objects.create(user=stranger, text_content="beach party")
+        client = APIClient()
+        client.force_authenticate(profile.user)
+
+        response = client.get(
+            reverse("media_post:post-search"), {"q": "beach"}
+        )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            {post["id"] for post in response.data["results"]},
+            {own.id, followed.id},
+        )
+
+    @override_settings(SEARCH_CANDIDATES=10)
+    def test_visible_matches_behind_many_hidden_ones_are_found(self):
+        profile = create_profile("user@test.com")
+        stranger = create_profile("stranger@test.com")
+        own = Post.objects.create(user=profile, text_content="summer beach")
+        Post.objects.bulk_create(
+            Post(user=stranger, text_content=f"summer {i}") for i in range(30)
+        )
+        client = APIClient()
+        client.force_authenticate(profile.user)
+
+        response = client.get(
+            reverse("media_post:post-search"), {"q": "summer", "page_size": 5}
+        )
+
+        self.assertEqual(
+            [post["id"] for post in response.data["results"]], [own.id]
+        )
+        self.assertIsNone(response.data["next"])
+
+
+class MediaVariantsTests(TestCase):
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        settings_override = override_settings(MEDIA_ROOT=media_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.media_root = media_root
+        delay = mock.patch("media_post.signals.process_post_media.delay")
+        delay.start()
+        self.addCleanup(delay.stop)
+
+    def stored_files(self):
+        return sorted(
+            name
+            for _, _, filenames in os.walk(self.media_root)
+            for name in filenames
+        )
+
+    def save_image(self, post, color):
+        with self.captureOnCommitCallbacks(execute=True):
+            post.media_attachment = image_upload(color)
+            post.save()
+        process_post_media(post.id)
+        post.refresh_from_db()
+
+    def test_replaced_and_deleted_images_leave_no_variants(self):
+        post = Post.objects.create(user=create_profile("user@test.com"))
+        self.save_image(post, "red")
+        self.save_image(post, "blue")
+        current = os.path.basename(post.media_attachment.name)
+        stem, _ = os.path.splitext(current)
+        self.assertEqual(len(self.stored_files()), 7)
+        self.assertTrue(
+            all(name.startswith(stem) for name in self.stored_files())
+        )
+
+        with self.captureOnCommitCallbacks(execute=True):
+            post.delete()
+        self.assertEqual(self.stored_files(), [])
+
+    def test_reused_image_survives_a_concurrent_collect(self):
+        profile = create_profile("user@test.com")
+        first = Post.objects.create(
+            user=profile, media_attachment=image_upload("red")
+        )
+        name = first.media_attachment.name
+        store = ContentAddressedStorage.store
+
+        def store_then_collect(storage, path, name):
+            stored = store(storage, path, name)
+            # the only other post goes away before this save completes
+            Post.objects.filter(pk=first.pk).delete()
+            collect(stored)
+            return stored
+
+        with mock.patch.object(
+            ContentAddressedStorage,
+            "store",
+            autospec=True,
+            side_effect=store_then_collect,
+        ):
+            second = Post.objects.create(
+                user=profile, media_attachment=image_upload("red")
+            )
+
+        self.assertEqual(second.media_attachment.name, name)
+        self.assertTrue(media_storage().exists(name))
+        self.assertEqual(Blob.objects.get(name=name).ref_count, 1)
+
+
+UPLOADS_URL = reverse("media_post:uploadsession-list")
+
+
+class UploadTests(TestCase):
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        settings_override = override_settings(MEDIA_ROOT=media_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        delay = mock.patch("media_post.signals.process_post_media.delay")
+        delay.start()
+        self.addCleanup(delay.stop)
+        self.profile = create_profile("user@test.com")
+        self.client = APIClient()
+        self.client.force_authenticate(self.profile.user)
+        self.content = image_upload("red").read()
+
+    def start(self, size=None):
+        response = self.client.post(
+            UPLOADS_URL,
+            {"filename": "photo.PNG", "size": size or len(self.content)},
+        )
+        self.assertEqual(response.status_code, 201)
+        return UploadSession.objects.get(pk=response.data["id"])
+
+    def put(self, session, body, content_range):
+        return self.client.put(
+            reverse("media_post:uploadsession-chunk", args=[session.id]),
+            body,
+            content_type="application/octet-stream",
+            HTTP_CONTENT_RANGE=content_range,
+        )
+
+    def upload(self):
+        session = self.start()
+        size = len(self.content)
+        response = self.put(
+            session, self.content, f"bytes 0-{size - 1}/{size}"
+        )
+        self.assertTrue(response.data["is_complete"])
+        session.refresh_from_db()
+        return session
+
+    def test_malformed_content_range_is_rejected(self):
+        session = self.start()
+        size = len(self.content)
+        for content_range in (
+            None,
+            "0-9/10",
+            f"bytes 0-9/{size + 1}",
+            f"bytes 9-0/{size}",
+            f"bytes 0-{size}/{size}",
+        ):
+            response = self.put(session, self.content[:10], content_range)
+            self.assertEqual(response.status_code, 400, content_range)
+            self.assertIn("Content-Range", response.data)
+        session.refresh_from_db()
+        self.assertEqual(session.offset, 0)
+
+    def test_interrupted_upload_resumes_at_the_offset(self):
+        session = self.start()
+        size = len(self.content)
+        # the connection dropped after the first 40 bytes of the range
+        response = self.put(
+            session, self.content[:40], f"bytes 0-{size - 1}/{size}"
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["offset"], 40)
+        self.assertFalse(response.data["is_complete"])
+
+        response = self.put(
+            session, self.content, f"bytes 0-{size - 1}/{size}"
+        )
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.json(), {"offset": "40"})
+
+        offset = self.client.get(f"{UPLOADS_URL}{session.id}/").data["offset"]
+        response = self.put(
+            session,
+            self.content[offset:],
+            f"bytes {offset}-{size - 1}/{size}",
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.data["is_complete"])
+        self.assertEqual(response.data["image_format"], "PNG")
+
+    def test_completed_upload_is_hashed_into_a_blob(self):
+        session = self.upload()
+        digest = hashlib.sha256(self.content).hexdigest()
+
+        self.assertEqual(session.sha256, digest)
+        self.assertEqual(session.file_path, blob_name(digest, "photo.PNG"))
+        with media_storage().open(session.file_path) as stored:
+            self.assertEqual(stored.read(), self.content)
+        self.assertEqual(Blob.objects.get(name=session.file_path).ref_count, 1)
+
+        size = len(self.content)
+        response = self.put(session, b"", f"bytes {size}-{size}/{size}")
+        self.assertEqual(response.status_code, 409)
+
+    @override_settings(UPLOAD_HEADER_LIMIT=16)
+    def test_non_image_header_discards_the_upload(self):
+        session = self.start(size=64)
+        response = self.put(session, b"x" * 32, "bytes 0-31/64")
+
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(UploadSession.objects.exists())
+        self.assertFalse(default_storage.exists(session.file_path))
+
+    def test_completed_upload_attaches_to_a_post(self):
+        session = self.upload()
+        stranger = APIClient()
+        stranger.force_authenticate(create_profile("other@test.com").user)
+        response = stranger.post(POST_URL, {"upload": session.id})
+        self.assertEqual(response.status_code, 400)
+
+        response = self.client.post(
+            POST_URL, {"upload": session.id, "text_content": "Hi"}
+        )
+
+        self.assertEqual(response.status_code, 201)
+        post = Post.objects.get(pk=response.data["id"])
+        self.assertEqual(post.media_attachment.name, session.file_path)
+        self.assertFalse(UploadSession.objects.exists())
+        self.assertEqual(Blob.objects.get(name=session.file_path).ref_count, 1)
+
+    def test_expired_uploads_are_removed(self):
+        pending = self.start()
+        completed = self.upload()
+        UploadSession.objects.update(
+            created_at=timezone.now() - settings.UPLOAD_SESSION_TTL
+        )
+        fresh = self.start()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(expire_uploads(), 2)
+
+        self.assertEqual(list(UploadSession.objects.all()), [fresh])
+        self.assertFalse(default_storage.exists(pending.file_path))
+        self.assertFalse(media_storage().exists(completed.file_path))
+        self.assertFalse(Blob.objects.filter(ref_count__gt=0).exists())
+
+
+class SchedulingTests(TestCase):
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        settings_override = override_settings(MEDIA_ROOT=media_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        delay = mock.patch("media_post.tasks.process_post_media.delay")
+        self.process_post_media = delay.start()
+        self.addCleanup(delay.stop)
+        self.author = create_profile("author@test.com")
+        self.fan = create_profile("fan@test.com")
+        Follow.objects.create(follower=self.fan, followee=self.author)
+
+    def schedule(self, text, delay, **fields):
+        return ScheduledPost.objects.create(
+            user=self.author,
+            text_content=text,
+            publish_at=timezone.now() + delay,
+            **fields,
+        )
+
+    def publish(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            return publish_scheduled_posts()
+
+    def test_scheduled_post_waits_in_the_table(self):
+        client = APIClient()
+        client.force_authenticate(self.author.user)
+        publish_time = timezone.now() + timedelta(hours=1)
+
+        response = client.post(
+            reverse("media_post:post-create-post"),
+            {"text_content": "Later #sun", "publish_time": publish_time},
+        )
+
+        self.assertEqual(response.status_code, 202)
+        scheduled = ScheduledPost.objects.get()
+        self.assertEqual(scheduled.user, self.author)
+        self.assertEqual(scheduled.publish_at, publish_time)
+        self.assertFalse(Post.objects.exists())
+
+    def test_tick_publishes_only_due_posts(self):
+        self.schedule("Now #sun", -timedelta(minutes=1))
+        later = self.schedule("Later", timedelta(hours=1))
+
+        self.assertEqual(self.publish(), 1)
+
+        post = Post.objects.get()
+        self.assertEqual(post.text_content, "Now #sun")
+        self.assertEqual(
+            list(post.hashtags.values_list("name", flat=True)), ["sun"]
+        )
+        self.assertEqual(
+            set(post.timeline_entries.values_list("owner_id", flat=True)),
+            {self.author.id, self.fan.id},
+        )
+        self.assertEqual(list(ScheduledPost.objects.all()), [later])
+        self.assertEqual(self.publish(), 0)
+
+    def test_published_media_keeps_its_blob(self):
+        scheduled = self.schedule(
+            "Photo",
+            -timedelta(minutes=1),
+            media_attachment=image_upload("red"),
+        )
+        name = scheduled.media_attachment.name
+
+        self.assertEqual(self.publish(), 1)
+
+        post = Post.objects.get()
+        self.assertEqual(post.media_attachment.name, name)
+        self.assertTrue(media_storage().exists(name))
+        self.assertEqual(Blob.objects.get(name=name).ref_count, 1)
+        self.process_post_media.assert_called_once_with(post.pk)
+
+    def test_legacy_task_payload_is_scheduled(self):
+        scheduled_id = create_post(
+            {"user": self.author.id, "hashtag": "sun", "text_content": "Hi"},
+            "2020-01-01T12:00:00",
+        )
+
+        scheduled = ScheduledPost.objects.get(pk=scheduled_id)
+        self.assertEqual(
+            scheduled.publish_at,
+            datetime(2020, 1, 1, 12, tzinfo=dt_timezone.utc),
+        )
+        self.assertEqual(self.publish(), 1)
+        self.assertEqual(
+            list(Post.objects.values_list("hashtag", "text_content")),
+            [("sun", "Hi")],
+        )
+
+
+METRICS_URL = reverse("metrics")
+
+
+@override_settings(METRICS_TOKEN="")
+class MetricsTests(TestCase):
+    def setUp(self):
+        self.registry = Registry()
+        for module in ("middleware", "metrics"):
+            patcher = mock.patch(
+                f"social_media_api.{module}.registry", self.registry
+            )
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.client = APIClient()
+        self.client.force_authenticate(create_profile("user@test.com").user)
+        self.staff = Client()
+        self.staff.force_login(
+            User.objects.create_user(
+                "staff@test.com", "pass12345", is_staff=True
+            )
+        )
+
+    def test_histogram_buckets_split_powers_of_two(self):
+        histogram = Histogram(1, 8, sub_buckets=4)
+        self.assertEqual(
+            histogram.bounds,
+            [1, 1.25, 1.5, 1.75, 2, 2.5, 3, 3.5, 4, 5, 6, 7, 8],
+        )
+
+        for value in (1, 1.3, 1.5, 100):
+            histogram.record(value)
+        cumulative = dict(histogram.cumulative())
+        self.assertEqual(cumulative[1], 1)
+        self.assertEqual(cumulative[1.25], 1)
+        self.assertEqual(cumulative[1.5], 3)
+        self.assertEqual(cumulative[8], 3)
+        self.assertEqual(cumulative["+Inf"], 4)
+        self.assertAlmostEqual(histogram.sum, 103.8)
+
+    def test_requests_are_exported_in_prometheus_format(self):
+        self.assertEqual(self.client.get(POST_URL).status_code, 200)
+
+        response = self.staff.get(METRICS_URL)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response["Content-Type"], CONTENT_TYPE)
+        lines = response.content.decode().splitlines()
+        self.assertIn("# TYPE http_request_duration_seconds histogram", lines)
+        self.assertIn(
+            'http_request_duration_seconds_bucket{view="PostViewSet.list",'
+            'le="+Inf"} 1',
+            lines,
+        )
+        self.assertIn(
+            'http_request_db_queries_count{view="PostViewSet.list"} 1', lines
+        )
+        self.assertFalse(
+            [
+                line
+                for line in lines
+                if line.startswith("http_request_query_budget_exceeded")
+            ]
+        )
+
+    @override_settings(QUERY_BUDGETS={"PostViewSet.list": 0})
+    def test_requests_over_budget_are_logged_and_counted(self):
+        with self.assertLogs("social_media_api.middleware", "WARNING") as logs:
+            self.client.get(POST_URL)
+        self.assertIn("PostViewSet.list ran", logs.output[0])
+        self.assertIn("over its budget of 0 (GET /api/media/", logs.output[0])
+
+        lines = self.staff.get(METRICS_URL).content.decode().splitlines()
+        self.assertIn(
+            'http_request_query_budget_exceeded_total{view="PostViewSet.list"} 1',
+            lines,
+        )
+
+    def test_metrics_are_staff_only_without_a_token(self):
+        self.assertEqual(Client().get(METRICS_URL).status_code, 403)
+        user = Client()
+        user.force_login(User.objects.get(email="user@test.com"))
+        self.assertEqual(user.get(METRICS_URL).status_code, 403)
+        self.assertEqual(self.staff.get(METRICS_URL).status_code, 200)
+
+    @override_settings(METRICS_TOKEN="secret")
+    def test_metrics_need_the_token_when_set(self):
+        scraper = Client()
+        response = scraper.get(METRICS_URL, HTTP_AUTHORIZATION="Bearer secret")
+        self.assertEqual(response.status_code, 200)
+        response = scraper.get(METRICS_URL, HTTP_AUTHORIZATION="Bearer wrong")
+        self.assertEqual(response.status_code, 403)
+        self.assertEqual(self.staff.get(METRICS_URL).status_code, 403)
+
+
+class PostCacheTests(SimpleTestCase):
+    def render_in(self, post_cache, data):
+        return post_cache.render(1, 2, "testserver", lambda: data)
+
+    @override_settings(CACHES=SHARED_CACHES)
+    def test_invalidation_from_another_process_reaches_entries(self):
+        worker, other = PostCache(), PostCache()
+        self.render_in(worker, {"text_content": "Hi"})
+        self.assertEqual(worker.get(1, "testserver"), {"text_content": "Hi"})
+
+        other.invalidate_posts([1])
+        self.assertIsNone(worker.get(1, "testserver"))
+
+    @override_settings(POST_CACHE_LOCAL_TIMEOUT=0.05)
+    def test_entries_expire_without_a_shared_cache(self):
+        worker = PostCache()
+        self.render_in(worker, {"text_content": "Hi"})
+        self.assertIsNotNone(worker.get(1, "testserver"))
+        time.sleep(0.1)
+        self.assertIsNone(worker.get(1, "testserver"))
+
+
+class ConditionalGetTests(TestCase):
+    def setUp(self):
+        self.profile = create_profile("user@test.com")
+        with self.captureOnCommitCallbacks(execute=True):
+            self.post = Post.objects.create(
+                user=self.profile, text_content="Hi"
+            )
+        self.client = APIClient()
+        self.client.force_authenticate(self.profile.user)
+
+    def assert_revalidates(self, url):
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        etag = response["ETag"]
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response["ETag"], etag)
+        return etag, len(queries)
+
+    @override_settings(DATABASE_REPLICAS=["default"], CACHES=SHARED_CACHES)
+    def test_retrieve_renders_cache_misses_from_primary(self):
+        flags = []
+        get_queryset = PostViewSet.get_queryset
+
+        def remember_routing(view):
+            flags.append(reading_from_replica())
+            return get_queryset(view)
+
+        with mock.patch.object(
+            PostViewSet,
+            "get_queryset",
+            autospec=True,
+            side_effect=remember_routing,
+        ):
+            response = self.client.get(
+                reverse("media_post:post-detail", args=[self.post.id])
+            )
+        self.assertEqual(response.status_code, 200)
+        # the stamps, then the render of the miss
+        self.assertEqual(flags, [True, False])
+
+    def test_retrieve_is_not_modified_until_commented(self):
+        url = reverse("media_post:post-detail", args=[self.post.id])
+        etag, _ = self.assert_revalidates(url)
+
+        self.client.post(
+            reverse("media_post:post-create-comment", args=[self.post.id]),
+            {"text_content": "first"},
+        )
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data["comments"]), 1)
+
+    def test_feed_is_not_modified_without_serializing(self):
+        etag, queries = self.assert_revalidates(POST_URL)
+        self.assertEqual(queries, 1)
+
+        self.client.post(like_create_url(self.post.id))
+        response = self.client.get(POST_URL, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["results"][0]["like_count"], 1)
+
+
+class AsyncViewTests(TransactionTestCase):
+    def setUp(self):
+        self.profile = create_profile("user@test.com")
+        author = create_profile("author@test.com")
+        Follow.objects.create(follower=author, followee=self.profile)
+        Follow.objects.create(follower=self.profile, followee=author)
+        self.post = Post.objects.create(user=author, text_content="Hi #sun")
+        Comment.objects.create(
+            user=self.profile, post=self.post, text_content="first"
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.profile.user)
+
+    def test_async_views_match_drf_views(self):
+        Post.objects.create(user=self.post.user, text_content="Untagged")
+        pairs = [
+            ("media_post:post-list", "media_post:async-post-list", [], {}),
+            (
+                "media_post:post-list",
+                "media_post:async-post-list",
+                [],
+                {"hashtag": "#Sun"},
+            ),
+            (
+                "media_post:post-detail",
+                "media_post:async-post-detail",
+                [self.post.id],
+                {},
+            ),
+            (
+                "media_post:post-comments",
+                "media_post:async-post-comments",
+                [self.post.id],
+                {},
+            ),
+            ("user:followers-list", "user:async-followers", [], {}),
+        ]
+        for drf_name, async_name, args, query in pairs:
+            expected = self.client.get(reverse(drf_name, args=args), query)
+            response = self.client.get(reverse(async_name, args=args), query)
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response.json(), expected.json())
+
+    @override_settings(POST_DETAIL_COMMENTS=2)
+    def test_post_detail_embeds_the_newest_comments(self):
+        for text in ("second", "third"):
+            self.client.post(
+                reverse("media_post:post-create-comment", args=[self.post.id]),
+                {"text_content": text},
+            )
+        self.post.refresh_from_db()
+
+        for name in ("media_post:post-detail", "media_post:async-post-detail"):
+            data = self.client.get(reverse(name, args=[self.post.id])).json()
+            self.assertEqual(
+                [comment["text_content"] for comment in data["comments"]],
+                ["third", "second"],
+            )
+            self.assertEqual(data["comment_count"], self.post.comment_count)
+            comments = self.client.get(data["comments_url"]).json()
+            self.assertEqual(len(comments["results"]), 3)
+
+    def test_async_views_check_access(self):
+        stranger = create_profile("stranger@test.com")
+        self.client.force_authenticate(stranger.user)
+        url = reverse("media_post:async-post-detail", args=[self.post.id])
+        self.assertEqual(self.client.get(url).status_code, 404)
+
+        self.client.force_authenticate(None)
+        self.assertEqual(self.client.get(url).status_code, 401)
+
+
+class NotificationTests(TestCase):
+    def setUp(self):
+        self.profile = create_profile("user@test.com")
+        self.fan = create_profile("fan@test.com")
+        self.post = Post.objects.create(user=self.profile, text_content="Hi")
+
+    def act(self):
+        client = APIClient()
+        client.force_authenticate(self.fan.user)
+        with self.captureOnCommitCallbacks(execute=True):
+            Follow.objects.create(follower=self.fan, followee=self.profile)
+            client.post(like_create_url(self.post.id))
+            client.post(
+                reverse("media_post:post-create-comment", args=[self.post.id]),
+                {"text_content": "Nice"},
+            )
+            # notifying yourself is skipped
+            Like.objects.create(user=self.profile, post=self.post)
+            Comment.objects.create(
+                user=self.profile, post=self.post, text_content="Thanks"
+            )
+
+    async def test_likes_comments_and_follows_reach_subscribers(self):
+        channel = channel_of(self.profile.id)
+        async with get_pubsub().subscribe(channel) as subscription:
+            await sync_to_async(self.act)()
+            events = [await subscription.get(1) for _ in range(4)]
+        self.assertEqual(
+            [
+                (event["type"], event["actor"], event["post"])
+                for event in events[:3]
+            ],
+            [
+                ("follow", self.fan.id, None),
+                ("like", self.fan.id, self.post.id),
+                ("comment", self.fan.id, self.post.id),
+            ],
+        )
+        self.assertIsNone(events[3])
+
+    @override_settings(
+        NOTIFICATION_BUFFER_ENABLED=True, NOTIFICATION_BUFFER_URL="local"
+    )
+    def test_events_fold_into_one_notification_per_post_and_kind(self):
+        fans = [create_profile(f"fan{i}@test.com") for i in range(5)]
+        with self.captureOnCommitCallbacks(execute=True):
+            for fan in fans:
+                Like.objects.create(user=fan, post=self.post)
+            Comment.objects.create(
+                user=self.fan, post=self.post, text_content="Nice"
+            )
+        self.assertFalse(Notification.objects.exists())
+
+        self.assertEqual(flush_notifications(), 6)
+        self.assertEqual(
+            set(
+                self.profile.notifications.values_list(
+                    "kind", "actor", "count"
+                )
+            ),
+            {("like", fans[-1].id, 5), ("comment", self.fan.id, 1)},
+        )
+
+        # a read notification is closed, later events start a new one
+        self.profile.notifications.update(is_read=True)
+        with self.captureOnCommitCallbacks(execute=True):
+            Like.objects.create(user=self.fan, post=self.post)
+        flush_notifications()
+        self.assertEqual(self.profile.notifications.count(), 3)
+
+    def test_unread_count_and_read(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            Follow.objects.create(follower=self.fan, followee=self.profile)
+            Like.objects.create(user=self.fan, post=self.post)
+        client = APIClient()
+        client.force_authenticate(self.profile.user)
+        unread_url = reverse("media_post:notification-unread-count")
+
+        response = client.get(reverse("media_post:notification-list"))
+        self.assertEqual(len(response.data["results"]), 2)
+        self.assertEqual(client.get(unread_url).data, {"count": 2})
+        response = client.post(reverse("media_post:notification-read"))
+        self.assertEqual(response.data, {"count": 2})
+        self.assertEqual(client.get(unread_url).data, {"count": 0})
+
+    def test_concurrent_flushes_keep_one_notification_and_all_events(self):
+        other = create_profile("other@test.com")
+        key = (self.profile.id, Notification.LIKE, self.post.id)
+        record({key: (2, other.id)})
+        # a flush that did not see the notification opened by the first
+        insert_notifications(
+            [
+                Notification(
+                    recipient=self.profile,
+                    kind=Notification.LIKE,
+                    post=self.post,
+                    actor=self.fan,
+                    count=3,
+                )
+            ]
+        )
+        notification = self.profile.notifications.get()
+        self.assertEqual(
+            (notification.count, notification.actor_id), (5, self.fan.id)
+        )
+
+    def test_list_shows_latest_activity_first(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            Like.objects.create(user=self.fan, post=self.post)
+            Follow.objects.create(follower=self.fan, followee=self.profile)
+        with self.captureOnCommitCallbacks(execute=True):
+            Like.objects.create(
+                user=create_profile("other@test.com"), post=self.post
+            )
+        client = APIClient()
+        client.force_authenticate(self.profile.user)
+
+        response = client.get(reverse("media_post:notification-list"))
+        self.assertEqual(
+            [
+                (notification["type"], notification["count"])
+                for notification in response.data["results"]
+            ],
+            [("like", 2), ("follow", 1)],
+        )
+
+    @override_settings(SSE_HEARTBEAT=0.2, SSE_MAX_AGE=1)
+    async def test_stream_sends_events(self):
+        token = RefreshToken.for_user(self.profile.user).access_token
+        response = await AsyncClient().get(
+            reverse("media_post:notification-stream"),
+            headers={"Authorization": f"Bearer {token}"},
+        )
+        self.assertEqual(response["Content-Type"], "text/event-stream")
+
+        chunks = aiter(response.streaming_content)
+        self.assertTrue((await anext(chunks)).startswith(b"retry:"))
+        next_chunk = asyncio.ensure_future(anext(chunks))
+        await asyncio.sleep(0.1)
+        event = {"type": "follow", "actor": self.fan.id}
+        get_pubsub().publish(channel_of(self.profile.id), event)
+        self.assertEqual(
+            await asyncio.wait_for(next_chunk, 1),
+            f"event: follow\ndata: {json.dumps(event)}\n\n".encode(),
+        )
+        # heartbeats until the stream expires
+        self.assertEqual({chunk async for chunk in chunks}, {b":\n\n"})
+
+
+class PubSubTests(SimpleTestCase):
+    async def test_failed_subscribe_leaves_nothing_behind(self):
+        pubsub = RedisPubSub("redis://localhost:1")
+        with self.assertRaises(redis.ConnectionError), self.assertLogs(
+            "social_media_api.pubsub"
+        ):
+            async with pubsub.subscribe("events"):
+                pass
+        self.assertEqual(dict(pubsub.subscriptions), {})
+        self.assertEqual(pubsub.listeners, {})
+
+
+def batch_operation(method, path, body=None):
+    operation = {"method": method, "path": path}
+    if body is not None:
+        operation["body"] = body
+    return operation
+
+
+class BatchTests(TestCase):
+    def setUp(self):
+        self.profile = create_profile("user@test.com")
+        self.author = create_profile("author@test.com")
+        Follow.objects.create(follower=self.profile, followee=self.author)
+        self.post = Post.objects.create(user=self.author, text_content="Hi")
+        self.client = APIClient()
+        self.client.force_authenticate(self.profile.user)
+
+    def batch(self, *operations):
+        response = self.client.post(
+            reverse("batch"),
+            {
+                "operations": [
+                    batch_operation(*operation) for operation in operations
+                ]
+            },
+            format="json",
+        )
+        self.assertEqual(response.status_code, 200)
+        return response.data["results"]
+
+    def test_operations_match_separate_requests(self):
+        paths = [
+            reverse("media_post:post-detail", args=[self.post.id]),
+            comments_url(self.post.id),
+            reverse("user:userprofile-detail", args=[self.author.id]),
+        ]
+        expected = [self.client.get(path).json() for path in paths]
+        results = self.batch(
+            *(("GET", path) for path in paths),
+            ("POST", like_create_url(self.post.id)),
+        )
+        self.assertEqual([result["body"] for result in results[:3]], expected)
+        self.assertEqual(
+            [result["status"] for result in results], [200, 200, 200, 201]
+        )
+        self.assertTrue(
+            Like.objects.filter(user=self.profile, post=self.post).exists()
+        )
+
+    def test_reads_after_a_write_see_it(self):
+        Comment.objects.create(
+            user=self.profile, post=self.post, text_content="first"
+        )
+        url = comments_url(self.post.id)
+        results = self.batch(
+            ("GET", url),
+            ("PATCH", reverse("user:manage"), {"email": "new@test.com"}),
+            ("GET", url),
+        )
+        self.assertEqual(
+            [
+                (result["status"], result["body"]["results"][0]["user_email"])
+                for result in results[::2]
+            ],
+            [(200, "user@test.com"), (200, "new@test.com")],
+        )
+
+    def test_only_sync_api_routes_run(self):
+        results = self.batch(
+            ("GET", "/api/doc/swagger/"),
+            ("GET", "/api/media/missing/"),
+            ("GET", reverse("media_post:async-post-list")),
+        )
+        self.assertEqual(
+            [result["status"] for result in results], [404, 404, 400]
+        )
+
+
+class BenchmarkHarnessTests(TestCase):
+    def test_every_scenario_runs_against_a_seeded_graph(self):
+        profile_ids, post_ids = GraphSeeder(
+            users=20, follows=3, posts=2, likes=2, comments=1
+        ).seed()
+        self.assertEqual(len(post_ids), 40)
+        self.assertEqual(Like.objects.count(), 80)
+
+        benchmark = ApiBenchmark(profile_ids, post_ids)
+        for name in SCENARIOS:
+            result = benchmark.run(name, requests=5, warmup=0)
+            self.assertEqual(sum(result["statuses"].values()), 5)
+            self.assertFalse(
+                set(result["statuses"]) - {"200", "201", "400"}, name
+            )
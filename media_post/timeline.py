@@ -0,0 +1,213 @@
+from django.conf import settings
+from django.db import connection
+from django.db.models import Count, Q
+
+from media_post.hashtags import tagged
+from media_post.models import Post, TimelineEntry
+from user.models import Follow, UserProfile
+
+
+def followers_of(profile):
+    """Ids of the profiles that follow `profile`."""
+    return Follow.objects.filter(followee=profile).values_list(
+        "follower_id", flat=True
+    )
+
+
+def followees_of(profile):
+    """Ids of the profiles that `profile` follows."""
+    return Follow.objects.filter(follower=profile).values_list(
+        "followee_id", flat=True
+    )
+
+
+def celebrities_among(profile_ids):
+    """Profiles whose audience is too large for fan-out-on-write."""
+    return UserProfile.objects.filter(
+        id__in=list(profile_ids),
+        follower_count__gt=settings.TIMELINE_FANOUT_THRESHOLD,
+    ).values_list("id", flat=True)
+
+
+def audience_size(author_id):
+    """Timelines besides the author's that a new post is pushed into."""
+    followers = (
+        UserProfile.objects.filter(pk=author_id)
+        .values_list("follower_count", flat=True)
+        .first()
+    ) or 0
+    return 0 if followers > settings.TIMELINE_FANOUT_THRESHOLD else followers
+
+
+def _push(owner_posts):
+    entries = [
+        TimelineEntry(
+            owner_id=owner_id, post_id=post.id, created_at=post.created_at
+        )
+        for owner_id, posts in owner_posts
+        for post in posts
+    ]
+    TimelineEntry.objects.bulk_create(
+        entries,
+        batch_size=settings.TIMELINE_BATCH_SIZE,
+        ignore_conflicts=True,
+    )
+
+
+def fan_out_post(post):
+    """Push a new post into the timelines of its author and followers.
+
+    Celebrity posts only land in the author's own timeline, followers
+    pick them up at read time.
+    """
+    owners = [post.user_id]
+    if audience_size(post.user_id):
+        owners.extend(followers_of(post.user_id))
+    _push((owner_id, [post]) for owner_id in owners)
+
+
+def fan_out_posts(posts):
+    """Bulk version of `fan_out_post` for posts published together."""
+    author_ids = {post.user_id for post in posts}
+    audience = {author_id: [author_id] for author_id in author_ids}
+    regular = author_ids - set(celebrities_among(author_ids))
+    for follower_id, followee_id in Follow.objects.filter(
+        followee_id__in=regular
+    ).values_list("follower_id", "followee_id"):
+        audience[followee_id].append(follower_id)
+
+    _push(
+        (owner_id, [post])
+        for post in posts
+        for owner_id in audience[post.user_id]
+    )
+
+
+def fan_out_post_range(start_id, stop_id):
+    """Set-based `fan_out_posts` for the posts with ids in [start, stop).
+
+    Timeline rows are produced by a single INSERT ... SELECT, so nothing
+    is loaded into Python. Used to fill timelines of bulk inserted posts.
+    """
+    post = Post._meta.db_table
+    follow = Follow._meta.db_table
+    profile = UserProfile._meta.db_table
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"INSERT INTO {TimelineEntry._meta.db_table} "
+            f"(owner_id, post_id, created_at) "
+            f"SELECT user_id, id, created_at FROM {post} "
+            f"WHERE id >= %s AND id < %s "
+            f"UNION ALL "
+            f"SELECT f.follower_id, p.id, p.created_at FROM {post} p "
+            f"JOIN {profile} a ON a.id = p.user_id "
+            f"JOIN {follow} f ON f.followee_id = p.user_id "
+            f"WHERE p.id >= %s AND p.id < %s AND a.follower_count <= %s "
+            f"ON CONFLICT DO NOTHING",
+            [start_id, stop_id] * 2 + [settings.TIMELINE_FANOUT_THRESHOLD],
+        )
+        return cursor.rowcount
+
+
+def backfill_timeline(profile, followee_ids):
+    """Copy recent posts of newly followed profiles into a timeline."""
+    followee_ids = set(followee_ids) - set(celebrities_among(followee_ids))
+    for followee_id in followee_ids:
+        posts = Post.objects.filter(user_id=followee_id).order_by(
+            "-created_at"
+        )[: settings.TIMELINE_BACKFILL_SIZE]
+        _push([(profile.id, posts)])
+
+
+def prune_timeline(profile, followee_ids):
+    """Drop posts of unfollowed profiles from a timeline."""
+    TimelineEntry.objects.filter(
+        owner=profile, post__user_id__in=followee_ids
+    ).delete()
+
+
+def rebuild_timeline(profile):
+    TimelineEntry.objects.filter(owner=profile).delete()
+    _push(
+        [
+            (
+                profile.id,
+                Post.objects.filter(user=profile).order_by("-created_at")[
+                    : settings.TIMELINE_BACKFILL_SIZE
+                ],
+            )
+        ]
+    )
+    backfill_timeline(profile, followees_of(profile))
+
+
+def visible_posts(profile, queryset=None):
+    """Posts `profile` may open, its own and those of followed profiles."""
+    if queryset is None:
+        queryset = Post.objects.all()
+    return queryset.filter(
+        Q(user=profile) | Q(user_id__in=followees_of(profile))
+    )
+
+
+def feed_queryset(profile, size, cursor=None, hashtag=None):
+    """Posts of one feed page, the `size` newest older than `cursor`.
+
+    The page is picked from the timeline rows of `profile`, a range of
+    the `(owner, created_at)` index, and from the posts of the followed
+    celebrities, a range of `(user, created_at)` per celebrity. Only the
+    picked posts are joined, however long the timeline is.
+    """
+    entries = TimelineEntry.objects.filter(owner=profile)
+    celebrity_posts = Post.objects.filter(
+        user_id__in=Follow.objects.filter(
+            follower=profile,
+            followee__follower_count__gt=settings.TIMELINE_FANOUT_THRESHOLD,
+        ).values("followee_id")
+    )
+    if hashtag:
+        entries = entries.filter(
+            post__hashtags__name=hashtag.lstrip("#").lower()
+        )
+        celebrity_posts = tagged(celebrity_posts, hashtag)
+    if cursor is not None:
+        moment, pk = cursor
+        entries = entries.filter(
+            Q(created_at__lt=moment) | Q(created_at=moment, post_id__lt=pk)
+        )
+        celebrity_posts = celebrity_posts.filter(
+            Q(created_at__lt=moment) | Q(created_at=moment, id__lt=pk)
+        )
+    page = entries.order_by("-created_at", "-post_id").values("post_id")
+    celebrity_page = celebrity_posts.order_by("-created_at", "-id")
+    return Post.objects.filter(
+        Q(id__in=page[:size]) | Q(id__in=celebrity_page.values("id")[:size])
+    )
+
+
+def trim_timeline(owner_id):
+    """Drop the entries of a timeline past the TIMELINE_MAX_SIZE newest."""
+    oldest_kept = (
+        TimelineEntry.objects.filter(owner_id=owner_id)
+        .order_by("-created_at", "-post_id")
+        .values_list("created_at", "post_id")[
+            settings.TIMELINE_MAX_SIZE - 1 : settings.TIMELINE_MAX_SIZE
+        ]
+    )
+    for moment, pk in oldest_kept:
+        return TimelineEntry.objects.filter(
+            Q(created_at__lt=moment) | Q(created_at=moment, post_id__lt=pk),
+            owner_id=owner_id,
+        ).delete()[0]
+    return 0
+
+
+def trim_timelines():
+    """Trim every timeline grown past TIMELINE_MAX_SIZE entries."""
+    owner_ids = (
+        TimelineEntry.objects.values("owner_id")
+        .annotate(entries=Count("id"))
+        .filter(entries__gt=settings.TIMELINE_MAX_SIZE)
+        .values_list("owner_id", flat=True)
+    )
+    return sum(trim_timeline(owner_id) for owner_id in list(owner_ids))
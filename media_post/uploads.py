@@ -0,0 +1,122 @@
+import hashlib
+import os
+import re
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from PIL import Image
+from rest_framework.exceptions import ValidationError
+
+from media_post.blobs import acquire, release
+from media_post.models import Post, post_image_file_path
+from media_post.storage import blob_name, media_storage
+
+CONTENT_RANGE = re.compile(r"^bytes (\d+)-(\d+)/(\d+)$")
+
+
+class UploadOffsetMismatch(ValidationError):
+    status_code = 409
+
+
+class InvalidUpload(Exception):
+    def __init__(self, session):
+        super().__init__(session.filename)
+        self.session = session
+
+
+def start_upload(profile, filename, size):
+    if size > settings.UPLOAD_MAX_SIZE:
+        raise ValidationError({"size": "File is too large."})
+
+    # files land where post attachments live, posts then reference them
+    path = post_image_file_path(Post(user=profile), filename)
+    os.makedirs(os.path.dirname(default_storage.path(path)), exist_ok=True)
+    open(default_storage.path(path), "wb").close()
+    return path
+
+
+def parse_content_range(header, session):
+    match = CONTENT_RANGE.match(header or "")
+    if match is None:
+        raise ValidationError(
+            {"Content-Range": "Expected 'bytes <start>-<end>/<total>'."}
+        )
+
+    start, end, total = map(int, match.groups())
+    if total != session.size or end < start or end >= total:
+        raise ValidationError({"Content-Range": "Invalid byte range."})
+    if start != session.offset:
+        raise UploadOffsetMismatch({"offset": session.offset})
+    return start, end
+
+
+def write_chunk(session, stream, start, end):
+    """Copy the request body into the file without buffering it whole."""
+    remaining = end - start + 1
+    with open(default_storage.path(session.file_path), "r+b") as target:
+        target.seek(start)
+        while remaining:
+            block = stream.read(min(settings.UPLOAD_CHUNK_SIZE, remaining))
+            if not block:
+                break
+            target.write(block)
+            remaining -= len(block)
+        target.truncate()
+    return end - start + 1 - remaining
+
+
+def detect_image_format(session):
+    """Identify the image from the header bytes written so far.
+
+    Only the header is parsed, pixel data is never decoded. Returns the
+    format, or None while more bytes are needed, and raises InvalidUpload
+    once the bytes can not be an accepted image.
+    """
+    limit = min(session.offset, settings.UPLOAD_HEADER_LIMIT)
+    with open(default_storage.path(session.file_path), "rb") as source:
+        head = source.read(limit)
+
+    try:
+        image = Image.open(BytesIO(head))
+    except Image.DecompressionBombError:
+        raise InvalidUpload(session)
+    except (OSError, SyntaxError, ValueError):
+        if session.offset >= settings.UPLOAD_HEADER_LIMIT or (
+            session.offset == session.size
+        ):
+            raise InvalidUpload(session)
+        return None
+
+    if image.format not in settings.UPLOAD_IMAGE_FORMATS:
+        raise InvalidUpload(session)
+    return image.format
+
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with default_storage.open(path, "rb") as source:
+        for block in source.chunks(settings.UPLOAD_CHUNK_SIZE):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def complete_upload(session):
+    """Move the assembled file to its content address."""
+    session.sha256 = file_sha256(session.file_path)
+    name = blob_name(session.sha256, session.filename)
+    # referenced before an existing copy is reused, so that `collect()`
+    # cannot remove it in between
+    acquire(name)
+    session.file_path = media_storage().store(
+        default_storage.path(session.file_path), name
+    )
+    session.is_complete = True
+
+
+def discard_upload(session):
+    if session.is_complete:
+        release(session.file_path)
+    else:
+        default_storage.delete(session.file_path)
+    session.delete()
@@ -1,10 +1,38 @@
+from django.urls import path
 from rest_framework import routers
 
-from media_post.views import PostViewSet
+from media_post.async_views import (
+    async_feed,
+    async_post_comments,
+    async_post_detail,
+    notification_stream,
+)
+from media_post.views import (
+    HashtagViewSet,
+    NotificationViewSet,
+    PostViewSet,
+    UploadViewSet,
+)
 
 router = routers.DefaultRouter()
 router.register("post", PostViewSet)
+router.register("uploads", UploadViewSet)
+router.register("hashtags", HashtagViewSet, basename="hashtag")
+router.register("notifications", NotificationViewSet, basename="notification")
 
-urlpatterns = router.urls
+urlpatterns = router.urls + [
+    path("async/post/", async_feed, name="async-post-list"),
+    path("async/post/<int:pk>/", async_post_detail, name="async-post-detail"),
+    path(
+        "async/post/<int:pk>/comments/",
+        async_post_comments,
+        name="async-post-comments",
+    ),
+    path(
+        "notifications/stream/",
+        notification_stream,
+        name="notification-stream",
+    ),
+]
 
 app_name = "media_post"
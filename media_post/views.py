@@ -1,14 +1,30 @@
-from django.db.models import Q
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import F, prefetch_related_objects
 from django.http import Http404
+from django.utils import timezone
 from drf_spectacular.utils import extend_schema, OpenApiParameter
 from rest_framework import viewsets, mixins, status
 from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
-from rest_framework_simplejwt.authentication import JWTAuthentication
 from drf_spectacular.types import OpenApiTypes
+from rest_framework.generics import get_object_or_404
 
-from media_post.models import Post, Comment, Like
+from media_post import counters, uploads
+from media_post.cache import get_post_cache
+from media_post.like_buffer import get_buffer, pending_likes
+from media_post.models import (
+    Post,
+    Comment,
+    Like,
+    Notification,
+    UploadSession,
+)
+from media_post.notifications import notify
 from media_post.serializers import (
     PostListCreateSerializer,
     PostDetailSerializer,
@@ -17,11 +33,18 @@ from media_post.serializers import (
     LikeListSerializer,
     LikeCreateSerializer,
     PostCreateScheduleSerializer,
+    UploadSessionSerializer,
+    TrendingHashtagSerializer,
+    NotificationSerializer,
 )
-from user.models import Follow, UserProfile
+from social_media_api.conditional import Validators
+from social_media_api.routers import replica_reads
+from user.authentication import CachedJWTAuthentication
 from user.permissions import IsCommentOwner
-from user.serializers import UserProfileSerializer
-from .tasks import create_post
+from .hashtags import trending
+from .pagination import KeysetPagination, RankPagination, UpdatedPagination
+from .search import PostSearch
+from .timeline import feed_queryset, visible_posts
 
 
 class PostViewSet(
@@ -33,21 +56,38 @@ class PostViewSet(
     viewsets.GenericViewSet,
 ):
 
-    authentication_classes = (JWTAuthentication,)
+    authentication_classes = (CachedJWTAuthentication,)
     permission_classes = (IsAuthenticated,)
     queryset = Post.objects.select_related("user")
+    pagination_class = KeysetPagination
 
     def get_queryset(self):
-        following_users = Follow.objects.filter(
-            user__user=self.request.user
-        ).values_list("following")
-        queryset = self.queryset(
-            Q(user__user=self.request.user) & Q(user_id__in=following_users)
-        )
+        profile = getattr(self.request.user, "userprofile", None)
+        if profile is None:
+            return self.queryset.none()
+
+        if self.action == "list":
+            # only the posts of the requested page are selected, one more
+            # than the page size tells the paginator whether a next exists;
+            # hashtags are prefetched after the conditional check
+            queryset = feed_queryset(
+                profile,
+                self.paginator.get_page_size(self.request) + 1,
+                self.paginator.decode_cursor(self.request),
+                self.request.query_params.get("hashtag"),
+            ).annotate(author_updated_at=F("user__updated_at"))
+            return queryset.order_by("-created_at", "-id")
+
+        queryset = visible_posts(profile, self.queryset)
+
+        if self.action == "retrieve":
+            queryset = queryset.select_related("user__user").prefetch_related(
+                "hashtags"
+            )
         return queryset
 
     def get_serializer_class(self):
-        if self.action in ("list", "post"):
+        if self.action in ("list", "create", "search"):
             return PostListCreateSerializer
 
         if self.action in ("comments",):
@@ -76,30 +116,57 @@ class PostViewSet(
             serializer.data, status=status.HTTP_201_CREATED, headers=headers
         )
 
+    def retrieve(self, request, *args, **kwargs):
+        pk = self.kwargs["pk"]
+        # the stamps query also checks that the post is visible
+        stamps = get_object_or_404(
+            self.get_queryset()
+            .prefetch_related(None)
+            .values_list("id", "updated_at", "user__updated_at"),
+            pk=pk,
+        )
+        validators = Validators(
+            stamps[1:], request.get_host(), pending_likes([stamps[0]])
+        )
+        not_modified = validators.not_modified(request)
+        if not_modified is not None:
+            return not_modified
+
+        post_cache = get_post_cache()
+        data = post_cache.get(pk, request.get_host())
+        if data is None:
+            # a lagging replica would store an old render under the
+            # current stamps, where it stays until the next invalidation
+            with replica_reads(False):
+                post = self.get_object()
+                data = post_cache.render(
+                    post.pk,
+                    post.user_id,
+                    request.get_host(),
+                    lambda: self.get_serializer(post).data,
+                )
+        return validators.apply(Response(data))
+
     @action(
         methods=["POST"],
         detail=False,
         url_path="post-create-schedule",
     )
     def create_post(self, request):
-        """Create schedule Post """
-        profile = UserProfile.objects.get(user=request.user)
-        profile_serializer = UserProfileSerializer(profile)
-        request.data["user"] = profile_serializer.data["id"]
-        publish_time = request.data.get("publish_time", False)
-
-        if publish_time:
-            create_post.delay(request.data, publish_time)
-            return Response(status=status.HTTP_202_ACCEPTED)
+        """Create schedule Post"""
+        if not request.data.get("publish_time"):
+            serializer = PostListCreateSerializer(
+                data=request.data, context=self.get_serializer_context()
+            )
+            serializer.is_valid(raise_exception=True)
+            self.perform_create(serializer)
+            return Response(serializer.data, status=status.HTTP_201_CREATED)
 
+        # published by the publish_scheduled_posts beat task
         serializer = self.get_serializer(data=request.data)
         serializer.is_valid(raise_exception=True)
         self.perform_create(serializer)
-        headers = self.get_success_headers(serializer.data)
-
-        return Response(
-            serializer.data, status=status.HTTP_201_CREATED, headers=headers
-        )
+        return Response(serializer.data, status=status.HTTP_202_ACCEPTED)
 
     @action(
         detail=True,
@@ -109,8 +176,9 @@ class PostViewSet(
     def comments(self, request, pk=None):
         post = self.get_object()
         comments = post.comments.all()
-        serializer = self.get_serializer(comments, many=True)
-        return Response(serializer.data)
+        page = self.paginate_queryset(comments)
+        serializer = self.get_serializer(page, many=True)
+        return self.get_paginated_response(serializer.data)
 
     @action(
         methods=["POST"],
@@ -125,7 +193,9 @@ class PostViewSet(
             context={"request": request, "post": post},
         )
         serializer.is_valid(raise_exception=True)
-        self.perform_create(serializer)
+        with transaction.atomic():
+            self.perform_create(serializer)
+            counters.increment(post, "comment_count")
         headers = self.get_success_headers(serializer.data)
 
         return Response(
@@ -176,7 +246,9 @@ class PostViewSet(
         except Comment.DoesNotExist:
             raise Http404
 
-        comment.delete()
+        with transaction.atomic():
+            comment.delete()
+            counters.decrement(post, "comment_count")
         return Response(status=status.HTTP_204_NO_CONTENT)
 
     @action(
@@ -185,13 +257,28 @@ class PostViewSet(
         url_path="likes",
     )
     def likes(self, request, pk=None):
-        """Viewing the posts we liked, the result is filtered by a specific user."""
-        user = request.user
-        posts = Like.objects.all(user__user=user).prefetch_related(
-            "user__user"
+        """Viewing the users who liked a specific post."""
+        post = self.get_object()
+        likes = post.likes.select_related("user__user")
+        page = self.paginate_queryset(likes)
+
+        like_buffer = get_buffer()
+        profile = getattr(request.user, "userprofile", None)
+        first_page = (
+            self.paginator.cursor_query_param not in request.query_params
         )
-        serializer = self.get_serializer(posts, many=True)
-        return Response(serializer.data)
+        if (
+            like_buffer is not None
+            and profile is not None
+            and first_page
+            and like_buffer.has_liked(post.id, profile.id)
+        ):
+            # the user's own like is still buffered, show it as the newest
+            page.insert(
+                0, Like(user=profile, post=post, created_at=timezone.now())
+            )
+        serializer = self.get_serializer(page, many=True)
+        return self.get_paginated_response(serializer.data)
 
     @action(
         detail=True,
@@ -203,21 +290,40 @@ class PostViewSet(
         post = self.get_object()
         user = request.user
 
-        try:
-            Like.objects.get(post=post, user__user=user)
-        except Like.DoesNotExist:
-            serializer = self.get_serializer(
-                data=request.data, context={"request": request, "post": post}
-            )
-            serializer.is_valid(raise_exception=True)
-            self.perform_create(serializer)
-            headers = self.get_success_headers(serializer.data)
+        like_buffer = get_buffer()
+        if like_buffer is not None:
+            # a probe of the unique like index; a like saved by a flush
+            # running meanwhile is skipped by it and counted once on reads
+            profile = user.userprofile
+            if Like.objects.filter(
+                post=post, user=profile
+            ).exists() or not like_buffer.add(post.id, profile.id):
+                return Response(status=status.HTTP_400_BAD_REQUEST)
+            get_post_cache().invalidate_posts([post.id])
+            # the buffered like is saved later in bulk, without signals
+            notify(post.user_id, Notification.LIKE, profile.id, post.id)
             return Response(
-                serializer.data,
+                {"user": profile.id, "post": post.id},
                 status=status.HTTP_201_CREATED,
-                headers=headers,
             )
-        return Response(status=status.HTTP_400_BAD_REQUEST)
+
+        serializer = self.get_serializer(
+            data=request.data, context={"request": request, "post": post}
+        )
+        serializer.is_valid(raise_exception=True)
+        try:
+            # the unique constraint rejects a concurrent duplicate insert
+            with transaction.atomic():
+                self.perform_create(serializer)
+                counters.increment(post, "like_count")
+        except IntegrityError:
+            return Response(status=status.HTTP_400_BAD_REQUEST)
+        headers = self.get_success_headers(serializer.data)
+        return Response(
+            serializer.data,
+            status=status.HTTP_201_CREATED,
+            headers=headers,
+        )
 
     @action(
         detail=True,
@@ -228,14 +334,52 @@ class PostViewSet(
         """Delete our own like"""
         post = self.get_object()
         user = request.user
+
+        like_buffer = get_buffer()
+        buffered = like_buffer is not None and like_buffer.discard(
+            post.id, user.userprofile.id
+        )
+        if buffered:
+            get_post_cache().invalidate_posts([post.id])
+
+        # a like may be buffered and saved at once, see like_create
         try:
             like = Like.objects.get(post=post, user__user=user)
         except Like.DoesNotExist:
+            if buffered:
+                return Response(status=status.HTTP_204_NO_CONTENT)
             raise Http404
-        like.delete()
+        with transaction.atomic():
+            like.delete()
+            counters.decrement(post, "like_count")
 
         return Response(status=status.HTTP_204_NO_CONTENT)
 
+    @extend_schema(
+        parameters=[
+            OpenApiParameter(
+                "q",
+                type=OpenApiTypes.STR,
+                description="Words to look for in the text and hashtag "
+                "(ex. ?q=summer beach)",
+            ),
+        ]
+    )
+    @action(detail=False, methods=["GET"], url_path="search")
+    def search(self, request):
+        """Search your posts and those you follow, best matches first"""
+        results = PostSearch(
+            request.query_params.get("q", ""),
+            self.get_queryset()
+            .select_related(None)
+            .prefetch_related("hashtags"),
+            profile=getattr(request.user, "userprofile", None),
+        )
+        paginator = RankPagination()
+        page = paginator.paginate_queryset(results, request, view=self)
+        serializer = self.get_serializer(page, many=True)
+        return paginator.get_paginated_response(serializer.data)
+
     @extend_schema(
         parameters=[
             OpenApiParameter(
@@ -247,4 +391,186 @@ class PostViewSet(
     )
     def list(self, request, *args, **kwargs):
         """U can filter Post by hashtag"""
-        return super().list(request, *args, **kwargs)
+        page = self.paginate_queryset(self.get_queryset())
+        ids = [post.id for post in page]
+        validators = Validators(
+            [post.updated_at for post in page]
+            + [post.author_updated_at for post in page],
+            ids,
+            self.paginator.has_next,
+            request.get_host(),
+            pending_likes(ids),
+        )
+        not_modified = validators.not_modified(request)
+        if not_modified is not None:
+            return not_modified
+
+        prefetch_related_objects(page, "hashtags")
+        serializer = self.get_serializer(page, many=True)
+        return validators.apply(self.get_paginated_response(serializer.data))
+
+
+class UploadViewSet(
+    mixins.CreateModelMixin,
+    mixins.RetrieveModelMixin,
+    mixins.DestroyModelMixin,
+    viewsets.GenericViewSet,
+):
+    """Resumable uploads of post media.
+
+    Create a session with the file name and size, then PUT the bytes in
+    one or more requests with a `Content-Range` header. After an
+    interruption, the session `offset` tells where to resume. A completed
+    upload is attached to a new post through its `upload` field.
+    """
+
+    authentication_classes = (CachedJWTAuthentication,)
+    permission_classes = (IsAuthenticated,)
+    queryset = UploadSession.objects.all()
+    serializer_class = UploadSessionSerializer
+
+    def get_queryset(self):
+        profile = getattr(self.request.user, "userprofile", None)
+        if profile is None:
+            return self.queryset.none()
+        return self.queryset.filter(user=profile)
+
+    def perform_create(self, serializer):
+        profile = self.request.user.userprofile
+        file_path = uploads.start_upload(
+            profile,
+            serializer.validated_data["filename"],
+            serializer.validated_data["size"],
+        )
+        serializer.save(user=profile, file_path=file_path)
+
+    def perform_destroy(self, instance):
+        uploads.discard_upload(instance)
+
+    @extend_schema(
+        request={"application/octet-stream": OpenApiTypes.BINARY},
+        parameters=[
+            OpenApiParameter(
+                "Content-Range",
+                type=OpenApiTypes.STR,
+                location=OpenApiParameter.HEADER,
+                description="Byte range of the chunk "
+                "(ex. bytes 0-65535/1048576)",
+            ),
+        ],
+    )
+    @action(detail=True, methods=["PUT"], url_path="chunk")
+    def chunk(self, request, pk=None):
+        """Append a chunk of the file at the current offset"""
+        try:
+            session = self._write_chunk(request, pk)
+        except uploads.InvalidUpload as error:
+            uploads.discard_upload(error.session)
+            raise ValidationError("Upload a valid image.")
+
+        serializer = self.get_serializer(session)
+        return Response(serializer.data)
+
+    def _write_chunk(self, request, pk):
+        with transaction.atomic():
+            # one writer per session, a parallel chunk waits for the lock
+            session = get_object_or_404(
+                self.get_queryset().select_for_update(), pk=pk
+            )
+            if session.is_complete:
+                raise uploads.UploadOffsetMismatch({"offset": session.offset})
+
+            start, end = uploads.parse_content_range(
+                request.headers.get("Content-Range"), session
+            )
+            # the body is read straight from the stream, never parsed
+            session.offset += uploads.write_chunk(
+                session, request.stream, start, end
+            )
+            if not session.image_format:
+                session.image_format = (
+                    uploads.detect_image_format(session) or ""
+                )
+            if session.offset == session.size:
+                uploads.complete_upload(session)
+            session.save()
+        return session
+
+
+class HashtagViewSet(viewsets.GenericViewSet):
+    authentication_classes = (CachedJWTAuthentication,)
+    permission_classes = (IsAuthenticated,)
+    serializer_class = TrendingHashtagSerializer
+
+    @extend_schema(
+        parameters=[
+            OpenApiParameter(
+                "hours",
+                type=OpenApiTypes.INT,
+                description="Length of the window in hours (ex. ?hours=6)",
+            ),
+            OpenApiParameter(
+                "limit",
+                type=OpenApiTypes.INT,
+                description="Number of hashtags (ex. ?limit=10)",
+            ),
+        ]
+    )
+    @action(detail=False, methods=["GET"], url_path="trending")
+    def trending(self, request):
+        """Most used hashtags of the last hours"""
+        longest = int(settings.TRENDING_WINDOW.total_seconds() // 3600)
+        hours = self._int_param("hours", longest, longest)
+        limit = self._int_param("limit", 10, 100)
+        serializer = self.get_serializer(
+            trending(timedelta(hours=hours), limit), many=True
+        )
+        return Response(serializer.data)
+
+    def _int_param(self, name, default, maximum):
+        try:
+            value = int(self.request.query_params[name])
+        except (KeyError, ValueError):
+            return default
+        return min(max(value, 1), maximum)
+
+
+class NotificationViewSet(mixins.ListModelMixin, viewsets.GenericViewSet):
+    authentication_classes = (CachedJWTAuthentication,)
+    permission_classes = (IsAuthenticated,)
+    serializer_class = NotificationSerializer
+    pagination_class = UpdatedPagination
+
+    def get_queryset(self):
+        profile = getattr(self.request.user, "userprofile", None)
+        if profile is None:
+            return Notification.objects.none()
+        return Notification.objects.filter(recipient=profile)
+
+    @action(detail=False, methods=["GET"], url_path="unread-count")
+    def unread_count(self, request):
+        """Number of unread notifications"""
+        count = self.get_queryset().filter(is_read=False).count()
+        return Response({"count": count})
+
+    @extend_schema(
+        parameters=[
+            OpenApiParameter(
+                "up_to",
+                type=OpenApiTypes.INT,
+                description="Only mark notifications up to this id "
+                "(ex. ?up_to=42)",
+            ),
+        ]
+    )
+    @action(detail=False, methods=["POST"], url_path="read")
+    def read(self, request):
+        """Mark the unread notifications as read"""
+        queryset = self.get_queryset().filter(is_read=False)
+        up_to = request.query_params.get("up_to")
+        if up_to is not None:
+            try:
+                queryset = queryset.filter(id__lte=int(up_to))
+            except ValueError:
+                raise ValidationError({"up_to": "Must be an integer"})
+        return Response({"count": queryset.update(is_read=True)})
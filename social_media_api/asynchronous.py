@@ -0,0 +1,106 @@
+"""Support for the async (ASGI) variants of read-heavy endpoints.
+
+DRF 3.14 views are synchronous, so the async endpoints are plain Django
+async views. They authenticate with the same JWT classes and render the
+same serializers, after every row the serializers touch was loaded with
+the async ORM.
+"""
+
+import asyncio
+import functools
+
+from asgiref.sync import sync_to_async
+from django.db import close_old_connections
+from django.http import Http404, HttpResponse, HttpResponseBase
+from rest_framework import status
+from rest_framework.exceptions import (
+    APIException,
+    NotAuthenticated,
+    NotFound,
+    Throttled,
+)
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.settings import api_settings
+
+from user.authentication import CachedJWTAuthentication
+
+
+def _on_own_connection(function):
+    def run():
+        close_old_connections()
+        try:
+            return function()
+        finally:
+            close_old_connections()
+
+    return run
+
+
+async def gather_queries(*functions):
+    """Run independent ORM calls at the same time, return their results.
+
+    Django 4.2 sends every async ORM call of a request through one thread,
+    so awaiting several of them together still runs them one after the
+    other. Each function here runs in its own worker thread, on its own
+    connection, which is closed afterwards like at the end of a request
+    (CONN_MAX_AGE applies).
+    """
+    return await asyncio.gather(
+        *(
+            sync_to_async(
+                _on_own_connection(function), thread_sensitive=False
+            )()
+            for function in functions
+        )
+    )
+
+
+def render(data, status_code=status.HTTP_200_OK):
+    return HttpResponse(
+        JSONRenderer().render(data),
+        status=status_code,
+        content_type="application/json",
+    )
+
+
+def check_request(request):
+    """Authenticate and throttle like a DRF view with the defaults."""
+    if not request.user.is_authenticated:
+        raise NotAuthenticated()
+    for throttle_class in api_settings.DEFAULT_THROTTLE_CLASSES:
+        throttle = throttle_class()
+        if not throttle.allow_request(request, None):
+            raise Throttled(throttle.wait())
+
+
+def async_api_view(view):
+    """Authenticate an async view like the DRF views, errors included.
+
+    The view is called with a DRF Request, which gives it `user` and
+    `query_params`, and returns data to render or a response.
+    """
+
+    @functools.wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        authentication = CachedJWTAuthentication()
+        drf_request = Request(request, authenticators=[authentication])
+        try:
+            # user and throttle lookups may block, keep them off the loop
+            await sync_to_async(check_request)(drf_request)
+            try:
+                result = await view(drf_request, *args, **kwargs)
+            except Http404:
+                raise NotFound()
+        except APIException as exc:
+            response = render({"detail": exc.detail}, exc.status_code)
+            if exc.status_code == status.HTTP_401_UNAUTHORIZED:
+                response["WWW-Authenticate"] = (
+                    authentication.authenticate_header(drf_request)
+                )
+            return response
+        if isinstance(result, HttpResponseBase):
+            return result
+        return render(result)
+
+    return wrapper
@@ -0,0 +1,165 @@
+"""Several API calls in one request.
+
+The operations run one after the other, in process, against the views of
+the `media_post` and `user` routes. The batch is authenticated once and
+its user is handed to every operation, which also share the batch
+loaders of the request, so a profile loaded by one operation is not
+queried again by the next. Operations that write start fresh loaders
+for those that follow. Middleware runs once, for the batch.
+"""
+
+import json
+from io import BytesIO
+from urllib.parse import urlsplit
+
+from asgiref.sync import iscoroutinefunction
+from django.conf import settings
+from django.core.handlers.wsgi import WSGIRequest
+from django.urls import Resolver404, resolve
+from drf_spectacular.utils import extend_schema
+from rest_framework import serializers, status
+from rest_framework.permissions import IsAuthenticated
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from social_media_api.middleware import SAFE_METHODS, route_view, view_label
+from social_media_api.routers import replica_reads
+from user.authentication import CachedJWTAuthentication
+from user.loaders import Loaders, get_loaders
+
+NAMESPACES = ("media_post", "user")
+
+
+class BatchOperationSerializer(serializers.Serializer):
+    method = serializers.ChoiceField(
+        choices=("GET", "POST", "PUT", "PATCH", "DELETE")
+    )
+    path = serializers.RegexField(r"^/api/")
+    headers = serializers.DictField(
+        child=serializers.CharField(), required=False, default=dict
+    )
+    body = serializers.JSONField(required=False, default=None)
+
+
+class BatchSerializer(serializers.Serializer):
+    operations = BatchOperationSerializer(many=True, allow_empty=False)
+
+    def validate_operations(self, operations):
+        if len(operations) > settings.BATCH_MAX_OPERATIONS:
+            raise serializers.ValidationError(
+                f"At most {settings.BATCH_MAX_OPERATIONS} operations"
+            )
+        return operations
+
+
+class BatchResultSerializer(serializers.Serializer):
+    status = serializers.IntegerField()
+    headers = serializers.DictField(child=serializers.CharField())
+    body = serializers.JSONField(allow_null=True)
+
+
+class BatchResponseSerializer(serializers.Serializer):
+    results = BatchResultSerializer(many=True)
+
+
+def error(status_code, detail):
+    return {"status": status_code, "headers": {}, "body": {"detail": detail}}
+
+
+class BatchView(APIView):
+    authentication_classes = (CachedJWTAuthentication,)
+    permission_classes = (IsAuthenticated,)
+    serializer_class = BatchSerializer
+    # every operation is routed like a request of its own
+    routes_operations = True
+
+    @extend_schema(responses=BatchResponseSerializer)
+    def post(self, request):
+        """Run several media and user API calls, return every response"""
+        serializer = BatchSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        loaders = get_loaders({"request": request})
+        results = []
+        for operation in serializer.validated_data["operations"]:
+            results.append(self.run(request, operation, loaders))
+            if operation["method"] not in SAFE_METHODS:
+                # the write may have changed loaded profiles and users
+                loaders = Loaders()
+        return Response({"results": results})
+
+    def run(self, request, operation, loaders):
+        url = urlsplit(operation["path"])
+        try:
+            match = resolve(url.path)
+        except Resolver404:
+            return error(status.HTTP_404_NOT_FOUND, "Not found.")
+        if not match.namespaces or match.namespaces[0] not in NAMESPACES:
+            return error(status.HTTP_404_NOT_FOUND, "Not found.")
+        if iscoroutinefunction(match.func):
+            return error(
+                status.HTTP_400_BAD_REQUEST,
+                "Async endpoints cannot be batched.",
+            )
+
+        sub_request = self.sub_request(request, operation, url)
+        sub_request.batch_loaders = loaders
+        with replica_reads(False) as routing:
+            sub_request._routing = routing
+            if settings.DATABASE_REPLICAS:
+                route_view(
+                    routing,
+                    operation["method"],
+                    view_label(match.func, operation["method"]),
+                    request.user.id,
+                )
+            response = match.func(sub_request, *match.args, **match.kwargs)
+            if hasattr(response, "render"):
+                response.render()
+
+        body = None
+        if response.content:
+            body = response.content.decode(response.charset)
+            if response.get("Content-Type", "").startswith("application/json"):
+                body = json.loads(body)
+        headers = {
+            name: value
+            for name, value in response.items()
+            if name not in ("Content-Type", "Content-Length")
+        }
+        return {
+            "status": response.status_code,
+            "headers": headers,
+            "body": body,
+        }
+
+    def sub_request(self, request, operation, url):
+        """A request for `operation`, authenticated as the batch user."""
+        content = b""
+        if operation["body"] is not None:
+            content = json.dumps(operation["body"]).encode()
+        environ = {
+            key: value
+            for key, value in request.META.items()
+            if isinstance(value, str)
+            and not key.startswith(("HTTP_IF_", "CONTENT_"))
+        }
+        environ.update(
+            {
+                "REQUEST_METHOD": operation["method"],
+                "SCRIPT_NAME": "",
+                "PATH_INFO": url.path,
+                "QUERY_STRING": url.query,
+                "CONTENT_TYPE": "application/json",
+                "CONTENT_LENGTH": str(len(content)),
+                "wsgi.input": BytesIO(content),
+                "wsgi.url_scheme": request.scheme,
+            }
+        )
+        for name, value in operation["headers"].items():
+            environ["HTTP_" + name.upper().replace("-", "_")] = value
+
+        sub_request = WSGIRequest(environ)
+        # read by DRF in place of the authenticators of the view
+        sub_request._force_auth_user = request.user
+        sub_request._force_auth_token = request.auth
+        return sub_request
@@ -0,0 +1,42 @@
+"""Conditional GET from version stamps.
+
+Views read the `updated_at` stamps of what they are about to render,
+which is a much cheaper query than the one feeding the serializer, and
+answer 304 Not Modified when the client already has that version.
+"""
+
+import hashlib
+
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
+
+
+class Validators:
+    """ETag and Last-Modified of a response built from `stamps`.
+
+    `extra` holds anything else the response depends on, such as ids or
+    the host, and only goes into the ETag.
+    """
+
+    def __init__(self, stamps, *extra):
+        stamps = list(stamps)
+        version = [stamp.isoformat() for stamp in stamps] + list(extra)
+        self.etag = quote_etag(
+            hashlib.sha1(repr(version).encode()).hexdigest()
+        )
+        self.last_modified = int(max(stamps).timestamp()) if stamps else None
+
+    def not_modified(self, request):
+        """A 304 response when the request validators match, else None."""
+        response = get_conditional_response(
+            request, etag=self.etag, last_modified=self.last_modified
+        )
+        if response is not None:
+            self.apply(response)
+        return response
+
+    def apply(self, response):
+        response["ETag"] = self.etag
+        if self.last_modified is not None:
+            response["Last-Modified"] = http_date(self.last_modified)
+        return response
@@ -0,0 +1,157 @@
+import hmac
+import threading
+from bisect import bisect_left
+
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseForbidden
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+class Histogram:
+    """Log-linear histogram laid out like an HDR histogram.
+
+    Every power-of-two range between `lowest` and `highest` is split into
+    `sub_buckets` equal buckets. Memory is fixed and the relative error of
+    a bucket bound stays within 1 / sub_buckets at any magnitude.
+    """
+
+    def __init__(self, lowest, highest, sub_buckets=4):
+        bounds = [lowest]
+        while bounds[-1] < highest:
+            base = bounds[-1]
+            step = base / sub_buckets
+            bounds.extend(base + step * i for i in range(1, sub_buckets + 1))
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.sum = 0
+        self.count = 0
+
+    def record(self, value):
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def cumulative(self):
+        total = 0
+        for bound, count in zip(self.bounds + ["+Inf"], self.counts):
+            total += count
+            yield bound, total
+
+
+class Metric:
+    def __init__(self, name, help_text, kind, histogram=None):
+        self.name = name
+        self.help_text = help_text
+        self.kind = kind
+        self.histogram = histogram
+        self.series = {}
+
+    def observe(self, view, value):
+        series = self.series.get(view)
+        if series is None:
+            series = self.series[view] = Histogram(**self.histogram)
+        series.record(value)
+
+    def increment(self, view):
+        self.series[view] = self.series.get(view, 0) + 1
+
+    def render(self):
+        yield f"# HELP {self.name} {self.help_text}"
+        yield f"# TYPE {self.name} {self.kind}"
+        for view, series in sorted(self.series.items()):
+            label = f'view="{escape(view)}"'
+            if self.kind == "counter":
+                yield f"{self.name}{{{label}}} {series}"
+                continue
+            for bound, total in series.cumulative():
+                le = bound if bound == "+Inf" else f"{bound:g}"
+                yield f'{self.name}_bucket{{{label},le="{le}"}} {total}'
+            yield f"{self.name}_sum{{{label}}} {series.sum:g}"
+            yield f"{self.name}_count{{{label}}} {series.count}"
+
+
+def escape(value):
+    return value.replace("\\", "\\\\").replace('"', '\\"')
+
+
+SECONDS = {"lowest": 0.0005, "highest": 30}
+QUERIES = {"lowest": 1, "highest": 1024}
+
+
+class Registry:
+    """Per-process request metrics, keyed by the resolved view action."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.metrics = {
+            "total": Metric(
+                "http_request_duration_seconds",
+                "Time spent handling the request.",
+                "histogram",
+                SECONDS,
+            ),
+            "db": Metric(
+                "http_request_db_duration_seconds",
+                "Time spent in SQL queries.",
+                "histogram",
+                SECONDS,
+            ),
+            "serialization": Metric(
+                "http_request_serialization_duration_seconds",
+                "Time spent rendering the response body.",
+                "histogram",
+                SECONDS,
+            ),
+            "queries": Metric(
+                "http_request_db_queries",
+                "SQL queries run by the request.",
+                "histogram",
+                QUERIES,
+            ),
+            "over_budget": Metric(
+                "http_request_query_budget_exceeded_total",
+                "Requests that ran more queries than their budget.",
+                "counter",
+            ),
+        }
+
+    def observe(self, view, **values):
+        with self.lock:
+            for name, value in values.items():
+                self.metrics[name].observe(view, value)
+
+    def increment(self, view, name):
+        with self.lock:
+            self.metrics[name].increment(view)
+
+    def render(self):
+        with self.lock:
+            lines = [
+                line
+                for metric in self.metrics.values()
+                for line in metric.render()
+            ]
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+
+def metrics_view(request):
+    """Expose the metrics of this process in Prometheus text format.
+
+    Scrapers send METRICS_TOKEN as a bearer token. Without a token only
+    staff signed in to the admin can read them.
+    """
+    token = settings.METRICS_TOKEN
+    if token:
+        allowed = hmac.compare_digest(
+            request.headers.get("Authorization", "").encode(),
+            f"Bearer {token}".encode(),
+        )
+    else:
+        allowed = request.user.is_staff
+    if not allowed:
+        return HttpResponseForbidden()
+    return HttpResponse(registry.render(), content_type=CONTENT_TYPE)
@@ -0,0 +1,194 @@
+import logging
+import time
+from contextlib import ExitStack
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import connections
+
+from social_media_api.metrics import registry
+from social_media_api.routers import (
+    record_write,
+    replica_reads,
+    wrote_recently,
+)
+from user.authentication import token_user_id
+
+logger = logging.getLogger(__name__)
+
+SAFE_METHODS = ("GET", "HEAD", "OPTIONS")
+
+
+class QueryTimer:
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.duration += time.perf_counter() - start
+            self.count += 1
+
+
+def view_label(view_func, method):
+    """`ViewSet.action` for viewsets, the view name for anything else."""
+    cls = getattr(view_func, "cls", None)
+    if cls is None:
+        return getattr(view_func, "__name__", "unknown")
+    actions = getattr(view_func, "actions", None) or {}
+    action = actions.get(method.lower(), method.lower())
+    return f"{cls.__name__}.{action}"
+
+
+class InstrumentationMiddleware:
+    """Record query count, DB time, render time and total time per view.
+
+    Requests that run more queries than the budget of their view action
+    (QUERY_BUDGETS, or QUERY_BUDGET_DEFAULT) are logged as warnings.
+    Under ASGI the queries run on worker threads, out of reach of the
+    connection wrappers, so only the times are recorded there.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+
+        request._instrumentation = {"view": None, "serialization": 0.0}
+        timer = QueryTimer()
+        start = time.perf_counter()
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(timer))
+            response = self.get_response(request)
+        total = time.perf_counter() - start
+
+        view = request._instrumentation["view"]
+        if view is not None:
+            self.record(request, view, timer, total)
+        return response
+
+    async def __acall__(self, request):
+        request._instrumentation = {"view": None, "serialization": 0.0}
+        start = time.perf_counter()
+        response = await self.get_response(request)
+        total = time.perf_counter() - start
+
+        view = request._instrumentation["view"]
+        if view is not None:
+            registry.observe(
+                view,
+                total=total,
+                serialization=request._instrumentation["serialization"],
+            )
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        request._instrumentation["view"] = view_label(
+            view_func, request.method
+        )
+
+    def process_template_response(self, request, response):
+        started = time.perf_counter()
+
+        def rendered(response):
+            request._instrumentation["serialization"] += (
+                time.perf_counter() - started
+            )
+
+        response.add_post_render_callback(rendered)
+        return response
+
+    def record(self, request, view, timer, total):
+        registry.observe(
+            view,
+            total=total,
+            db=timer.duration,
+            serialization=request._instrumentation["serialization"],
+            queries=timer.count,
+        )
+        budget = settings.QUERY_BUDGETS.get(
+            view, settings.QUERY_BUDGET_DEFAULT
+        )
+        if timer.count > budget:
+            registry.increment(view, "over_budget")
+            logger.warning(
+                "%s ran %d queries, over its budget of %d (%s %s)",
+                view,
+                timer.count,
+                budget,
+                request.method,
+                request.path,
+            )
+
+
+class ReplicaRoutingMiddleware:
+    """Serve the read-only views of REPLICA_VIEWS from the read replicas.
+
+    Views are named like the query budgets, `ViewSet.action`. Only safe
+    methods are routed, everything else reads from the primary. A user
+    who sent a write keeps reading from the primary for the
+    REPLICA_LAG_WINDOW that follows, so they always see their own
+    writes. The user comes from the bearer token, which takes no query.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+
+        with replica_reads(False) as routing:
+            request._routing = routing
+            return self.get_response(request)
+
+    async def __acall__(self, request):
+        with replica_reads(False) as routing:
+            request._routing = routing
+            return await self.get_response(request)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        if not settings.DATABASE_REPLICAS:
+            return
+        if getattr(
+            getattr(view_func, "cls", None), "routes_operations", False
+        ):
+            return
+        label = view_label(view_func, request.method)
+        if request.method in SAFE_METHODS and label not in (
+            settings.REPLICA_VIEWS
+        ):
+            return
+        route_view(
+            request._routing, request.method, label, token_user_id(request)
+        )
+
+
+def route_view(routing, method, label, user_id):
+    """Route the reads of a view for `user_id`, who may be None."""
+    if method not in SAFE_METHODS:
+        if user_id is not None:
+            # pinned before the write, racing reads then see it too
+            record_write(user_id)
+        return
+
+    if label not in settings.REPLICA_VIEWS:
+        return
+    if user_id is None or not wrote_recently(user_id):
+        routing.replica = True
@@ -0,0 +1,165 @@
+"""Publish/subscribe channels for pushing events to connected clients.
+
+Subscribers are asyncio tasks, typically one per open event stream, and
+each holds nothing but a bounded queue. Publishers may be sync code on
+any thread. The Redis backend keeps a single Redis subscription per event
+loop and fans its messages out to the local queues, so thousands of
+idle streams cost one Redis connection. The "local" backend only reaches
+subscribers of the same process.
+"""
+
+import asyncio
+import json
+import logging
+import threading
+from collections import defaultdict
+from contextlib import asynccontextmanager
+
+import redis
+import redis.asyncio
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+
+class Subscription:
+    def __init__(self, loop):
+        self.loop = loop
+        self.queue = asyncio.Queue(settings.PUBSUB_QUEUE_SIZE)
+
+    def put_threadsafe(self, message):
+        self.loop.call_soon_threadsafe(self._put, message)
+
+    def _put(self, message):
+        try:
+            self.queue.put_nowait(message)
+        except asyncio.QueueFull:
+            # a client that stopped reading loses events, not memory
+            pass
+
+    async def get(self, timeout=None):
+        """Next message, or None once `timeout` seconds pass without one."""
+        try:
+            return await asyncio.wait_for(self.queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+
+class LocalPubSub:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.subscriptions = defaultdict(set)
+
+    def publish(self, channel, message):
+        self.deliver(channel, message)
+
+    def deliver(self, channel, message):
+        with self.lock:
+            subscriptions = list(self.subscriptions.get(channel, ()))
+        for subscription in subscriptions:
+            try:
+                subscription.put_threadsafe(message)
+            except RuntimeError:
+                # the loop of the subscriber is already closed
+                pass
+
+    @asynccontextmanager
+    async def subscribe(self, channel):
+        subscription = Subscription(asyncio.get_running_loop())
+        try:
+            with self.lock:
+                self.subscriptions[channel].add(subscription)
+            await self.joined(channel, subscription)
+            yield subscription
+        finally:
+            with self.lock:
+                self.subscriptions[channel].discard(subscription)
+                if not self.subscriptions[channel]:
+                    del self.subscriptions[channel]
+            await self.left(channel, subscription)
+
+    async def joined(self, channel, subscription):
+        pass
+
+    async def left(self, channel, subscription):
+        pass
+
+
+class RedisPubSub(LocalPubSub):
+    def __init__(self, url):
+        super().__init__()
+        self.url = url
+        self.client = redis.Redis.from_url(url)
+        # per event loop: the shared subscription, its reader and counts
+        self.listeners = {}
+
+    def publish(self, channel, message):
+        try:
+            self.client.publish(channel, json.dumps(message))
+        except redis.RedisError:
+            # events are best effort, never fail the write behind them
+            logger.exception("Could not publish to %s", channel)
+
+    async def joined(self, channel, subscription):
+        listener = self.listeners.get(subscription.loop)
+        if listener is None:
+            pubsub = redis.asyncio.Redis.from_url(self.url).pubsub()
+            listener = self.listeners[subscription.loop] = {
+                "pubsub": pubsub,
+                "channels": defaultdict(int),
+                "task": None,
+            }
+        listener["channels"][channel] += 1
+        if listener["channels"][channel] == 1:
+            await listener["pubsub"].subscribe(channel)
+        if listener["task"] is None:
+            listener["task"] = asyncio.create_task(self.listen(listener))
+
+    async def left(self, channel, subscription):
+        listener = self.listeners[subscription.loop]
+        listener["channels"][channel] -= 1
+        if listener["channels"][channel]:
+            return
+        del listener["channels"][channel]
+        try:
+            await listener["pubsub"].unsubscribe(channel)
+        except redis.RedisError:
+            # also reached when subscribing failed, keep that error
+            logger.exception("Could not unsubscribe from %s", channel)
+        if not listener["channels"]:
+            del self.listeners[subscription.loop]
+            if listener["task"] is not None:
+                # the reader notices within a second that it has no channels
+                await listener["task"]
+            await listener["pubsub"].close()
+
+    async def listen(self, listener):
+        pubsub = listener["pubsub"]
+        while listener["channels"]:
+            try:
+                message = await pubsub.get_message(
+                    ignore_subscribe_messages=True, timeout=1.0
+                )
+            except redis.RedisError:
+                # the next call reconnects and subscribes again
+                logger.exception("Lost the pub/sub connection")
+                await asyncio.sleep(1)
+                continue
+            if message is not None:
+                self.deliver(
+                    message["channel"].decode(), json.loads(message["data"])
+                )
+
+
+_pubsub = None
+
+
+def get_pubsub():
+    global _pubsub
+
+    if _pubsub is None:
+        if settings.PUBSUB_URL == "local":
+            _pubsub = LocalPubSub()
+        else:
+            _pubsub = RedisPubSub(settings.PUBSUB_URL)
+    return _pubsub
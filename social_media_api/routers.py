@@ -0,0 +1,86 @@
+import random
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import connections
+
+WRITE_KEY = "last-write:{}"
+
+
+class Routing:
+    """Where the reads of the current request or block go."""
+
+    def __init__(self, replica):
+        self.replica = replica
+
+
+# None outside of `replica_reads`, where reads go to the primary
+_routing = ContextVar("routing", default=None)
+
+
+@contextmanager
+def replica_reads(enabled=True):
+    """Send the reads made inside the block to a read replica.
+
+    The yielded Routing can be switched later on, from code that runs in
+    a copy of the context such as sync middleware under ASGI.
+    """
+    routing = Routing(enabled)
+    token = _routing.set(routing)
+    try:
+        yield routing
+    finally:
+        _routing.reset(token)
+
+
+def reading_from_replica():
+    routing = _routing.get()
+    return routing is not None and routing.replica
+
+
+def _write_cache():
+    # pins must be visible to every worker, settings require this cache
+    # whenever DATABASE_REPLICAS is set
+    return caches["shared"]
+
+
+def record_write(user_id):
+    """Pin the reads of `user_id` to the primary for REPLICA_LAG_WINDOW."""
+    _write_cache().set(
+        WRITE_KEY.format(user_id),
+        True,
+        timeout=settings.REPLICA_LAG_WINDOW.total_seconds(),
+    )
+
+
+def wrote_recently(user_id):
+    return _write_cache().get(WRITE_KEY.format(user_id), False)
+
+
+class ReplicaRouter:
+    """Route reads to DATABASE_REPLICAS while `replica_reads` is active.
+
+    Everything else, writes included, uses the primary. Reads inside a
+    transaction on the primary stay there, so a view never reads a
+    replica that lags behind its own writes.
+    """
+
+    def db_for_read(self, model, **hints):
+        replicas = settings.DATABASE_REPLICAS
+        if not replicas or not reading_from_replica():
+            return "default"
+        if connections["default"].in_atomic_block:
+            return "default"
+        return random.choice(replicas)
+
+    def db_for_write(self, model, **hints):
+        return "default"
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # replicas hold the same rows as the primary
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == "default"
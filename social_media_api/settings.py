@@ -9,9 +9,11 @@ https://docs.djangoproject.com/en/4.2/topics/settings/
 For the full list of settings and their values, see
 https://docs.djangoproject.com/en/4.2/ref/settings/
 """
+
 import os
 from datetime import timedelta
 from pathlib import Path
+from django.core.exceptions import ImproperlyConfigured
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -44,11 +46,14 @@ INSTALLED_APPS = [
     "django.contrib.staticfiles",
     "rest_framework",
     "drf_spectacular",
+    "django_celery_beat",
     "user",
     "media_post",
 ]
 
 MIDDLEWARE = [
+    "social_media_api.middleware.InstrumentationMiddleware",
+    "social_media_api.middleware.ReplicaRoutingMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
@@ -86,8 +91,69 @@ DATABASES = {
     "default": {
         "ENGINE": "django.db.backends.sqlite3",
         "NAME": BASE_DIR / "db.sqlite3",
+        # a file database lets concurrency tests write from several threads
+        "TEST": {"NAME": BASE_DIR / "test_db.sqlite3"},
     }
 }
+DATABASE_REPLICAS = []
+
+# Production profile: Postgres behind a transaction-mode pooler such as
+# PgBouncer (POSTGRES_POOLED=True), persistent connections that are checked
+# before reuse, and optional read replicas (comma separated hosts)
+if os.environ.get("POSTGRES_HOST"):
+
+    def postgres_database(host):
+        return {
+            "ENGINE": "django.db.backends.postgresql",
+            "NAME": os.environ.get("POSTGRES_DB", "social_media_api"),
+            "USER": os.environ.get("POSTGRES_USER", "postgres"),
+            "PASSWORD": os.environ.get("POSTGRES_PASSWORD", ""),
+            "HOST": host,
+            "PORT": os.environ.get("POSTGRES_PORT", "5432"),
+            "CONN_MAX_AGE": int(os.environ.get("DB_CONN_MAX_AGE", 60)),
+            "CONN_HEALTH_CHECKS": True,
+            # server-side cursors do not survive transaction pooling
+            "DISABLE_SERVER_SIDE_CURSORS": (
+                os.environ.get("POSTGRES_POOLED", "False") == "True"
+            ),
+            "OPTIONS": {
+                "connect_timeout": int(
+                    os.environ.get("DB_CONNECT_TIMEOUT", 5)
+                ),
+            },
+        }
+
+    DATABASES = {"default": postgres_database(os.environ["POSTGRES_HOST"])}
+    replica_hosts = os.environ.get("POSTGRES_REPLICA_HOSTS", "")
+    for number, host in enumerate(filter(None, replica_hosts.split(","))):
+        alias = f"replica_{number}"
+        DATABASES[alias] = postgres_database(host.strip())
+        DATABASES[alias]["TEST"] = {"MIRROR": "default"}
+        DATABASE_REPLICAS.append(alias)
+
+DATABASE_ROUTERS = ["social_media_api.routers.ReplicaRouter"]
+
+# Read-only views, named like QUERY_BUDGETS, served from DATABASE_REPLICAS
+REPLICA_VIEWS = {
+    "PostViewSet.list",
+    "PostViewSet.retrieve",
+    "PostViewSet.comments",
+    "PostViewSet.likes",
+    "PostViewSet.search",
+    "UserProfileViewSet.list",
+    "UserProfileViewSet.retrieve",
+    "FollowingViewSet.list",
+    "FollowerViewSet.list",
+    "async_feed",
+    "async_post_detail",
+    "async_post_comments",
+    "async_followers",
+}
+# Users read from the primary for this long after a write, which covers the
+# replication lag
+REPLICA_LAG_WINDOW = timedelta(
+    seconds=float(os.environ.get("REPLICA_LAG_WINDOW", 5))
+)
 
 
 # Password validation
@@ -141,7 +207,7 @@ REST_FRAMEWORK = {
     ],
     "DEFAULT_THROTTLE_RATES": {"anon": "10000/day", "user": "10000/day"},
     "DEFAULT_AUTHENTICATION_CLASSES": (
-        "rest_framework_simplejwt.authentication.JWTAuthentication",
+        "user.authentication.CachedJWTAuthentication",
     ),
 }
 
@@ -155,3 +221,150 @@ CELERY_BROKER_URL = "redis://localhost:6379"
 CELERY_RESULT_BACKEND = "redis://localhost:6379"
 CELERY_TIMEZONE = "UTC"
 CELERY_BEAT_SCHEDULER = "django_celery_beat.schedulers:DatabaseScheduler"
+CELERY_TASK_ALWAYS_EAGER = (
+    os.environ.get("CELERY_TASK_ALWAYS_EAGER", "False") == "True"
+)
+
+# Home timeline: posts of authors with more followers than the threshold are
+# merged in at read time instead of being pushed into every follower timeline
+TIMELINE_FANOUT_THRESHOLD = int(
+    os.environ.get("TIMELINE_FANOUT_THRESHOLD", 10000)
+)
+# Posts reaching at most this many followers are pushed while the request
+# commits, larger audiences by the media_post.tasks.fan_out_new_post task
+TIMELINE_INLINE_FANOUT = int(os.environ.get("TIMELINE_INLINE_FANOUT", 100))
+TIMELINE_BACKFILL_SIZE = 200
+# Timelines are trimmed back to their newest entries by the trim-timelines
+# beat task, so feeds page through at most this many pushed posts
+TIMELINE_MAX_SIZE = int(os.environ.get("TIMELINE_MAX_SIZE", 800))
+TIMELINE_BATCH_SIZE = 1000
+
+# Scheduled posts wait in a table, every beat tick publishes the due ones
+SCHEDULED_POST_BATCH_SIZE = 1000
+
+# Search ranks the newest matches only, this bounds the cost of common words
+SEARCH_CANDIDATES = 1000
+
+# Post details embed this many of the newest comments, next to comment_count;
+# all of them are paged from the post's comments endpoint
+POST_DETAIL_COMMENTS = 10
+
+# Most operations one call to /api/batch/ may run
+BATCH_MAX_OPERATIONS = 20
+
+# Per-view request metrics, served in Prometheus format at /metrics/ to
+# requests bearing METRICS_TOKEN, or to signed in staff when it is empty
+METRICS_TOKEN = os.environ.get("METRICS_TOKEN", "")
+QUERY_BUDGET_DEFAULT = int(os.environ.get("QUERY_BUDGET_DEFAULT", 20))
+QUERY_BUDGETS = {
+    "PostViewSet.list": 8,
+    "PostViewSet.retrieve": 8,
+    "PostViewSet.comments": 6,
+    "PostViewSet.search": 6,
+    # a retrieve worth of queries per operation
+    "BatchView.post": 8 * BATCH_MAX_OPERATIONS,
+}
+
+# Hashtag uses are counted per bucket, trending sums the buckets of a window
+TRENDING_BUCKET = timedelta(hours=1)
+TRENDING_WINDOW = timedelta(days=1)
+TRENDING_CACHE_TIMEOUT = 60
+
+# Likes are buffered in Redis and written to the database in bulk by
+# media_post.tasks.flush_like_buffer. "local" keeps them in the memory of
+# the web process, where only an eager task can flush them: tests and
+# single-process development only
+LIKE_BUFFER_ENABLED = os.environ.get("LIKE_BUFFER_ENABLED", "False") == "True"
+LIKE_BUFFER_URL = os.environ.get("LIKE_BUFFER_URL", CELERY_BROKER_URL)
+
+# Like, comment and follow events are folded into one notification per
+# recipient, kind and post while it is unread and younger than
+# NOTIFICATION_WINDOW. When buffered they are counted in Redis ("local"
+# keeps them in process memory) and written in bulk by
+# media_post.tasks.flush_notifications
+NOTIFICATION_WINDOW = timedelta(hours=1)
+NOTIFICATION_BUFFER_ENABLED = (
+    os.environ.get("NOTIFICATION_BUFFER_ENABLED", "False") == "True"
+)
+NOTIFICATION_BUFFER_URL = os.environ.get(
+    "NOTIFICATION_BUFFER_URL", CELERY_BROKER_URL
+)
+
+# Notifications are pushed to event streams through Redis pub/sub ("local"
+# only reaches streams served by the same process). A stream holds at most
+# PUBSUB_QUEUE_SIZE undelivered events, sends a comment every SSE_HEARTBEAT
+# seconds to keep proxies from closing it, and ends after SSE_MAX_AGE
+# seconds, when the client reconnects.
+PUBSUB_URL = os.environ.get("PUBSUB_URL", "local")
+PUBSUB_QUEUE_SIZE = 100
+SSE_HEARTBEAT = 15
+SSE_MAX_AGE = 300
+SSE_RETRY = 3
+
+CELERY_BEAT_SCHEDULE = {
+    "flush-like-buffer": {
+        "task": "media_post.tasks.flush_like_buffer",
+        "schedule": 5.0,
+    },
+    "flush-notifications": {
+        "task": "media_post.tasks.flush_notifications",
+        "schedule": 2.0,
+    },
+    "publish-scheduled-posts": {
+        "task": "media_post.tasks.publish_scheduled_posts",
+        "schedule": 10.0,
+    },
+    "prune-hashtag-counters": {
+        "task": "media_post.tasks.prune_hashtag_counters",
+        "schedule": 3600.0,
+    },
+    "expire-uploads": {
+        "task": "media_post.tasks.expire_uploads",
+        "schedule": 3600.0,
+    },
+    "trim-timelines": {
+        "task": "media_post.tasks.trim_timelines",
+        "schedule": 3600.0,
+    },
+}
+
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+    },
+}
+
+# In-process caches (rendered posts, authenticated users) are shared
+# between workers through Redis when CACHE_REDIS_URL is set
+if os.environ.get("CACHE_REDIS_URL"):
+    CACHES["shared"] = {
+        "BACKEND": "django.core.cache.backends.redis.RedisCache",
+        "LOCATION": os.environ["CACHE_REDIS_URL"],
+    }
+# Replica reads are pinned to the primary after a write through this
+# cache, a per-process cache would only pin the worker that took the write
+if DATABASE_REPLICAS and "shared" not in CACHES:
+    raise ImproperlyConfigured(
+        "POSTGRES_REPLICA_HOSTS requires CACHE_REDIS_URL to be set"
+    )
+POST_CACHE_SIZE = 10000
+POST_CACHE_TIMEOUT = 60 * 60
+# Without CACHE_REDIS_URL other processes cannot invalidate the rendered
+# posts of a worker, which then keeps them only this many seconds
+POST_CACHE_LOCAL_TIMEOUT = 5
+AUTH_USER_CACHE_SIZE = 10000
+AUTH_USER_CACHE_TIMEOUT = 30
+
+# Longest side in pixels of the resized copies made for uploaded images
+IMAGE_VARIANTS = {
+    "thumb": 150,
+    "feed": 640,
+    "full": 1600,
+}
+
+# Resumable uploads are streamed to storage in UPLOAD_CHUNK_SIZE blocks
+UPLOAD_CHUNK_SIZE = 64 * 1024
+UPLOAD_MAX_SIZE = 50 * 1024 * 1024
+UPLOAD_HEADER_LIMIT = 256 * 1024
+UPLOAD_IMAGE_FORMATS = ("JPEG", "PNG", "GIF", "WEBP")
+UPLOAD_SESSION_TTL = timedelta(days=1)
@@ -14,6 +14,7 @@ Including another URLconf
     1. Import the include() function: from django.urls import include, path
     2. Add a URL to urlpatterns:  path('blog/', include('blog.urls'))
 """
+
 from django.conf import settings
 from django.conf.urls.static import static
 from django.contrib import admin
@@ -24,6 +25,8 @@ from drf_spectacular.views import (
     SpectacularRedocView,
 )
 
+from social_media_api.batch import BatchView
+from social_media_api.metrics import metrics_view
 
 urlpatterns = [
     path("admin/", admin.site.urls),
@@ -39,7 +42,9 @@ urlpatterns = [
         SpectacularRedocView.as_view(url_name="schema"),
         name="redoc",
     ),
-    path("api/media/", include("media_post.urls", namespace="media_post"))
+    path("api/media/", include("media_post.urls", namespace="media_post")),
+    path("api/batch/", BatchView.as_view(), name="batch"),
+    path("metrics/", metrics_view, name="metrics"),
     # path("", include(router.urls)),
     # path("__debug__/", include("debug_toolbar.urls")),
 ] + static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
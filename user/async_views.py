@@ -0,0 +1,21 @@
+"""Async variant of the followers endpoint, see media_post.async_views."""
+
+from social_media_api.asynchronous import async_api_view
+from user.loaders import get_loaders
+from user.models import Follow
+from user.serializers import FollowerSerializer
+
+
+@async_api_view
+async def async_followers(request):
+    follows = [
+        follow
+        async for follow in Follow.objects.filter(
+            followee__user_id=request.user.id
+        ).order_by("-created_at")
+    ]
+    context = {"request": request}
+    await get_loaders(context).aload_profile_users(
+        [follow.follower_id for follow in follows]
+    )
+    return FollowerSerializer(follows, many=True, context=context).data
@@ -0,0 +1,143 @@
+import pickle
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import caches
+from drf_spectacular.contrib.rest_framework_simplejwt import SimpleJWTScheme
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import (
+    AuthenticationFailed,
+    InvalidToken,
+)
+from rest_framework_simplejwt.settings import api_settings
+
+from user.models import UserProfile
+
+USER_KEY = "auth-user:{}"
+
+
+class UserCache:
+    """Short-lived cache of authenticated users with their profile.
+
+    Users are stored pickled, so every request gets its own instance and
+    the `userprofile` relation comes back already resolved.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.local = OrderedDict()
+        self.shared = caches["shared"] if "shared" in settings.CACHES else None
+
+    def get(self, user_id):
+        with self.lock:
+            expires, data = self.local.get(user_id, (0, None))
+            if expires < time.monotonic():
+                data = None
+                self.local.pop(user_id, None)
+            else:
+                self.local.move_to_end(user_id)
+
+        if data is None and self.shared is not None:
+            data = self.shared.get(USER_KEY.format(user_id))
+            if data is not None:
+                self._set_local(user_id, data)
+        return pickle.loads(data) if data is not None else None
+
+    def set(self, user):
+        try:
+            user.userprofile
+        except UserProfile.DoesNotExist:
+            # the missing profile is cached on the instance as well
+            pass
+
+        data = pickle.dumps(user)
+        self._set_local(user.pk, data)
+        if self.shared is not None:
+            self.shared.set(
+                USER_KEY.format(user.pk),
+                data,
+                timeout=settings.AUTH_USER_CACHE_TIMEOUT,
+            )
+
+    def invalidate(self, user_id):
+        with self.lock:
+            self.local.pop(user_id, None)
+        if self.shared is not None:
+            self.shared.delete(USER_KEY.format(user_id))
+
+    def _set_local(self, user_id, data):
+        expires = time.monotonic() + settings.AUTH_USER_CACHE_TIMEOUT
+        with self.lock:
+            self.local[user_id] = (expires, data)
+            self.local.move_to_end(user_id)
+            while len(self.local) > settings.AUTH_USER_CACHE_SIZE:
+                self.local.popitem(last=False)
+
+
+_user_cache = None
+
+
+def get_user_cache():
+    global _user_cache
+
+    if _user_cache is None:
+        _user_cache = UserCache()
+    return _user_cache
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+    """JWT authentication that resolves the user and profile from cache.
+
+    A token that middleware already validated, see `token_user_id`, is
+    not decoded again.
+    """
+
+    def authenticate(self, request):
+        validated_token = getattr(request._request, "_validated_token", None)
+        if validated_token is None:
+            return super().authenticate(request)
+        return self.get_user(validated_token), validated_token
+
+    def get_user(self, validated_token):
+        try:
+            user_id = validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError:
+            return super().get_user(validated_token)
+
+        user_cache = get_user_cache()
+        user = user_cache.get(user_id)
+        if user is None:
+            user = super().get_user(validated_token)
+            user_cache.set(user)
+        elif not user.is_active:
+            raise AuthenticationFailed(
+                "User is inactive", code="user_inactive"
+            )
+        return user
+
+
+def token_user_id(request):
+    """User id of a valid bearer token, read without touching the database.
+
+    The validated token is kept on the request for the authentication of
+    the view.
+    """
+    authentication = JWTAuthentication()
+    header = authentication.get_header(request)
+    raw_token = (
+        None if header is None else authentication.get_raw_token(header)
+    )
+    if raw_token is None:
+        return None
+    try:
+        validated_token = authentication.get_validated_token(raw_token)
+    except InvalidToken:
+        return None
+    request._validated_token = validated_token
+    return validated_token.get(api_settings.USER_ID_CLAIM)
+
+
+class CachedJWTScheme(SimpleJWTScheme):
+    target_class = "user.authentication.CachedJWTAuthentication"
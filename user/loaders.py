@@ -0,0 +1,88 @@
+from django.contrib.auth import get_user_model
+from rest_framework import serializers
+
+from user.models import UserProfile
+
+
+class BatchLoader:
+    """Resolve objects by primary key, one query per batch of misses."""
+
+    def __init__(self, queryset):
+        self.queryset = queryset
+        self.cache = {}
+
+    def load_many(self, ids):
+        missing = {pk for pk in ids if pk is not None} - self.cache.keys()
+        if missing:
+            found = self.queryset.in_bulk(missing)
+            for pk in missing:
+                self.cache[pk] = found.get(pk)
+        return [self.cache.get(pk) for pk in ids]
+
+    def load(self, pk):
+        return self.load_many([pk])[0]
+
+    def prime(self, objects):
+        """Add rows that were loaded some other way, a join for example."""
+        for obj in objects:
+            self.cache[obj.pk] = obj
+
+    async def aload_many(self, ids):
+        missing = {pk for pk in ids if pk is not None} - self.cache.keys()
+        if missing:
+            found = await self.queryset.ain_bulk(missing)
+            for pk in missing:
+                self.cache[pk] = found.get(pk)
+        return [self.cache.get(pk) for pk in ids]
+
+
+class Loaders:
+    def __init__(self):
+        self.profiles = BatchLoader(UserProfile.objects.all())
+        self.users = BatchLoader(get_user_model().objects.all())
+
+    def load_profile_users(self, profile_ids):
+        """Prime profiles and the users behind them, return the profiles."""
+        profiles = self.profiles.load_many(profile_ids)
+        self.users.load_many(
+            [profile.user_id for profile in profiles if profile is not None]
+        )
+        return profiles
+
+    def prime_profiles(self, profiles):
+        """Prime profiles fetched with `select_related("user")`."""
+        self.profiles.prime(profiles)
+        self.users.prime(profile.user for profile in profiles)
+
+    async def aload_profile_users(self, profile_ids):
+        """Async `load_profile_users`, serializers then run without queries."""
+        profiles = await self.profiles.aload_many(profile_ids)
+        await self.users.aload_many(
+            [profile.user_id for profile in profiles if profile is not None]
+        )
+        return profiles
+
+    def profile_user(self, profile_id):
+        profile = self.load_profile_users([profile_id])[0]
+        return self.users.load(profile.user_id)
+
+
+def get_loaders(context):
+    """Loaders shared by every serializer that handles the same request."""
+    request = context.get("request")
+    holder = getattr(request, "_request", request)
+    if holder is None:
+        return context.setdefault("loaders", Loaders())
+
+    if not hasattr(holder, "batch_loaders"):
+        holder.batch_loaders = Loaders()
+    return holder.batch_loaders
+
+
+class BatchLoadListSerializer(serializers.ListSerializer):
+    """Let the child serializer batch-load related rows for the page."""
+
+    def to_representation(self, data):
+        instances = list(data.all() if hasattr(data, "all") else data)
+        self.child.prime(instances, get_loaders(self.context))
+        return super().to_representation(instances)
@@ -0,0 +1,40 @@
+# Generated by Django 4.2 on 2026-10-18 04:24
+
+from django.db import migrations, models
+from django.db.models import Count, Min
+
+
+def merge_duplicate_follows(apps, schema_editor):
+    Follow = apps.get_model("user", "Follow")
+
+    duplicated = (
+        Follow.objects.values("user")
+        .annotate(rows=Count("id"), keep=Min("id"))
+        .filter(rows__gt=1)
+    )
+    for row in list(duplicated):
+        keep = Follow.objects.get(pk=row["keep"])
+        extra = Follow.objects.filter(user_id=row["user"]).exclude(pk=keep.pk)
+        for follow in extra:
+            keep.following.add(*follow.following.all())
+            keep.follower.add(*follow.follower.all())
+        extra.delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("user", "0005_alter_follow_follower_alter_follow_following"),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            merge_duplicate_follows, migrations.RunPython.noop
+        ),
+        migrations.AddConstraint(
+            model_name="follow",
+            constraint=models.UniqueConstraint(
+                fields=("user",), name="unique_follow"
+            ),
+        ),
+    ]
@@ -0,0 +1,81 @@
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def copy_edges(apps, schema_editor):
+    LegacyFollow = apps.get_model("user", "LegacyFollow")
+    Follow = apps.get_model("user", "Follow")
+
+    following = LegacyFollow.following.through.objects.values_list(
+        "legacyfollow__user_id", "userprofile_id"
+    )
+    followers = LegacyFollow.follower.through.objects.values_list(
+        "userprofile_id", "legacyfollow__user_id"
+    )
+    edges = {*following, *followers}
+    Follow.objects.bulk_create(
+        [
+            Follow(follower_id=follower_id, followee_id=followee_id)
+            for follower_id, followee_id in edges
+        ],
+        batch_size=1000,
+        ignore_conflicts=True,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("user", "0006_unique_follow"),
+    ]
+
+    operations = [
+        migrations.RenameModel("Follow", "LegacyFollow"),
+        migrations.CreateModel(
+            name="Follow",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+                (
+                    "followee",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="follower_edges",
+                        to="user.userprofile",
+                    ),
+                ),
+                (
+                    "follower",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="following_edges",
+                        to="user.userprofile",
+                    ),
+                ),
+            ],
+            options={
+                "indexes": [
+                    models.Index(
+                        fields=["followee", "follower"],
+                        name="follow_followee_idx",
+                    )
+                ],
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("follower", "followee"),
+                        name="unique_follow_edge",
+                    )
+                ],
+            },
+        ),
+        migrations.RunPython(copy_edges, migrations.RunPython.noop),
+        migrations.DeleteModel("LegacyFollow"),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2 on 2026-10-18 04:33
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("user", "0007_follow_edges"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="userprofile",
+            name="profile_picture_variants",
+            field=models.JSONField(default=dict, editable=False),
+        ),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 4.2 on 2026-10-18 04:38
+
+from django.db import migrations, models
+import media_post.storage
+import user.models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("user", "0008_profile_picture_variants"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="userprofile",
+            name="profile_picture",
+            field=models.ImageField(
+                blank=True,
+                null=True,
+                storage=media_post.storage.media_storage,
+                upload_to=user.models.profile_image_file_path,
+            ),
+        ),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 4.2 on 2026-10-18 06:06
+
+from django.db import migrations, models
+from django.db.models import Count, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def populate_follower_counts(apps, schema_editor):
+    UserProfile = apps.get_model("user", "UserProfile")
+    Follow = apps.get_model("user", "Follow")
+
+    counts = (
+        Follow.objects.filter(followee=OuterRef("pk"))
+        .order_by()
+        .values("followee")
+        .annotate(total=Count("id"))
+        .values("total")
+    )
+    UserProfile.objects.update(
+        follower_count=Coalesce(
+            Subquery(counts, output_field=IntegerField()), 0
+        )
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("user", "0010_userprofile_updated_at"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="userprofile",
+            name="follower_count",
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(
+            populate_follower_counts, migrations.RunPython.noop
+        ),
+    ]
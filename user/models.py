@@ -9,6 +9,8 @@ from django.contrib.auth.models import (
 from django.db import models
 from django.utils.translation import gettext as _
 
+from media_post.storage import media_storage
+
 
 class UserManager(BaseUserManager):
     """Define a model manager for User model with no username field."""
@@ -69,23 +71,42 @@ class UserProfile(models.Model):
 
     user = models.OneToOneField(User, on_delete=models.CASCADE)
     profile_picture = models.ImageField(
-        upload_to=profile_image_file_path, blank=True, null=True
+        upload_to=profile_image_file_path,
+        storage=media_storage,
+        blank=True,
+        null=True,
     )
+    profile_picture_variants = models.JSONField(default=dict, editable=False)
     bio = models.TextField(max_length=500, blank=True, null=True)
     website = models.URLField(blank=True, null=True, default="URL not defined")
     phone_number = models.CharField(max_length=20, blank=True, null=True)
     sex = models.CharField(max_length=12, choices=SEX_FIELD)
+    # bumped by changes to the profile and to its user
+    updated_at = models.DateTimeField(auto_now=True)
+    # kept by the follow signals, decides how posts reach the timelines
+    follower_count = models.PositiveIntegerField(default=0, editable=False)
 
     def __str__(self):
         return f"email: {self.user.email}'s Profile"
 
 
 class Follow(models.Model):
-    user = models.ForeignKey(UserProfile, on_delete=models.CASCADE)
-    follower = models.ManyToManyField(
-        UserProfile, related_name="following", blank=True
+    follower = models.ForeignKey(
+        UserProfile, on_delete=models.CASCADE, related_name="following_edges"
     )
-    following = models.ManyToManyField(
-        UserProfile, related_name="followers", blank=True
+    followee = models.ForeignKey(
+        UserProfile, on_delete=models.CASCADE, related_name="follower_edges"
     )
     created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["follower", "followee"], name="unique_follow_edge"
+            ),
+        ]
+        indexes = [
+            models.Index(
+                fields=["followee", "follower"], name="follow_followee_idx"
+            ),
+        ]
@@ -1,6 +1,10 @@
 from django.contrib.auth import get_user_model
+from django.db import IntegrityError, transaction
 from rest_framework import serializers
 
+from media_post.images import MediaVariantsField
+from user.exceptions import AlreadySubscribeExists
+from user.loaders import BatchLoadListSerializer, get_loaders
 from user.models import UserProfile, Follow
 
 
@@ -46,6 +50,7 @@ class UserProfileListSerializer(serializers.ModelSerializer):
         source="user.first_name", read_only=True
     )
     last_name = serializers.CharField(source="user.last_name", read_only=True)
+    profile_picture_variants = MediaVariantsField("profile_picture")
 
     class Meta:
         model = UserProfile
@@ -54,6 +59,7 @@ class UserProfileListSerializer(serializers.ModelSerializer):
             "first_name",
             "last_name",
             "profile_picture",
+            "profile_picture_variants",
             "website",
             "phone_number",
             "sex",
@@ -74,11 +80,13 @@ class UserProfileDetailSerializer(serializers.ModelSerializer):
         source="user.first_name", read_only=False
     )
     last_name = serializers.CharField(source="user.last_name", read_only=False)
+    profile_picture_variants = MediaVariantsField("profile_picture")
 
     class Meta:
         model = UserProfile
         fields = (
             "profile_picture",
+            "profile_picture_variants",
             "bio",
             "website",
             "sex",
@@ -129,32 +137,42 @@ class UserProfileCreateSerializer(serializers.ModelSerializer):
         return super().create(validated_data)
 
 
+def user_data(user):
+    return {
+        "first_name": user.first_name,
+        "last_name": user.last_name,
+        "email": user.email,
+    }
+
+
 class FollowingSerializer(serializers.ModelSerializer):
     user = serializers.SerializerMethodField()
     following = serializers.PrimaryKeyRelatedField(
-        queryset=UserProfile.objects.all(), write_only=True, many=True
+        queryset=UserProfile.objects.all(), write_only=True, source="followee"
     )
 
     class Meta:
         model = Follow
-        fields = ("following", "id", "user")
-
-    def get_user(self, obj) -> list[dict]:
-        queryset = obj.following.all()
-        data = [
-            {
-                "first_name": user.user.first_name,
-                "last_name": user.user.last_name,
-                "email": user.user.email,
-            }
-            for user in queryset
-        ]
-        return data
+        fields = ("following", "id", "user", "created_at")
+        list_serializer_class = BatchLoadListSerializer
+
+    def prime(self, instances, loaders):
+        loaders.load_profile_users([obj.followee_id for obj in instances])
+
+    def get_user(self, obj) -> dict:
+        return user_data(
+            get_loaders(self.context).profile_user(obj.followee_id)
+        )
 
     def create(self, validated_data):
-        user = self.context["request"].user.userprofile
-        validated_data["user"] = user
-        return super().create(validated_data)
+        validated_data["follower"] = self.context["request"].user.userprofile
+        try:
+            # a single INSERT guarded by the (follower, followee) unique
+            # constraint, duplicates are rejected by the database
+            with transaction.atomic():
+                return super().create(validated_data)
+        except IntegrityError:
+            raise AlreadySubscribeExists()
 
 
 class FollowerSerializer(serializers.ModelSerializer):
@@ -162,16 +180,13 @@ class FollowerSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = Follow
-        fields = ("id", "user")
-
-    def get_user(self, obj) -> list[dict]:
-        queryset = obj.follower.all()
-        data = [
-            {
-                "first_name": user.user.first_name,
-                "last_name": user.user.last_name,
-                "email": user.user.email,
-            }
-            for user in queryset
-        ]
-        return data
+        fields = ("id", "user", "created_at")
+        list_serializer_class = BatchLoadListSerializer
+
+    def prime(self, instances, loaders):
+        loaders.load_profile_users([obj.follower_id for obj in instances])
+
+    def get_user(self, obj) -> dict:
+        return user_data(
+            get_loaders(self.context).profile_user(obj.follower_id)
+        )
@@ -0,0 +1,58 @@
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models import F
+from django.db.models.functions import Now
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from media_post.blobs import track_references
+from media_post.images import needs_variants
+from user.authentication import get_user_cache
+from user.models import Follow, UserProfile
+from user.tasks import process_profile_picture
+
+track_references(UserProfile, "profile_picture")
+
+
+@receiver(post_save, sender=get_user_model())
+@receiver(post_delete, sender=get_user_model())
+def user_cache_invalidate(sender, instance, **kwargs):
+    get_user_cache().invalidate(instance.pk)
+
+
+@receiver(post_save, sender=get_user_model())
+def user_profile_touch(sender, instance, created, **kwargs):
+    # names and email are rendered as part of the profile
+    if not created:
+        UserProfile.objects.filter(user=instance).update(updated_at=Now())
+
+
+@receiver(post_save, sender=UserProfile)
+@receiver(post_delete, sender=UserProfile)
+def profile_cache_invalidate(sender, instance, **kwargs):
+    get_user_cache().invalidate(instance.user_id)
+
+
+@receiver(post_save, sender=UserProfile)
+def profile_picture_process(sender, instance, **kwargs):
+    if needs_variants(
+        instance.profile_picture, instance.profile_picture_variants
+    ):
+        transaction.on_commit(
+            lambda: process_profile_picture.delay(instance.pk)
+        )
+
+
+@receiver(post_save, sender=Follow)
+def follower_count_increment(sender, instance, created, **kwargs):
+    if created:
+        UserProfile.objects.filter(pk=instance.followee_id).update(
+            follower_count=F("follower_count") + 1
+        )
+
+
+@receiver(post_delete, sender=Follow)
+def follower_count_decrement(sender, instance, **kwargs):
+    UserProfile.objects.filter(
+        pk=instance.followee_id, follower_count__gt=0
+    ).update(follower_count=F("follower_count") - 1)
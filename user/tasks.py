@@ -0,0 +1,27 @@
+from celery import shared_task
+
+from media_post.blobs import is_referenced
+from media_post.images import (
+    delete_variants,
+    generate_variants,
+    needs_variants,
+)
+from user.models import UserProfile
+
+
+@shared_task
+def process_profile_picture(profile_id):
+    """Generate resized variants of a profile picture."""
+    profile = UserProfile.objects.filter(pk=profile_id).first()
+    if profile is None or not needs_variants(
+        profile.profile_picture, profile.profile_picture_variants
+    ):
+        return
+
+    variants = generate_variants(profile.profile_picture)
+    if not is_referenced(variants["source"]):
+        # released while resizing, after collect() deleted its variants
+        delete_variants(variants["source"])
+        return
+    profile.profile_picture_variants = variants
+    profile.save(update_fields=["profile_picture_variants", "updated_at"])
@@ -0,0 +1,243 @@
+import threading
+from unittest import mock
+
+from django.core.cache import caches
+from django.db import connection
+from django.test import (
+    SimpleTestCase,
+    TestCase,
+    TransactionTestCase,
+    override_settings,
+)
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from social_media_api.routers import (
+    ReplicaRouter,
+    reading_from_replica,
+    replica_reads,
+)
+from user.authentication import get_user_cache
+from user.models import User, UserProfile, Follow
+from user.serializers import UserProfileDetailSerializer
+from user.views import FollowingViewSet
+
+FOLLOWING_URL = reverse("user:following-list")
+MANAGE_URL = reverse("user:manage")
+THREADS = 8
+# a LocMem stand-in for the Redis cache shared by all workers
+SHARED_CACHES = {
+    "default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"},
+    "shared": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        "LOCATION": "shared",
+    },
+}
+
+
+class ConcurrentFollowTests(TransactionTestCase):
+    def setUp(self):
+        self.user = User.objects.create_user("user@test.com", "pass12345")
+        self.profile = UserProfile.objects.create(user=self.user, sex="M")
+        author = User.objects.create_user("author@test.com", "pass12345")
+        self.author = UserProfile.objects.create(user=author, sex="F")
+
+    def test_concurrent_follow_creates_one_edge(self):
+        barrier = threading.Barrier(THREADS)
+        statuses = []
+
+        def follow():
+            client = APIClient()
+            client.force_authenticate(self.user)
+            barrier.wait()
+            try:
+                response = client.post(
+                    FOLLOWING_URL, {"following": self.author.id}
+                )
+                statuses.append(response.status_code)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=follow) for _ in range(THREADS)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(statuses.count(201), 1)
+        self.assertEqual(statuses.count(400), THREADS - 1)
+        self.assertEqual(
+            Follow.objects.filter(
+                follower=self.profile, followee=self.author
+            ).count(),
+            1,
+        )
+
+
+class FollowingQueryCountTests(TestCase):
+    def setUp(self):
+        user = User.objects.create_user("user@test.com", "pass12345")
+        self.profile = UserProfile.objects.create(user=user, sex="M")
+        self.client = APIClient()
+        self.client.force_authenticate(user)
+
+    def follow_profiles(self, count):
+        for i in range(count):
+            user = User.objects.create_user(
+                f"author{self.profile.following_edges.count()}@test.com",
+                "pass12345",
+            )
+            Follow.objects.create(
+                follower=self.profile,
+                followee=UserProfile.objects.create(user=user, sex="F"),
+            )
+
+    def count_queries(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(FOLLOWING_URL)
+        self.assertEqual(response.status_code, 200)
+        return len(queries)
+
+    def test_following_query_count_does_not_grow(self):
+        self.follow_profiles(1)
+        single = self.count_queries()
+
+        self.follow_profiles(10)
+        self.assertEqual(self.count_queries(), single)
+
+
+@override_settings(DATABASE_REPLICAS=["replica_0"])
+class ReplicaRouterTests(SimpleTestCase):
+    def test_reads_use_replica_only_inside_replica_reads(self):
+        router = ReplicaRouter()
+        self.assertEqual(router.db_for_read(Follow), "default")
+        with replica_reads():
+            self.assertEqual(router.db_for_read(Follow), "replica_0")
+            self.assertEqual(router.db_for_write(Follow), "default")
+        self.assertEqual(router.db_for_read(Follow), "default")
+
+
+@override_settings(DATABASE_REPLICAS=["default"], CACHES=SHARED_CACHES)
+class ReplicaRoutingMiddlewareTests(TestCase):
+    def setUp(self):
+        caches["shared"].clear()
+        self.user = User.objects.create_user("user@test.com", "pass12345")
+        UserProfile.objects.create(user=self.user, sex="M")
+        self.client = self.token_client(self.user)
+
+    def token_client(self, user):
+        client = APIClient()
+        token = RefreshToken.for_user(user).access_token
+        client.credentials(HTTP_AUTHORIZATION=f"Bearer {token}")
+        return client
+
+    def replica_flags(self, method, *args, client=None):
+        flags = []
+        get_queryset = FollowingViewSet.get_queryset
+
+        def record(view):
+            flags.append(reading_from_replica())
+            return get_queryset(view)
+
+        with mock.patch.object(
+            FollowingViewSet, "get_queryset", autospec=True, side_effect=record
+        ):
+            getattr(client or self.client, method)(*args)
+        return flags
+
+    def test_list_reads_from_replica(self):
+        self.assertEqual(self.replica_flags("get", FOLLOWING_URL), [True])
+        self.assertFalse(reading_from_replica())
+
+    def test_writes_read_from_primary(self):
+        flags = self.replica_flags(
+            "delete", reverse("user:following-detail", args=[1])
+        )
+        self.assertEqual(flags, [False])
+
+    def test_token_is_validated_once(self):
+        with mock.patch.object(
+            JWTAuthentication,
+            "get_validated_token",
+            autospec=True,
+            side_effect=JWTAuthentication.get_validated_token,
+        ) as get_validated_token:
+            response = self.client.get(FOLLOWING_URL)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(get_validated_token.call_count, 1)
+
+    def test_reads_after_a_write_use_primary(self):
+        self.client.post(FOLLOWING_URL, {"following": 0})
+        self.assertEqual(self.replica_flags("get", FOLLOWING_URL), [False])
+
+        other = User.objects.create_user("other@test.com", "pass12345")
+        UserProfile.objects.create(user=other, sex="F")
+        flags = self.replica_flags(
+            "get", FOLLOWING_URL, client=self.token_client(other)
+        )
+        self.assertEqual(flags, [True])
+
+
+class UserCacheTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user("user@test.com", "pass12345")
+        self.profile = UserProfile.objects.create(user=self.user, sex="M")
+        self.client = APIClient()
+        token = RefreshToken.for_user(self.user).access_token
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {token}")
+        # a first request puts the user in the cache
+        self.assertEqual(self.client.get(MANAGE_URL).status_code, 200)
+
+    def test_cached_request_reads_no_user_or_profile(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(FOLLOWING_URL)
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(
+            [
+                query["sql"]
+                for query in queries
+                for table in (User._meta.db_table, UserProfile._meta.db_table)
+                if f'FROM "{table}"' in query["sql"]
+            ]
+        )
+
+    def test_account_update_evicts_the_cached_user(self):
+        response = self.client.patch(MANAGE_URL, {"email": "new@test.com"})
+        self.assertEqual(response.status_code, 200)
+        self.assertIsNone(get_user_cache().get(self.user.pk))
+
+        self.assertEqual(
+            self.client.get(MANAGE_URL).data["email"], "new@test.com"
+        )
+
+    def test_profile_update_evicts_the_cached_user(self):
+        serializer = UserProfileDetailSerializer(
+            self.profile,
+            data={"bio": "Hello", "first_name": "Ann"},
+            partial=True,
+        )
+        serializer.is_valid(raise_exception=True)
+        serializer.save()
+        self.assertIsNone(get_user_cache().get(self.user.pk))
+
+        self.client.get(MANAGE_URL)
+        cached = get_user_cache().get(self.user.pk)
+        self.assertEqual(cached.first_name, "Ann")
+        self.assertEqual(cached.userprofile.bio, "Hello")
+
+    def test_inactive_user_is_rejected_on_a_cache_hit(self):
+        self.user.is_active = False
+        get_user_cache().set(self.user)
+
+        response = self.client.get(MANAGE_URL)
+        self.assertEqual(response.status_code, 401)
+        self.assertEqual(response.data["code"], "user_inactive")
+
+    def test_deactivated_user_is_rejected(self):
+        self.user.is_active = False
+        self.user.save()
+
+        self.assertEqual(self.client.get(MANAGE_URL).status_code, 401)
@@ -14,12 +14,13 @@ from user.views import (
 )
 
 from user.views import UserProfileViewSet
+from user.async_views import async_followers
 
 
 router = routers.DefaultRouter()
 router.register("userprofile", UserProfileViewSet)
-router.register("following", FollowingViewSet)
-router.register("followers", FollowerViewSet)
+router.register("following", FollowingViewSet, basename="following")
+router.register("followers", FollowerViewSet, basename="followers")
 
 urlpatterns = [
     path("register/", CreateUserView.as_view(), name="create"),
@@ -27,6 +28,7 @@ urlpatterns = [
     path("token/refresh/", TokenRefreshView.as_view(), name="token_refresh"),
     path("token/verify/", TokenVerifyView.as_view(), name="token_verify"),
     path("me/", ManageUserView.as_view(), name="manage"),
+    path("async/followers/", async_followers, name="async-followers"),
 ] + router.urls
 
 app_name = "user"
@@ -2,11 +2,13 @@ from drf_spectacular.utils import extend_schema, OpenApiParameter
 from rest_framework import generics
 from rest_framework import viewsets, mixins, status
 from rest_framework.decorators import action
+from rest_framework.generics import get_object_or_404
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
-from rest_framework_simplejwt.authentication import JWTAuthentication
 from drf_spectacular.types import OpenApiTypes
-from user.exceptions import ObjectAlreadyExists, AlreadySubscribeExists
+from social_media_api.conditional import Validators
+from user.authentication import CachedJWTAuthentication
+from user.exceptions import ObjectAlreadyExists
 from user.models import UserProfile, Follow
 from user.permissions import IsOwnerOrReadOnly
 from user.serializers import (
@@ -26,7 +28,7 @@ class CreateUserView(generics.CreateAPIView):
 
 class ManageUserView(generics.RetrieveUpdateAPIView):
     serializer_class = UserSerializer
-    authentication_classes = (JWTAuthentication,)
+    authentication_classes = (CachedJWTAuthentication,)
     permission_classes = (IsAuthenticated,)
 
     def get_object(self):
@@ -40,7 +42,7 @@ class UserProfileViewSet(
     mixins.DestroyModelMixin,
     viewsets.GenericViewSet,
 ):
-    authentication_classes = (JWTAuthentication,)
+    authentication_classes = (CachedJWTAuthentication,)
     permission_classes = (IsOwnerOrReadOnly,)
     queryset = UserProfile.objects.all()
 
@@ -52,7 +54,7 @@ class UserProfileViewSet(
     )
     def create_profile(self, request):
         """U can Create your Profile page"""
-        if UserProfile.objects.filter(user=request.user).exists():
+        if hasattr(request.user, "userprofile"):
             raise ObjectAlreadyExists()
 
         create = mixins.CreateModelMixin()
@@ -65,6 +67,17 @@ class UserProfileViewSet(
             serializer.data, status=status.HTTP_201_CREATED, headers=headers
         )
 
+    def retrieve(self, request, *args, **kwargs):
+        updated_at = get_object_or_404(
+            self.get_queryset().values_list("updated_at", flat=True),
+            pk=self.kwargs["pk"],
+        )
+        validators = Validators([updated_at], request.get_host())
+        not_modified = validators.not_modified(request)
+        if not_modified is not None:
+            return not_modified
+        return validators.apply(super().retrieve(request, *args, **kwargs))
+
     def get_serializer_class(self):
         if self.action in ("list",):
             return UserProfileListSerializer
@@ -95,13 +108,13 @@ class UserProfileViewSet(
                 "first_name",
                 type=OpenApiTypes.STR,
                 description="Filter by first_name id "
-                            "(ex. ?first_name=John&first_name=Jane)",
+                "(ex. ?first_name=John&first_name=Jane)",
             ),
             OpenApiParameter(
                 "last_name",
                 type=OpenApiTypes.STR,
                 description="Filter by last_name id "
-                            "(ex. ?last_name=John&last_name=Jane)",
+                "(ex. ?last_name=John&last_name=Jane)",
             ),
         ]
     )
@@ -115,22 +128,18 @@ class FollowingViewSet(
     mixins.DestroyModelMixin,
     viewsets.GenericViewSet,
 ):
-    authentication_classes = (JWTAuthentication,)
+    authentication_classes = (CachedJWTAuthentication,)
     permission_classes = (IsAuthenticated,)
-    queryset = Follow.objects.prefetch_related("following")
+    queryset = Follow.objects.all()
     serializer_class = FollowingSerializer
 
     def get_queryset(self):
         queryset = self.queryset.filter(
-            user__user_id=self.request.user.id
-        ).exclude(following=None)
+            follower__user_id=self.request.user.id
+        ).order_by("-created_at")
         return queryset
 
     def create(self, request, *args, **kwargs):
-        following_user = request.data.get("following")
-        if Follow.objects.filter(following=following_user).exists():
-            raise AlreadySubscribeExists()
-
         serializer = self.get_serializer(data=request.data)
         serializer.is_valid(raise_exception=True)
         self.perform_create(serializer)
@@ -144,13 +153,13 @@ class FollowerViewSet(
     mixins.ListModelMixin,
     viewsets.GenericViewSet,
 ):
-    authentication_classes = (JWTAuthentication,)
+    authentication_classes = (CachedJWTAuthentication,)
     permission_classes = (IsAuthenticated,)
-    queryset = Follow.objects.prefetch_related("follower")
+    queryset = Follow.objects.all()
     serializer_class = FollowerSerializer
 
     def get_queryset(self):
         queryset = self.queryset.filter(
-            user__user_id=self.request.user.id
-        ).exclude(follower=None)
+            followee__user_id=self.request.user.id
+        ).order_by("-created_at")
         return queryset